@@ -0,0 +1,148 @@
+"""
+Check the startup time of pyosmogps against a budget.
+
+Each case is run in a new interpreter, several times, and the best time is
+compared with the budget after subtracting the startup time of an empty
+interpreter. The modules loaded by each case are checked too: the heavy
+dependencies must only be imported when a command needs them, so importing
+the package or printing the version never loads numpy or scipy.
+
+- import: "import pyosmogps";
+- cli: import of the command line module, i.e. the startup of any command;
+- version: "pyosmogps --version".
+
+The script exits with status 1 if a case is over its budget or loads a module
+it should not, so it can be run by CI. The modules are also checked by
+tests/test_lazy_imports.py, which runs with the other tests:
+
+    python benchmarks/check_import_time.py --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# Modules that must not be loaded by each case, the ones it needs are imported
+# by the commands on first use
+CASES = {
+    "import": (
+        "import pyosmogps",
+        ["numpy", "scipy", "google.protobuf", "dateutil"],
+    ),
+    "cli": (
+        "import pyosmogps.main",
+        ["numpy", "scipy", "google.protobuf", "dateutil", "pyosmogps.pyosmogps"],
+    ),
+    "version": (
+        "import sys; sys.argv = ['pyosmogps', '--version']\n"
+        "from pyosmogps.main import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass",
+        ["numpy", "scipy", "dateutil", "pyosmogps.pyosmogps"],
+    ),
+}
+
+# Budgets in milliseconds, on top of the startup of the interpreter
+DEFAULT_BUDGETS = {"import": 50.0, "cli": 120.0, "version": 200.0}
+
+
+def run_python(code):
+    """
+    Run code in a new interpreter.
+
+    :param code: Python code to run.
+    :return: Tuple with the wall time in seconds and the standard output.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start, result.stdout
+
+
+def loaded_modules(code, modules):
+    """
+    Return the modules of a list loaded after running code, including their
+    submodules.
+    """
+    check = (
+        f"{code}\nimport sys, json\n"
+        f"print(json.dumps(sorted(m for m in {modules!r} if any("
+        "n == m or n.startswith(m + '.') for n in sys.modules))))"
+    )
+    _, stdout = run_python(check)
+    return json.loads(stdout.splitlines()[-1])
+
+
+def best_time(code, repeat):
+    """Return the best wall time of code over repeat runs, in seconds."""
+    return min(run_python(code)[0] for _ in range(repeat))
+
+
+def check_import_time(budgets, repeat):
+    """
+    Time each case and list the forbidden modules it loads.
+
+    :param budgets: Dict mapping the case names to their budget in ms.
+    :param repeat: Number of timed runs of each case, the best is kept.
+    :return: List of dicts with the results of each case.
+    """
+    baseline = best_time("pass", repeat)
+    results = []
+    for name, (code, forbidden) in CASES.items():
+        milliseconds = (best_time(code, repeat) - baseline) * 1000
+        loaded = loaded_modules(code, forbidden)
+        results.append(
+            {
+                "case": name,
+                "milliseconds": milliseconds,
+                "budget": budgets[name],
+                "forbidden_modules": loaded,
+                "passed": milliseconds <= budgets[name] and not loaded,
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the startup time of pyosmogps against a budget",
+    )
+    for name, budget in DEFAULT_BUDGETS.items():
+        parser.add_argument(
+            f"--{name}-budget",
+            type=float,
+            default=budget,
+            help=f"Budget of the '{name}' case in ms (default: {budget:g}).",
+        )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of timed runs of each case, the best one is reported.",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the results as JSON."
+    )
+    args = parser.parse_args()
+    budgets = {name: getattr(args, f"{name}_budget") for name in DEFAULT_BUDGETS}
+
+    results = check_import_time(budgets, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'case':<10}{'time (ms)':>12}{'budget (ms)':>14}  result")
+        for result in results:
+            status = "ok" if result["passed"] else "FAILED"
+            if result["forbidden_modules"]:
+                status += f", loads {', '.join(result['forbidden_modules'])}"
+            print(
+                f"{result['case']:<10}{result['milliseconds']:>12.1f}"
+                f"{result['budget']:>14.1f}  {status}"
+            )
+    sys.exit(0 if all(result["passed"] for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
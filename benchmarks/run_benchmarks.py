@@ -0,0 +1,216 @@
+"""
+Benchmark the extraction pipeline on a synthetic DJI-style MP4 file.
+
+Each stage is timed separately, reporting the best time of several runs,
+the throughput in points per second and the peak memory allocated by the
+stage (measured with tracemalloc in a separate run):
+
+- moov: parsing of the 'moov' box and of the sample tables;
+- chunks: reading of the metadata track;
+- decode: protobuf decoding and datetime parsing;
+- discard, linear, lpf, polyphase: resampling of the decoded track;
+- simplify: Douglas-Peucker simplification of the decoded track, with a
+  tolerance of 1 m;
+- gpx: writing of the decoded track to a GPX file.
+
+Usage:
+
+    python benchmarks/run_benchmarks.py --duration 600 --repeat 5
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from synthetic_mp4 import write_synthetic_mp4
+
+from pyosmogps.data_filters import (
+    discard_resample_gps_data,
+    linear_resample_gps_data,
+    lpf_resample_gps_data,
+    polyphase_resample_gps_data,
+    simplify_gps_data,
+)
+from pyosmogps.gps_records import protobuf_backend
+from pyosmogps.gpx_writer import write_gpx
+from pyosmogps.metadata_manager import extract_gps_info
+from pyosmogps.mp4_manager import MP4Manager
+
+
+def measure(function, repeat):
+    """
+    Time a function and measure its peak memory.
+
+    :param function: Function without arguments, returning the number of
+        points it processed.
+    :param repeat: Number of timed runs.
+    :return: Tuple with the best time (seconds), the number of points and the
+        peak memory allocated (bytes).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        points = function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, points, peak
+
+
+def run_benchmarks(mp4_file, output_dir, extensions, frequency, repeat):
+    """
+    Run the benchmark of each stage on a video file.
+
+    :return: List of dicts with the stage name, the time, the number of
+        points, the points per second and the peak memory.
+    """
+    mp4 = MP4Manager(mp4_file, extract_chunks=False)
+    sample_count = len(mp4.sizes)
+    mp4._extract_chunks()
+    gps_data, frame_rate = extract_gps_info(mp4.get_metadata(), 0, extensions)
+    gpx_file = os.path.join(output_dir, "benchmark.gpx")
+
+    def moov():
+        MP4Manager(mp4_file, extract_chunks=False)
+        return sample_count
+
+    def chunks():
+        mp4._extract_chunks()
+        return sample_count
+
+    def decode():
+        return len(extract_gps_info(mp4.get_metadata(), 0, extensions)[0])
+
+    def resampler(function):
+        def run():
+            function(gps_data, frame_rate, frequency)
+            return len(gps_data)
+
+        return run
+
+    def simplify():
+        simplify_gps_data(gps_data, 1.0)
+        return len(gps_data)
+
+    def gpx():
+        return write_gpx(gpx_file, gps_data, extensions)
+
+    stages = [
+        ("moov", moov),
+        ("chunks", chunks),
+        ("decode", decode),
+        ("discard", resampler(discard_resample_gps_data)),
+        ("linear", resampler(linear_resample_gps_data)),
+        ("lpf", resampler(lpf_resample_gps_data)),
+        ("polyphase", resampler(polyphase_resample_gps_data)),
+        ("simplify", simplify),
+        ("gpx", gpx),
+    ]
+    results = []
+    for name, function in stages:
+        seconds, points, peak = measure(function, repeat)
+        results.append(
+            {
+                "stage": name,
+                "seconds": seconds,
+                "points": points,
+                "points_per_second": points / seconds if seconds > 0 else None,
+                "peak_memory": peak,
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pyosmogps stages on a synthetic MP4 file",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=600.0,
+        help="Duration of the synthetic recording in seconds (default: 600).",
+    )
+    parser.add_argument("--frame-rate", type=float, default=30.0)
+    parser.add_argument("--no-extensions", action="store_true")
+    parser.add_argument("--co64", action="store_true")
+    parser.add_argument(
+        "--frequency",
+        type=float,
+        default=1.0,
+        help="Output frequency of the resampling stages in Hz (default: 1).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed runs of each stage, the best one is reported.",
+    )
+    parser.add_argument(
+        "--input",
+        help="Benchmark this video file instead of a synthetic one.",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the results as JSON."
+    )
+    args = parser.parse_args()
+    extensions = not args.no_extensions
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        mp4_file = args.input
+        if mp4_file is None:
+            mp4_file = os.path.join(output_dir, "synthetic.mp4")
+            write_synthetic_mp4(
+                mp4_file,
+                duration=args.duration,
+                frame_rate=args.frame_rate,
+                extensions=extensions,
+                use_co64=args.co64,
+            )
+        # The camera model is printed at each decoding
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_benchmarks(
+                mp4_file, output_dir, extensions, args.frequency, args.repeat
+            )
+
+    # ru_maxrss is in KiB on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "stages": results,
+                    "max_rss": max_rss,
+                    "protobuf_backend": protobuf_backend(),
+                },
+                indent=2,
+            )
+        )
+        return
+
+    print(
+        f"{'stage':<10}{'time (ms)':>12}{'points':>12}{'points/s':>14}{'peak MiB':>12}"
+    )
+    for result in results:
+        print(
+            f"{result['stage']:<10}{result['seconds'] * 1000:>12.2f}"
+            f"{result['points']:>12}{result['points_per_second']:>14.0f}"
+            f"{result['peak_memory'] / 2**20:>12.2f}"
+        )
+    print(f"Maximum resident set size: {max_rss / 2**20:.1f} MiB")
+    print(f"Protobuf backend: {protobuf_backend()}")
+
+
+if __name__ == "__main__":
+    main()
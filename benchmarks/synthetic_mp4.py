@@ -0,0 +1,270 @@
+"""
+Generate synthetic MP4 files carrying a DJI-style metadata track.
+
+The files only contain what pyosmogps reads: an ``mvhd`` box, a video
+track with resolution and timing, a placeholder second track and a
+metadata track (the third ``trak``) whose samples are serialized
+``GenericMessage`` protobufs, one ``gps_info`` record per frame.
+"""
+
+import argparse
+import math
+import struct
+from datetime import datetime, timedelta
+
+from pyosmogps.dji_pb2 import GenericMessage
+
+MOVIE_TIMESCALE = 1000
+VIDEO_SAMPLE_SIZE = 256
+DEFAULT_START_TIME = datetime(2025, 1, 26, 10, 0, 0)
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _full_box(box_type, version, flags, payload):
+    return _box(box_type, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+def _mvhd(duration):
+    payload = struct.pack(">IIII", 0, 0, MOVIE_TIMESCALE, duration)
+    payload += struct.pack(">IH10x", 0x00010000, 0x0100)
+    payload += bytes(36 + 24)
+    payload += struct.pack(">I", 4)
+    return _full_box(b"mvhd", 0, 0, payload)
+
+
+def _tkhd(track_id, duration, width=0, height=0):
+    payload = struct.pack(">III4xI8x", 0, 0, track_id, duration)
+    payload += bytes(8 + 36)
+    payload += struct.pack(">II", width << 16, height << 16)
+    return _full_box(b"tkhd", 0, 3, payload)
+
+
+def _mdhd(timescale, duration):
+    payload = struct.pack(">IIIIHH", 0, 0, timescale, duration, 0x55C4, 0)
+    return _full_box(b"mdhd", 0, 0, payload)
+
+
+def _hdlr(handler):
+    payload = struct.pack(">I4s12x", 0, handler) + b"\x00"
+    return _full_box(b"hdlr", 0, 0, payload)
+
+
+def _stbl(sample_count, sample_delta, sizes, offsets, use_co64, samples_per_chunk=1):
+    stsd = _full_box(b"stsd", 0, 0, struct.pack(">I", 0))
+    stts = _full_box(b"stts", 0, 0, struct.pack(">III", 1, sample_count, sample_delta))
+    entries = [(1, samples_per_chunk, 1)]
+    remainder = sample_count % samples_per_chunk
+    if remainder and len(offsets) > 1:
+        entries.append((len(offsets), remainder, 1))
+    stsc = _full_box(
+        b"stsc",
+        0,
+        0,
+        struct.pack(">I", len(entries))
+        + b"".join(struct.pack(">III", *entry) for entry in entries),
+    )
+    stsz = _full_box(
+        b"stsz",
+        0,
+        0,
+        struct.pack(">II", 0, len(sizes)) + struct.pack(f">{len(sizes)}I", *sizes),
+    )
+    if use_co64:
+        stco = _full_box(
+            b"co64",
+            0,
+            0,
+            struct.pack(">I", len(offsets))
+            + struct.pack(f">{len(offsets)}Q", *offsets),
+        )
+    else:
+        stco = _full_box(
+            b"stco",
+            0,
+            0,
+            struct.pack(">I", len(offsets))
+            + struct.pack(f">{len(offsets)}I", *offsets),
+        )
+    return _box(b"stbl", stsd + stts + stsc + stsz + stco)
+
+
+def _trak(track_id, handler, timescale, sample_delta, sizes, offsets, **kwargs):
+    use_co64 = kwargs.pop("use_co64", False)
+    samples_per_chunk = kwargs.pop("samples_per_chunk", 1)
+    sample_count = len(sizes)
+    media_duration = sample_count * sample_delta
+    movie_duration = media_duration * MOVIE_TIMESCALE // timescale
+    minf = _box(
+        b"minf",
+        _stbl(sample_count, sample_delta, sizes, offsets, use_co64, samples_per_chunk),
+    )
+    mdia = _box(b"mdia", _mdhd(timescale, media_duration) + _hdlr(handler) + minf)
+    return _box(b"trak", _tkhd(track_id, movie_duration, **kwargs) + mdia)
+
+
+def make_samples(
+    frame_count,
+    frame_rate,
+    extensions=True,
+    proto_name="dvtm_ac203.proto",
+    start_time=DEFAULT_START_TIME,
+):
+    """
+    Build the serialized metadata samples, one ``GenericMessage`` per frame.
+    """
+    samples = []
+    for frame in range(frame_count):
+        message = GenericMessage()
+        if frame == 0:
+            module = message.video_global_info.module_info.add()
+            module.proto_name = proto_name
+            module.camera_name = "Osmo Action 4"
+            module.serial_number = "SYNTHETIC0001"
+            details = message.video_stream_info.details
+            details.width = 3840
+            details.height = 2160
+            details.frame_rate = frame_rate
+
+        seconds = frame / frame_rate
+        gps = message.gps_info.add()
+        gps.frame_info.frame_id = frame
+        coordinates = gps.remote_gps_info.coordinates
+        coordinates.info.latitude = 45.0 + 0.0001 * seconds + 1e-6 * math.sin(frame)
+        coordinates.info.longitude = 9.0 + 0.0002 * seconds + 1e-6 * math.cos(frame)
+        coordinates.gps_altitude_mm = int(120000 + 500 * math.sin(seconds / 30))
+        coordinates.datetime.datetime = (
+            start_time + timedelta(seconds=int(seconds))
+        ).strftime("%Y-%m-%d %H:%M:%S")
+
+        if extensions:
+            camera = gps.camera_info
+            camera.unk3.unknown_field.extend([bytes(32)] * 4)
+            camera.accelerometer1.x = math.sin(seconds)
+            camera.accelerometer1.y = math.cos(seconds)
+            camera.accelerometer1.z = 9.81
+            camera.accelerometer2.x = 0.5 * math.sin(seconds)
+            camera.accelerometer2.y = 0.5 * math.cos(seconds)
+            camera.accelerometer2.z = 9.8
+            derivatives = gps.remote_gps_info.derivatives
+            derivatives.x = 0.1
+            derivatives.y = 0.2
+            derivatives.z = 0.3
+
+        samples.append(message.SerializeToString())
+    return samples
+
+
+def write_synthetic_mp4(
+    path,
+    duration=60.0,
+    frame_rate=30.0,
+    extensions=True,
+    use_co64=False,
+    proto_name="dvtm_ac203.proto",
+    start_time=DEFAULT_START_TIME,
+    samples_per_chunk=1,
+):
+    """
+    Write a synthetic DJI-style MP4 file.
+
+    :param path: Output file path.
+    :param duration: Recording duration in seconds.
+    :param frame_rate: Video and metadata frame rate (Hz).
+    :param extensions: Fill the camera accelerometer and remote derivative fields.
+    :param use_co64: Store chunk offsets in a 'co64' box instead of 'stco'.
+    :param proto_name: Camera proto name written in the module info.
+    :param start_time: GPS time of the first frame.
+    :param samples_per_chunk: Number of consecutive metadata samples stored
+        in each chunk of the metadata track.
+    :return: Number of metadata samples written.
+    """
+    frame_count = int(duration * frame_rate)
+    samples = make_samples(frame_count, frame_rate, extensions, proto_name, start_time)
+
+    ftyp = _box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2mp41")
+
+    # Interleave placeholder video samples and metadata chunks in the mdat
+    video_sample = bytes(VIDEO_SAMPLE_SIZE)
+    mdat_start = len(ftyp) + 8
+    video_offsets = []
+    metadata_offsets = []
+    layout = []
+    position = mdat_start
+    for first in range(0, frame_count, samples_per_chunk):
+        chunk = samples[first : first + samples_per_chunk]
+        for _ in chunk:
+            video_offsets.append(position)
+            position += VIDEO_SAMPLE_SIZE
+            layout.append(video_sample)
+        metadata_offsets.append(position)
+        for sample in chunk:
+            position += len(sample)
+            layout.append(sample)
+
+    timescale = int(round(frame_rate * 1000))
+    sample_delta = 1000
+    movie_duration = int(round(duration * MOVIE_TIMESCALE))
+
+    moov = _box(
+        b"moov",
+        _mvhd(movie_duration)
+        + _trak(
+            1,
+            b"vide",
+            timescale,
+            sample_delta,
+            [VIDEO_SAMPLE_SIZE] * frame_count,
+            video_offsets,
+            width=3840,
+            height=2160,
+            use_co64=use_co64,
+        )
+        + _trak(2, b"soun", 48000, 1024, [], [], use_co64=use_co64)
+        + _trak(
+            3,
+            b"meta",
+            timescale,
+            sample_delta,
+            [len(sample) for sample in samples],
+            metadata_offsets,
+            use_co64=use_co64,
+            samples_per_chunk=samples_per_chunk,
+        ),
+    )
+
+    with open(path, "wb") as f:
+        f.write(ftyp)
+        f.write(struct.pack(">I4s", 8 + position - mdat_start, b"mdat"))
+        f.writelines(layout)
+        f.write(moov)
+
+    return frame_count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic DJI-style MP4 with a GPS metadata track",
+    )
+    parser.add_argument("output", help="Output MP4 file.")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--frame-rate", type=float, default=30.0)
+    parser.add_argument("--no-extensions", action="store_true")
+    parser.add_argument("--co64", action="store_true")
+    parser.add_argument("--samples-per-chunk", type=int, default=1)
+    args = parser.parse_args()
+    count = write_synthetic_mp4(
+        args.output,
+        duration=args.duration,
+        frame_rate=args.frame_rate,
+        extensions=not args.no_extensions,
+        use_co64=args.co64,
+        samples_per_chunk=args.samples_per_chunk,
+    )
+    print(f"Wrote {count} metadata samples to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
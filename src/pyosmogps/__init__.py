@@ -1,9 +1,33 @@
+from importlib import import_module
 from typing import NamedTuple
 
-from .pyosmogps import OsmoGps  # noqa: F401
-
 __package_name__ = "pyosmogps"
 
+# The public classes and functions are imported on first access, so that
+# importing the package or running "pyosmogps --version" does not load numpy,
+# protobuf and the rest of the extraction code
+_LAZY_ATTRIBUTES = {
+    "ExtractionCache": ".cache",
+    "iter_gps_points": ".metadata_manager",
+    "iter_gps_tracks": ".metadata_manager",
+    "LowPassResampler": ".data_filters",
+    "OsmoGps": ".pyosmogps",
+    "aiter_extract": ".pyosmogps",
+    "probe": ".pyosmogps",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
 
 class _VersionInfo(NamedTuple):
     major: int
@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from .defaults import DEFAULT_CACHE_SIZE
+from .gps_track import GpsTrack
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+# Bump when the content of the cache entries changes
+CACHE_FORMAT_VERSION = 1
+CACHE_SUFFIX = ".npz"
+
+
+def default_cache_dir():
+    """Return the default cache directory, following the XDG convention."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "pyosmogps")
+
+
+class ExtractionCache:
+    """
+    On-disk cache of the GPS tracks decoded from the video files.
+
+    The entries hold the track before any resampling, with times in the
+    camera timezone (no offset applied), and are stored as uncompressed npz
+    files. They are keyed by the size and modification time of the video
+    file, a hash of its metadata sample table and the extensions flag.
+    When the total size exceeds max_size, the least recently used entries
+    are removed.
+    """
+
+    directory = None
+    max_size = DEFAULT_CACHE_SIZE
+
+    def __init__(self, directory=None, max_size=DEFAULT_CACHE_SIZE):
+        """
+        :param directory: Cache directory, defaults to default_cache_dir().
+        :param max_size: Maximum total size of the cache entries, in bytes.
+        """
+        self.directory = directory if directory is not None else default_cache_dir()
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, mp4_file, mp4, extract_extensions, start=None, end=None):
+        """
+        Compute the cache key of a video file.
+
+        :param mp4_file: Path of the video file.
+        :param mp4: MP4Manager of the file, with the sample table parsed.
+        :param extract_extensions: Whether the extensions are extracted.
+        :param start: Start of the extracted time window, if any.
+        :param end: End of the extracted time window, if any.
+        :return: Hexadecimal key.
+        """
+        stat = os.stat(mp4_file)
+        table_hash = hashlib.sha256()
+        table_hash.update(np.ascontiguousarray(mp4.offsets, dtype="<u8").tobytes())
+        table_hash.update(np.ascontiguousarray(mp4.sizes, dtype="<u4").tobytes())
+        identity = (
+            f"{CACHE_FORMAT_VERSION}:{stat.st_size}:{stat.st_mtime_ns}:"
+            f"{table_hash.hexdigest()}:{bool(extract_extensions)}"
+        )
+        if start is not None or end is not None:
+            identity += f":{start}:{end}"
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """
+        Load a cache entry.
+
+        :param key: Cache key.
+        :return: Tuple with the GpsTrack and the frame rate, or None if the
+            entry is not in the cache.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                timeinfo = entry["timeinfo"]
+                frame_rate = float(entry["frame_rate"])
+                fields = {
+                    name[len("field_") :]: entry[name]
+                    for name in entry.files
+                    if name.startswith("field_")
+                }
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        logger.info(f"Loaded GPS data from the cache: {path}")
+        return GpsTrack(timeinfo, fields), None if np.isnan(frame_rate) else frame_rate
+
+    def put(self, key, gps_data, frame_rate):
+        """
+        Store a cache entry, then evict the old entries if needed.
+
+        :param key: Cache key.
+        :param gps_data: GpsTrack to store.
+        :param frame_rate: Frame rate of the GPS data.
+        """
+        arrays = {
+            "timeinfo": gps_data.timeinfo,
+            "frame_rate": np.float64(np.nan if frame_rate is None else frame_rate),
+        }
+        arrays.update({f"field_{name}": gps_data[name] for name in gps_data.fields})
+
+        # Write to a temporary file first, so readers never see partial entries
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        """
+        List the cache entries.
+
+        :return: List of (path, size, last use time) tuples, oldest first.
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(CACHE_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries exceeding max_size."""
+        entries = self.entries()
+        total_size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total_size <= self.max_size:
+                break
+            logger.info(f"Evicting cache entry {path}")
+            self._remove(path)
+            total_size -= size
+
+    def clear(self):
+        """Remove all the cache entries."""
+        for path, _, _ in self.entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,18 +1,89 @@
-from datetime import timedelta
+from fractions import Fraction
 
 import numpy as np
-from scipy.signal import butter, filtfilt
+
+from .gps_track import TIME_DTYPE, GpsTrack
+
+# Order of the Butterworth filter of the lpf method
+LPF_ORDER = 4
+# The backward pass of the streaming low pass filter looks ahead until the
+# error of its initial state has decayed below this fraction
+LPF_LOOKAHEAD_TOLERANCE = 1e-12
+# Size of the blocks of a track in memory fed to the streaming filter, in
+# lookahead windows
+LPF_BLOCK_SIZE = 8
+# Mean radius of the Earth in meters, used to measure the simplification
+# tolerance
+EARTH_RADIUS = 6371008.8
+
+# Largest up or down factor of the polyphase method, which sets the length
+# of its filter
+POLYPHASE_MAX_FACTOR = 10000
+# Largest relative error of the output rate of the polyphase method when the
+# ratio of the frequencies is approximated
+POLYPHASE_RATE_TOLERANCE = 1e-5
+# Number of points measured at once by the simplification, small enough for
+# the temporary arrays to stay in the CPU cache
+SIMPLIFY_BATCH_SIZE = 16384
+
+
+def _as_track(gps_info):
+    """Accept the legacy list of dicts where a GpsTrack is expected."""
+    if isinstance(gps_info, GpsTrack):
+        return gps_info
+    return GpsTrack.from_dicts(gps_info)
+
+
+def _resample_segments(gps_info, input_frequency, resample):
+    """
+    Resample each segment of a track on its own, so that no samples are
+    generated in the gaps between the segments.
+
+    :param gps_info: GpsTrack containing GPS data.
+    :param input_frequency: Original frequency of the GPS data (Hz), or a
+        sequence with the frequency of each segment.
+    :param resample: Function resampling a single segment, called with the
+        segment and its input frequency.
+    :return: Resampled GpsTrack, with the same number of segments unless some
+        of them are too short to produce any sample.
+    """
+    gps_info = _as_track(gps_info)
+    segments = gps_info.segments()
+    if np.ndim(input_frequency) == 0:
+        input_frequency = [input_frequency] * len(segments)
+    elif len(input_frequency) != len(segments):
+        raise ValueError(
+            f"Got {len(input_frequency)} input frequencies for "
+            f"{len(segments)} segments."
+        )
+    if len(segments) == 1:
+        return resample(segments[0], input_frequency[0])
+    return GpsTrack.concatenate(
+        resample(segment, frequency)
+        for segment, frequency in zip(segments, input_frequency)
+    )
 
 
 def discard_resample_gps_data(gps_info, input_frequency, output_frequency):
     """
     Resample the GPS data by discarding samples.
 
-    :param gps_info: List of dicts containing GPS data.
-    :param input_frequency: Original frequency of the GPS data (Hz).
+    :param gps_info: GpsTrack containing GPS data.
+    :param input_frequency: Original frequency of the GPS data (Hz), or a
+        sequence with the frequency of each segment.
     :param output_frequency: Desired frequency of the GPS data (Hz).
-    :return: Resampled list of dicts.
+    :return: Resampled GpsTrack.
     """
+    return _resample_segments(
+        gps_info,
+        input_frequency,
+        lambda segment, frequency: _discard_segment(
+            segment, frequency, output_frequency
+        ),
+    )
+
+
+def _discard_segment(gps_info, input_frequency, output_frequency):
     if output_frequency > input_frequency:
         raise ValueError("Output frequency cannot be higher than input frequency.")
 
@@ -26,114 +97,626 @@ def discard_resample_gps_data(gps_info, input_frequency, output_frequency):
     return resampled_data
 
 
-def lpf_resample_gps_data(gps_info, input_frequency, output_frequency):
+def _resample_timebase(gps_info, output_frequency):
     """
-    Resample the GPS data using a low pass filter method.
+    Compute the output timebase shared by the interpolating resamplers.
 
-    :param gps_info: List of dicts containing GPS data.
-    :param input_frequency: Original frame rate of the GPS data (Hz).
+    :param gps_info: GpsTrack containing GPS data.
     :param output_frequency: Desired frequency of the GPS data (Hz).
-    :return: Resampled list of dicts.
+    :return: Tuple with the new timestamps, the original timestamps in seconds
+        from the first sample and the new timestamps in seconds from the first
+        sample.
     """
+    if len(gps_info) == 0:
+        return gps_info.timeinfo, np.zeros(0), np.zeros(0)
+    start = gps_info.timeinfo[0]
+    original_offsets = (gps_info.timeinfo - start).astype(np.int64)
+    total_duration = original_offsets[-1] / 1e6
+    num_samples = int(total_duration * output_frequency)
 
-    # Calculate cutoff frequency
-    cutoff_frequency = output_frequency / 4.0
+    # Round to the microsecond resolution of the time column, like timedelta
+    new_offsets = np.rint(np.arange(num_samples) / output_frequency * 1e6).astype(
+        np.int64
+    )
+    new_timestamps = start + new_offsets.astype("timedelta64[us]")
 
-    # Design the Butterworth low-pass filter
-    nyquist = 0.5 * input_frequency
-    normal_cutoff = cutoff_frequency / nyquist
-    b, a = butter(4, normal_cutoff, btype="low", analog=False)
+    return new_timestamps, original_offsets / 1e6, new_offsets / 1e6
 
-    # Apply the filter to each field
-    resampled_data = []
 
-    original_timestamps = [entry["timeinfo"] for entry in gps_info]
-    total_duration = (original_timestamps[-1] - original_timestamps[0]).total_seconds()
-    num_samples = int(total_duration * output_frequency)
-    new_timestamps = [
-        original_timestamps[0] + timedelta(seconds=i / output_frequency)
-        for i in range(num_samples)
-    ]
+def _interpolate_gps_data(gps_info, output_frequency, field_filter=None):
+    """
+    Interpolate every field of the GPS data on a regular output timebase.
+
+    Each field is optionally filtered and interpolated exactly once, so the
+    cost grows linearly with the number of samples.
+
+    :param gps_info: GpsTrack containing GPS data.
+    :param output_frequency: Desired frequency of the GPS data (Hz).
+    :param field_filter: Optional function applied to the values of each field
+        before the interpolation.
+    :return: Resampled GpsTrack.
+    """
+    new_timestamps, original_timestamps_seconds, new_timestamps_seconds = (
+        _resample_timebase(gps_info, output_frequency)
+    )
+
+    resampled_fields = {}
+    for key in gps_info.field_names():
+        values = gps_info[key]
+        if field_filter is not None:
+            values = field_filter(values)
 
-    original_timestamps_seconds = np.array(
-        [(t - original_timestamps[0]).total_seconds() for t in original_timestamps]
+        resampled_fields[key] = np.interp(
+            new_timestamps_seconds, original_timestamps_seconds, values
+        )
+
+    return GpsTrack(new_timestamps, resampled_fields)
+
+
+def lpf_resample_gps_data(gps_info, input_frequency, output_frequency):
+    """
+    Resample the GPS data using a low pass filter method.
+
+    :param gps_info: GpsTrack containing GPS data.
+    :param input_frequency: Original frame rate of the GPS data (Hz), or a
+        sequence with the frame rate of each segment.
+    :param output_frequency: Desired frequency of the GPS data (Hz).
+    :return: Resampled GpsTrack.
+    """
+    return _resample_segments(
+        gps_info,
+        input_frequency,
+        lambda segment, frequency: _lpf_segment(segment, frequency, output_frequency),
     )
 
-    for new_time in new_timestamps:
-        new_entry = {"timeinfo": new_time}
 
-        for key in gps_info[0].keys():
-            if key == "timeinfo":
-                continue
+def _lpf_segment(gps_info, input_frequency, output_frequency):
+    # Fed in blocks of a few lookahead windows, the filter then works on
+    # small arrays whatever the length of the segment
+    resampler = LowPassResampler(input_frequency, output_frequency)
+    block_size = LPF_BLOCK_SIZE * resampler.lookahead
+    chunks = [
+        resampler.feed(gps_info[start : start + block_size])
+        for start in range(0, max(len(gps_info), 1), block_size)
+    ]
+    chunks.append(resampler.flush())
+    return _join_chunks(chunks)
+
+
+def _join_chunks(chunks):
+    """Join consecutive chunks of the same segment into a single track."""
+    chunks = [chunk for chunk in chunks if len(chunk) > 0] or chunks[:1]
+    if len(chunks) == 1:
+        return chunks[0]
+    return GpsTrack(
+        np.concatenate([chunk.timeinfo for chunk in chunks]),
+        {
+            key: np.concatenate([chunk[key] for chunk in chunks])
+            for key in chunks[0].field_names()
+        },
+    )
 
-            # Extract values for the current key
-            values = np.array([entry[key] for entry in gps_info])
 
-            # Apply the low-pass filter
-            filtered_values = filtfilt(b, a, values)
+class LowPassResampler:
+    """
+    Streaming low pass filter and resampler of a segment of GPS data.
+
+    The points are fed in chunks, e.g. from iter_gps_tracks, and each call
+    returns the resampled points that are ready, so a whole recording is
+    resampled with bounded memory. The result is the same as filtering the
+    whole segment at once with a zero phase Butterworth filter (sosfiltfilt)
+    and interpolating it on the output timebase.
+
+    The filter is designed as second-order sections. The forward pass keeps
+    its state between the chunks, while the backward pass needs the samples
+    that follow: it is run over the last lookahead samples as well, starting
+    from the steady state of the last one, and only the samples before them
+    are emitted. The lookahead is long enough for the error of that initial
+    state to decay below LPF_LOOKAHEAD_TOLERANCE, and the memory is bounded
+    by twice the lookahead window instead of the length of the recording.
+    At the start and at the end of the segment the signal is extended with
+    an odd reflection, like filtfilt.
+    """
 
-            # Interpolate the filtered data to match the new timestamps
-            new_value = np.interp(
-                (new_time - original_timestamps[0]).total_seconds(),
-                original_timestamps_seconds,
-                filtered_values,
+    input_frequency = None
+    output_frequency = None
+    lookahead = 0
+
+    def __init__(self, input_frequency, output_frequency, lookahead=None):
+        """
+        :param input_frequency: Frame rate of the GPS data (Hz).
+        :param output_frequency: Desired frequency of the GPS data (Hz).
+        :param lookahead: Number of samples that the backward pass of the
+            filter looks ahead, computed from the filter by default.
+        """
+        # scipy.signal takes longer to import than the rest of the package, it is
+        # only loaded when the lpf method is used
+        from scipy.signal import butter, sosfilt, sosfilt_zi
+
+        # Cutoff at a quarter of the output frequency
+        normal_cutoff = (output_frequency / 4.0) / (0.5 * input_frequency)
+        if not 0 < normal_cutoff < 1:
+            raise ValueError(
+                "Invalid cutoff frequency. Check input and output frequencies."
+            )
+        self.input_frequency = input_frequency
+        self.output_frequency = output_frequency
+        self._sosfilt = sosfilt
+        self._sos = butter(LPF_ORDER, normal_cutoff, btype="low", output="sos")
+        # Filter state for a single field, the values have one row per field
+        self._zi = sosfilt_zi(self._sos)[:, np.newaxis, :]
+        # Length of the odd extension of sosfiltfilt
+        self._padlen = 3 * (
+            2 * len(self._sos)
+            + 1
+            - min((self._sos[:, 2] == 0).sum(), (self._sos[:, 5] == 0).sum())
+        )
+        if lookahead is None:
+            lookahead = _decay_length(self._sos, LPF_LOOKAHEAD_TOLERANCE)
+        self.lookahead = max(lookahead, self._padlen)
+        self._fields = None
+        self._reset()
+
+    def _reset(self):
+        self._start = None
+        # Input samples (offsets from the start in microseconds and values),
+        # all of them until the filter starts, then the last ones needed to
+        # extend the end of the signal
+        self._raw_offsets = None
+        self._raw = None
+        # Forward filtered samples waiting for the backward pass
+        self._forward_state = None
+        self._pending_offsets = None
+        self._pending = None
+        # Filtered samples from the one preceding the next output sample,
+        # interpolated with the next ones
+        self._tail_offsets = None
+        self._tail = None
+        self._next_index = 0
+
+    def feed(self, gps_info):
+        """
+        Add the next points of the segment.
+
+        :param gps_info: GpsTrack with the next points of the segment, all with
+            the same fields.
+        :return: GpsTrack with the resampled points that are ready.
+        """
+        if self._fields is None:
+            self._fields = gps_info.field_names()
+        if len(gps_info) == 0:
+            return self._output()
+        if self._start is None:
+            self._start = gps_info.timeinfo[0]
+            self._raw_offsets = self._pending_offsets = self._tail_offsets = np.zeros(
+                0, dtype=np.int64
+            )
+            self._raw = self._pending = self._tail = np.zeros((len(self._fields), 0))
+        offsets = (gps_info.timeinfo - self._start).astype(np.int64)
+        values = np.stack([gps_info[key] for key in self._fields])
+
+        if self._forward_state is None:
+            offsets = _append(self._raw_offsets, offsets)
+            values = _append(self._raw, values)
+            # The odd extension of the start needs padlen + 1 samples
+            if len(offsets) <= self._padlen:
+                self._raw_offsets, self._raw = offsets, values
+                return self._output()
+            extension = 2 * values[:, :1] - values[:, self._padlen : 0 : -1]
+            _, self._forward_state = self._sosfilt(
+                self._sos, extension, zi=self._zi * extension[:, :1]
+            )
+            raw_offsets, raw = offsets, values
+        else:
+            raw_offsets = _append(self._raw_offsets, offsets[-(self._padlen + 1) :])
+            raw = _append(self._raw, values[:, -(self._padlen + 1) :])
+        self._raw_offsets = raw_offsets[-(self._padlen + 1) :]
+        self._raw = raw[:, -(self._padlen + 1) :]
+
+        filtered, self._forward_state = self._sosfilt(
+            self._sos, values, zi=self._forward_state
+        )
+        self._pending_offsets = _append(self._pending_offsets, offsets)
+        self._pending = _append(self._pending, filtered)
+        # Wait for lookahead samples more than the lookahead window, so that
+        # each sample goes through at most two backward passes
+        if len(self._pending_offsets) < 2 * self.lookahead:
+            return self._output()
+        ready = len(self._pending_offsets) - self.lookahead
+
+        values = self._backward(self._pending)[:, :ready]
+        offsets = self._pending_offsets[:ready]
+        self._pending_offsets = self._pending_offsets[ready:]
+        self._pending = self._pending[:, ready:]
+        return self._output(offsets, values)
+
+    def flush(self):
+        """
+        End the segment, the resampler can then be fed the next one.
+
+        :return: GpsTrack with the remaining resampled points.
+        """
+        if self._start is None:
+            output = self._output()
+        elif self._forward_state is None:
+            # Too short to be filtered, only interpolated
+            output = self._output(self._raw_offsets, self._raw)
+        else:
+            # Odd extension of the end, filtered forward with the rest
+            x = self._raw
+            extension = 2 * x[:, -1:] - x[:, -2 : -(self._padlen + 2) : -1]
+            filtered, _ = self._sosfilt(self._sos, extension, zi=self._forward_state)
+            values = self._backward(np.concatenate([self._pending, filtered], axis=1))
+            output = self._output(
+                self._pending_offsets, values[:, : len(self._pending_offsets)]
+            )
+        self._reset()
+        return output
+
+    def _backward(self, values):
+        """Filter backward, starting from the steady state of the last value."""
+        reverse = values[:, ::-1]
+        filtered, _ = self._sosfilt(self._sos, reverse, zi=self._zi * reverse[:, :1])
+        return filtered[:, ::-1]
+
+    def _output(self, offsets=None, values=None):
+        """
+        Interpolate the filtered samples on the output timebase.
+
+        The output samples are the ones of _resample_timebase for the samples
+        seen so far, each one emitted once a filtered sample follows it.
+
+        :param offsets: Offsets of the new filtered samples, in microseconds.
+        :param values: Values of the new filtered samples, one row per field.
+        :return: GpsTrack with the new output samples.
+        """
+        end_index = self._next_index
+        if offsets is not None and len(offsets) > 0:
+            offsets = _append(self._tail_offsets, offsets)
+            values = _append(self._tail, values)
+            end_index = int(offsets[-1] / 1e6 * self.output_frequency)
+        if end_index <= self._next_index:
+            if offsets is not None and len(offsets) > 0:
+                self._tail_offsets, self._tail = offsets, values
+            return GpsTrack(
+                np.zeros(0, dtype=TIME_DTYPE), {key: [] for key in self._fields or []}
             )
 
-            new_entry[key] = new_value
+        # Rounded to the microsecond resolution of the time column, like the
+        # timebase of the whole segment
+        new_offsets = np.rint(
+            np.arange(self._next_index, end_index) / self.output_frequency * 1e6
+        ).astype(np.int64)
+        new_seconds = new_offsets / 1e6
+        seconds = offsets / 1e6
+        output = GpsTrack(
+            self._start + new_offsets.astype("timedelta64[us]"),
+            {
+                key: np.interp(new_seconds, seconds, row)
+                for key, row in zip(self._fields, values)
+            },
+        )
+
+        # Keep the samples from the one np.interp uses for the next output
+        self._next_index = end_index
+        next_offset = np.rint(end_index / self.output_frequency * 1e6)
+        keep = max(np.searchsorted(offsets, next_offset, side="right") - 1, 0)
+        self._tail_offsets, self._tail = offsets[keep:], values[:, keep:]
+        return output
+
+
+def _append(array, values):
+    """Append values along the last axis, without a copy if array is empty."""
+    if array.shape[-1] == 0:
+        return values
+    return np.concatenate([array, values], axis=-1)
+
+
+def _decay_length(sos, tolerance):
+    """
+    Number of samples after which the impulse response of a filter has
+    decayed below tolerance, from the radius of its slowest pole.
+    """
+    from scipy.signal import sos2zpk
 
-        resampled_data.append(new_entry)
+    _, poles, _ = sos2zpk(sos)
+    radius = np.abs(poles).max()
+    return int(np.ceil(np.log(tolerance) / np.log(radius)))
 
-    return resampled_data
+
+def polyphase_resample_gps_data(gps_info, input_frequency, output_frequency):
+    """
+    Resample the GPS data with a polyphase anti-aliasing filter.
+
+    The ratio between the output and input frequencies is written as a
+    fraction up / down, and scipy.signal.resample_poly upsamples by up, low
+    pass filters and keeps one sample every down in a single pass, computing
+    only the output samples. The samples are assumed to be evenly spaced at
+    the input frequency, so the output samples are evenly spaced at the
+    output frequency from the first sample of each segment.
+
+    :param gps_info: GpsTrack containing GPS data.
+    :param input_frequency: Original frame rate of the GPS data (Hz), or a
+        sequence with the frame rate of each segment.
+    :param output_frequency: Desired frequency of the GPS data (Hz). The
+        ratio with the input frequency is exact when its terms are at most
+        POLYPHASE_MAX_FACTOR, otherwise it is approximated within
+        POLYPHASE_RATE_TOLERANCE.
+    :return: Resampled GpsTrack.
+    """
+    return _resample_segments(
+        gps_info,
+        input_frequency,
+        lambda segment, frequency: _polyphase_segment(
+            segment, frequency, output_frequency
+        ),
+    )
+
+
+def _polyphase_ratio(input_frequency, output_frequency):
+    """
+    Return the up and down factors of the polyphase method.
+
+    The frequencies are first read as the decimal numbers they are written
+    as, so e.g. 0.1 Hz from 30 fps is exactly 1 / 300. When the terms of the
+    exact ratio are too large, e.g. for 30000 / 1001 fps written as a float,
+    the ratio is approximated keeping its largest term under
+    POLYPHASE_MAX_FACTOR.
+
+    :raise ValueError: If the approximated output rate is off by more than
+        POLYPHASE_RATE_TOLERANCE.
+    """
+    if input_frequency <= 0 or output_frequency <= 0:
+        raise ValueError("The polyphase frequencies must be positive.")
+    ratio = Fraction(str(output_frequency)) / Fraction(str(input_frequency))
+    if max(ratio.numerator, ratio.denominator) > POLYPHASE_MAX_FACTOR:
+        exact = ratio
+        # limit_denominator bounds the denominator, invert the ratio to bound
+        # the numerator when upsampling
+        if exact <= 1:
+            ratio = exact.limit_denominator(POLYPHASE_MAX_FACTOR)
+        else:
+            ratio = 1 / (1 / exact).limit_denominator(POLYPHASE_MAX_FACTOR)
+        error = abs(ratio / exact - 1) if ratio else 1
+        if error > POLYPHASE_RATE_TOLERANCE:
+            raise ValueError(
+                f"Cannot resample from {input_frequency} Hz to {output_frequency} "
+                "Hz with the polyphase method, the ratio of the frequencies has "
+                "no close approximation with small terms. Use another method."
+            )
+    return ratio.numerator, ratio.denominator
+
+
+def _polyphase_segment(gps_info, input_frequency, output_frequency):
+    # Only loaded when the polyphase method is used, like for lpf
+    from scipy.signal import resample_poly
+
+    up, down = _polyphase_ratio(input_frequency, output_frequency)
+    keys = gps_info.field_names()
+    if len(gps_info) == 0 or not keys:
+        return gps_info
+
+    # Output sample k is at the input position k * down / up, the ones after
+    # the last input sample are dropped
+    count = (len(gps_info) - 1) * up // down + 1
+    # Extended with a line at the edges instead of zeros, the coordinates
+    # are far from zero
+    resampled = resample_poly(
+        np.stack([gps_info[key] for key in keys]), up, down, axis=1, padtype="line"
+    )[:, :count]
+
+    # The samples are evenly spaced at the input frequency, the datetimes of
+    # the cameras only have a resolution of one second. Rounded to the
+    # microsecond resolution of the time column, like _resample_timebase
+    new_offsets = np.rint(np.arange(count) * down / up / input_frequency * 1e6).astype(
+        np.int64
+    )
+    return GpsTrack(
+        gps_info.timeinfo[0] + new_offsets.astype("timedelta64[us]"),
+        dict(zip(keys, resampled)),
+    )
 
 
 def linear_resample_gps_data(gps_info, input_frequency, output_frequency):
     """
     Resample the GPS data using a linear interpolation method.
 
-    :param gps_info: List of dicts containing GPS data.
-    :param input_frequency: Original frame rate of the GPS data (Hz).
+    :param gps_info: GpsTrack containing GPS data.
+    :param input_frequency: Original frame rate of the GPS data (Hz), or a
+        sequence with the frame rate of each segment.
     :param output_frequency: Desired frequency of the GPS data (Hz).
-    :return: Resampled list of dicts.
+    :return: Resampled GpsTrack.
     """
+    return _resample_segments(
+        gps_info,
+        input_frequency,
+        lambda segment, frequency: _interpolate_gps_data(segment, output_frequency),
+    )
 
-    # Calculate total duration and the new sample interval
-    total_duration = (
-        gps_info[-1]["timeinfo"] - gps_info[0]["timeinfo"]
-    ).total_seconds()
-    num_samples = int(total_duration * output_frequency)
-    new_timestamps = [
-        gps_info[0]["timeinfo"] + timedelta(seconds=i / output_frequency)
-        for i in range(num_samples)
-    ]
 
-    resampled_data = []
+def simplify_gps_data(gps_info, tolerance):
+    """
+    Simplify the GPS data with the Douglas-Peucker algorithm.
+
+    Each segment is reduced to the points needed to keep the shape of the
+    track: a point is dropped when it is closer than tolerance to the line
+    joining the points kept around it, so the straight and stationary
+    stretches are reduced to their ends. The distances are horizontal, in a
+    local equirectangular projection of the segment.
+
+    :param gps_info: GpsTrack containing GPS data, e.g. after resampling.
+    :param tolerance: Largest distance of a dropped point from the simplified
+        track, in meters.
+    :return: Simplified GpsTrack, with the same segments.
+    """
+    if tolerance < 0:
+        raise ValueError("The simplification tolerance cannot be negative.")
+    gps_info = _as_track(gps_info)
+    segments = gps_info.segments()
+    if len(segments) <= 1:
+        return _simplify_segment(gps_info, tolerance)
+    return GpsTrack.concatenate(
+        _simplify_segment(segment, tolerance) for segment in segments
+    )
+
 
-    # Extract original timestamps and values
-    original_timestamps = [entry["timeinfo"] for entry in gps_info]
-    original_timestamps_seconds = np.array(
-        [(t - original_timestamps[0]).total_seconds() for t in original_timestamps]
+def _simplify_segment(gps_info, tolerance):
+    if len(gps_info) <= 2:
+        return gps_info
+    x, y = _project(gps_info["latitude"], gps_info["longitude"])
+    keep = np.zeros(len(gps_info), dtype=bool)
+    keep[[0, -1]] = True
+    tolerance2 = tolerance**2
+
+    # Explicit stack of the ranges between two kept points that have inner
+    # points left to measure, each one measured once. The ranges on top of
+    # the stack are measured together, up to SIMPLIFY_BATCH_SIZE points, and
+    # the larger ones on their own in chunks, so the temporary arrays stay
+    # in the CPU cache. The ranges are disjoint, so at most half of the
+    # points start one
+    starts = np.empty(len(gps_info) // 2 + 1, dtype=np.int64)
+    ends = np.empty_like(starts)
+    starts[0], ends[0] = 0, len(gps_info) - 1
+    size = 1
+    while size > 0:
+        bottom = max(0, size - SIMPLIFY_BATCH_SIZE)
+        counts = ends[bottom:size] - starts[bottom:size] - 1
+        taken = np.searchsorted(
+            np.cumsum(counts[::-1]), SIMPLIFY_BATCH_SIZE, side="right"
+        )
+        if taken == 0:
+            size -= 1
+            range_starts, range_ends = starts[size : size + 1], ends[size : size + 1]
+            pivots, farthest = _farthest_point(x, y, int(starts[size]), int(ends[size]))
+        else:
+            size -= taken
+            range_starts, range_ends = (
+                starts[size : size + taken],
+                ends[size : size + taken],
+            )
+            pivots, farthest = _farthest_points(
+                x, y, range_starts, range_ends, counts[len(counts) - taken :]
+            )
+
+        split = farthest > tolerance2
+        pivots = pivots[split]
+        keep[pivots] = True
+        new_starts = np.concatenate([range_starts[split], pivots])
+        new_ends = np.concatenate([pivots, range_ends[split]])
+        inner = new_ends - new_starts > 1
+        pushed = np.count_nonzero(inner)
+        starts[size : size + pushed] = new_starts[inner]
+        ends[size : size + pushed] = new_ends[inner]
+        size += pushed
+
+    return gps_info[keep]
+
+
+def _farthest_points(x, y, starts, ends, counts):
+    """
+    Farthest inner point of several ranges from the segment joining their
+    ends, the first one if several are tied.
+
+    :param x: Projected x coordinates of the track.
+    :param y: Projected y coordinates of the track.
+    :param starts: Index of the first point of each range.
+    :param ends: Index of the last point of each range.
+    :param counts: Number of inner points of each range, at least one.
+    :return: Tuple with the index of the farthest point of each range and
+        its squared distance.
+    """
+    first = np.cumsum(counts) - counts
+    points = np.arange(counts.sum()) + np.repeat(starts + 1 - first, counts)
+    ax = x[starts]
+    ay = y[starts]
+    dx = x[ends] - ax
+    dy = y[ends] - ay
+    distances = _segment_distances2(
+        x[points],
+        y[points],
+        np.repeat(ax, counts),
+        np.repeat(ay, counts),
+        np.repeat(dx, counts),
+        np.repeat(dy, counts),
+        np.repeat(_inverse_length2(dx, dy), counts),
     )
+    farthest = np.maximum.reduceat(distances, first)
+    candidates = np.flatnonzero(distances == np.repeat(farthest, counts))
+    return points[candidates[np.searchsorted(candidates, first)]], farthest
 
-    # Interpolate each field
-    for new_time in new_timestamps:
-        new_entry = {"timeinfo": new_time}
 
-        for key in gps_info[0].keys():
-            if key == "timeinfo":
-                continue
+def _farthest_point(x, y, start, end):
+    """
+    Farthest inner point of a single range, see _farthest_points, measured
+    in chunks of SIMPLIFY_BATCH_SIZE points.
 
-            # Extract values for the current key
-            values = np.array([entry[key] for entry in gps_info])
+    :return: Tuple with one element arrays, the index of the farthest point
+        and its squared distance.
+    """
+    ax = x[start]
+    ay = y[start]
+    dx = x[end] - ax
+    dy = y[end] - ay
+    inverse = _inverse_length2(dx, dy)
+    pivot, farthest = start + 1, -1.0
+    for chunk in range(start + 1, end, SIMPLIFY_BATCH_SIZE):
+        chunk_end = min(chunk + SIMPLIFY_BATCH_SIZE, end)
+        distances = _segment_distances2(
+            x[chunk:chunk_end], y[chunk:chunk_end], ax, ay, dx, dy, inverse
+        )
+        i = np.argmax(distances)
+        if distances[i] > farthest:
+            pivot, farthest = chunk + i, distances[i]
+    return np.array([pivot]), np.array([farthest])
+
+
+def _inverse_length2(dx, dy):
+    """
+    Inverse of the squared lengths of segments, 0 for the degenerate ones,
+    e.g. a stationary stretch, whose points are measured from their start.
+    """
+    length2 = np.asarray(dx * dx + dy * dy)
+    return np.divide(1.0, length2, out=np.zeros_like(length2), where=length2 > 0)
 
-            # Interpolate linearly
-            new_value = np.interp(
-                (new_time - original_timestamps[0]).total_seconds(),
-                original_timestamps_seconds,
-                values,
-            )
 
-            new_entry[key] = new_value
+def _project(latitude, longitude):
+    """
+    Project the coordinates on a plane tangent at the mean latitude.
 
-        resampled_data.append(new_entry)
+    :return: Tuple with the x and y arrays, in meters.
+    """
+    latitude = np.radians(latitude)
+    # Continuous across the antimeridian
+    longitude = np.unwrap(np.radians(longitude))
+    scale = np.cos(latitude.mean())
+    return EARTH_RADIUS * scale * longitude, EARTH_RADIUS * latitude
 
-    return resampled_data
+
+def _segment_distances2(px, py, ax, ay, dx, dy, inverse):
+    """
+    Squared distances of points from segments.
+
+    The arguments are arrays with one element for each point, or scalars
+    for a single segment.
+
+    :param px: x coordinates of the points.
+    :param py: y coordinates of the points.
+    :param ax: x coordinate of the start of the segments.
+    :param ay: y coordinate of the start of the segments.
+    :param dx: x extent of the segments.
+    :param dy: y extent of the segments.
+    :param inverse: Inverse of the squared lengths, see _inverse_length2.
+    :return: Array of squared distances, one for each point.
+    """
+    rx = px - ax
+    ry = py - ay
+    t = rx * dx
+    t += ry * dy
+    t *= inverse
+    np.clip(t, 0.0, 1.0, out=t)
+    rx -= t * dx
+    ry -= t * dy
+    rx *= rx
+    ry *= ry
+    rx += ry
+    return rx
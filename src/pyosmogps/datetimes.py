@@ -0,0 +1,32 @@
+import logging
+import re
+from datetime import timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+# Format of the GPS datetime strings written by the cameras,
+# e.g. "2025-01-26 10:00:00"
+DATETIME_FORMAT = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d{1,6})?")
+
+
+def parse_datetime_fallback(value):
+    """
+    Parse a datetime string that does not match the camera format.
+
+    :param value: Datetime string.
+    :return: numpy datetime64, NaT if the string cannot be parsed. The
+        datetimes with a timezone are converted to UTC.
+    """
+    # Only needed for the files not written by the camera
+    from dateutil import parser
+
+    try:
+        date = parser.parse(value)
+    except (ValueError, OverflowError) as e:
+        logger.warning(f"Error parsing GPS datetime '{value}': {e}")
+        return np.datetime64("NaT")
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(date, "us")
@@ -0,0 +1,28 @@
+"""
+Default values shared by the modules and the command line.
+
+This module must not import anything: the command line reads these values
+to build its parser, and the modules doing the work, with their heavy
+dependencies, are only imported by the commands using them.
+"""
+
+# Extraction cache (cache.py), in bytes
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+# Resampling methods of OsmoGps.resample (data_filters.py), 'none' keeps all
+# the samples
+RESAMPLING_METHODS = ["discard", "linear", "lpf", "polyphase", "none"]
+
+# Suffix of the track archives (track_archive.py)
+ARCHIVE_SUFFIX = ".pgta"
+
+# Gaps between the metadata samples smaller than this are read through
+# instead of seeking (io_planner.py), in bytes
+MAX_READ_GAP = 64 * 1024
+# Smallest read issued when looking for the boxes of a file, so that the
+# headers of the small boxes at the start of the file come with a single read
+# (io_planner.py), in bytes
+READ_AHEAD = 64 * 1024
+
+# Seconds between two polls of the folder watcher (watcher.py)
+DEFAULT_POLL_INTERVAL = 2.0
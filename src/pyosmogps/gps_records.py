@@ -0,0 +1,111 @@
+import logging
+
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from google.protobuf.internal import api_implementation
+
+from . import dji_pb2
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+_PACKAGE = "pyosmogps_records"
+
+# Reduced copies of the dji.proto messages holding only the fields that are
+# extracted: name -> (source message, {field: reduced message type or None to
+# keep the source type}). The fields left out are not decoded, the parser
+# skips them as unknown fields. Most of a DjiGpsInfo is the camera_info,
+# which is only needed for the extensions.
+_RECORD_MESSAGES = {
+    "RemoteGpsRecord": ("DjiRemoteGpsInfo", {"coordinates": None}),
+    "GpsRecord": ("DjiGpsInfo", {"remote_gps_info": "RemoteGpsRecord"}),
+    "CameraAccelRecord": (
+        "DjiCameraInfo",
+        {"accelerometer1": None, "accelerometer2": None},
+    ),
+    "RemoteGpsExtensionsRecord": (
+        "DjiRemoteGpsInfo",
+        {"coordinates": None, "derivatives": None},
+    ),
+    "GpsExtensionsRecord": (
+        "DjiGpsInfo",
+        {
+            "camera_info": "CameraAccelRecord",
+            "remote_gps_info": "RemoteGpsExtensionsRecord",
+        },
+    ),
+    # A whole sample of the metadata track
+    "GpsSample": (
+        "GenericMessage",
+        {"video_global_info": None, "video_stream_info": None, "gps_info": "GpsRecord"},
+    ),
+    "GpsExtensionsSample": (
+        "GenericMessage",
+        {
+            "video_global_info": None,
+            "video_stream_info": None,
+            "gps_info": "GpsExtensionsRecord",
+        },
+    ),
+}
+
+
+def protobuf_backend():
+    """
+    Return the protobuf backend in use: 'upb' or 'cpp' for the fast native
+    ones, 'python' for the pure Python one.
+    """
+    return api_implementation.Type()
+
+
+def _build_record_classes():
+    """
+    Build the message classes of _RECORD_MESSAGES from the descriptors of
+    dji.proto. They are added to the default descriptor pool, so the fields
+    keeping their source type are instances of the dji_pb2 classes.
+
+    :return: Dict mapping the message names to their classes.
+    """
+    dji_file = descriptor_pb2.FileDescriptorProto()
+    dji_pb2.DESCRIPTOR.CopyToProto(dji_file)
+    sources = {message.name: message for message in dji_file.message_type}
+
+    records_file = descriptor_pb2.FileDescriptorProto(
+        name="pyosmogps_records.proto",
+        package=_PACKAGE,
+        syntax=dji_file.syntax,
+        dependency=[dji_file.name],
+    )
+    for name, (source, fields) in _RECORD_MESSAGES.items():
+        message = records_file.message_type.add(name=name)
+        for field in sources[source].field:
+            if field.name not in fields:
+                continue
+            copy = message.field.add()
+            copy.CopyFrom(field)
+            if fields[field.name] is not None:
+                copy.type_name = f".{_PACKAGE}.{fields[field.name]}"
+
+    pool = descriptor_pool.Default()
+    pool.AddSerializedFile(records_file.SerializeToString())
+    return {
+        name: message_factory.GetMessageClass(
+            pool.FindMessageTypeByName(f"{_PACKAGE}.{name}")
+        )
+        for name in _RECORD_MESSAGES
+    }
+
+
+_record_classes = _build_record_classes()
+
+# Messages with the same layout as DjiGpsInfo, decoding only the coordinates,
+# the datetime and the altitude, plus the extension fields for the second one
+GpsRecord = _record_classes["GpsRecord"]
+GpsExtensionsRecord = _record_classes["GpsExtensionsRecord"]
+# Messages with the same layout as GenericMessage, with the records above
+GpsSample = _record_classes["GpsSample"]
+GpsExtensionsSample = _record_classes["GpsExtensionsSample"]
+
+if protobuf_backend() == "python":
+    logger.warning(
+        "The pure Python protobuf backend is in use, the decoding of the GPS "
+        "data is much slower than with the upb backend of the protobuf package."
+    )
@@ -0,0 +1,201 @@
+import numpy as np
+
+TIME_DTYPE = "datetime64[us]"
+
+
+class GpsTrack:
+    """
+    Columnar container for GPS data.
+
+    The track stores one contiguous float64 array per field and a datetime64
+    array with the time of each sample. Columns are accessed by name, e.g.
+    ``track["latitude"]``, and are returned as arrays without copies.
+
+    The track is divided in segments, e.g. one for each input file, stored
+    as the indices of their first samples in ``segment_starts``. The
+    resamplers process each segment on its own, and the segments are written
+    as separate GPX track segments.
+
+    For compatibility with the former list of dicts representation, indexing
+    with an integer returns the sample as a dict, iterating over the track
+    yields one dict per sample and :meth:`to_dicts` returns the whole list.
+    """
+
+    timeinfo = None
+    fields = None
+    segment_starts = None
+
+    def __init__(self, timeinfo=None, fields=None, segment_starts=None):
+        """
+        :param timeinfo: Sequence of sample times, converted to datetime64.
+        :param fields: Dict mapping the field names to sequences of values.
+        :param segment_starts: Indices of the first sample of each segment,
+            defaults to a single segment.
+        """
+        if timeinfo is None:
+            timeinfo = []
+        self.timeinfo = np.asarray(timeinfo, dtype=TIME_DTYPE)
+        self.fields = {}
+        for key, values in (fields or {}).items():
+            values = np.ascontiguousarray(values, dtype=np.float64)
+            if len(values) != len(self.timeinfo):
+                raise ValueError(
+                    f"Field '{key}' has {len(values)} values, expected "
+                    f"{len(self.timeinfo)}."
+                )
+            self.fields[key] = values
+
+        if len(self.timeinfo) == 0:
+            segment_starts = []
+        elif segment_starts is None:
+            segment_starts = [0]
+        self.segment_starts = np.asarray(segment_starts, dtype=np.int64)
+        if len(self.timeinfo) > 0 and (
+            len(self.segment_starts) == 0
+            or self.segment_starts[0] != 0
+            or np.any(np.diff(self.segment_starts) <= 0)
+            or self.segment_starts[-1] >= len(self.timeinfo)
+        ):
+            raise ValueError("Invalid segment starts.")
+
+    @classmethod
+    def from_dicts(cls, gps_info):
+        """
+        Build a track from a list of dicts containing GPS data.
+
+        :param gps_info: List of dicts, each one with a 'timeinfo' key.
+        :return: GpsTrack instance.
+        """
+        if len(gps_info) == 0:
+            return cls()
+        keys = [key for key in gps_info[0].keys() if key != "timeinfo"]
+        return cls(
+            [entry["timeinfo"] for entry in gps_info],
+            {key: [entry[key] for entry in gps_info] for key in keys},
+        )
+
+    @classmethod
+    def concatenate(cls, tracks):
+        """
+        Join several tracks into a single one, each track starting a new
+        segment.
+
+        Empty tracks are ignored, the remaining ones must have the same fields.
+
+        :param tracks: Iterable of GpsTrack instances.
+        :return: GpsTrack instance.
+        """
+        tracks = [track for track in tracks if len(track) > 0]
+        if len(tracks) == 0:
+            return cls()
+        if len(tracks) == 1:
+            return tracks[0]
+        keys = tracks[0].field_names()
+        for track in tracks[1:]:
+            if track.field_names() != keys:
+                raise ValueError("Cannot concatenate tracks with different fields.")
+        offsets = np.cumsum([0] + [len(track) for track in tracks[:-1]])
+        return cls(
+            np.concatenate([track.timeinfo for track in tracks]),
+            {key: np.concatenate([track[key] for track in tracks]) for key in keys},
+            np.concatenate(
+                [
+                    track.segment_starts + offset
+                    for track, offset in zip(tracks, offsets)
+                ]
+            ),
+        )
+
+    def segments(self):
+        """
+        Return the segments of the track.
+
+        :return: List of GpsTrack instances, views of this track.
+        """
+        bounds = [*self.segment_starts.tolist(), len(self)]
+        return [
+            GpsTrack(
+                self.timeinfo[start:end],
+                {name: values[start:end] for name, values in self.fields.items()},
+            )
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+    def split_gaps(self, max_gap):
+        """
+        Start a new segment wherever the time between two consecutive samples
+        exceeds max_gap.
+
+        :param max_gap: Largest gap within a segment, in seconds.
+        :return: GpsTrack instance sharing the data of this track.
+        """
+        gaps = np.diff(self.timeinfo) > np.timedelta64(int(max_gap * 10**6), "us")
+        segment_starts = np.union1d(self.segment_starts, np.flatnonzero(gaps) + 1)
+        return GpsTrack(self.timeinfo, self.fields, segment_starts)
+
+    def field_names(self):
+        """Return the names of the data fields, without 'timeinfo'."""
+        return list(self.fields.keys())
+
+    def keys(self):
+        """Return the names of all the columns, starting with 'timeinfo'."""
+        return ["timeinfo"] + self.field_names()
+
+    def to_dicts(self):
+        """
+        Return the legacy view of the track, as a list of dicts.
+
+        :return: List of dicts with datetime 'timeinfo' and float values.
+        """
+        timeinfo = self.timeinfo.tolist()
+        columns = {key: values.tolist() for key, values in self.fields.items()}
+        return [
+            {"timeinfo": time, **{key: columns[key][i] for key in columns}}
+            for i, time in enumerate(timeinfo)
+        ]
+
+    def __len__(self):
+        return len(self.timeinfo)
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def __contains__(self, key):
+        return key == "timeinfo" or key in self.fields
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key == "timeinfo":
+                return self.timeinfo
+            return self.fields[key]
+        if isinstance(key, (int, np.integer)):
+            entry = {"timeinfo": self.timeinfo[key].item()}
+            for name, values in self.fields.items():
+                entry[name] = values[key].item()
+            return entry
+        # Slices return views, index arrays return copies
+        timeinfo = self.timeinfo[key]
+        return GpsTrack(
+            timeinfo,
+            {name: values[key] for name, values in self.fields.items()},
+            self._select_segments(key) if len(timeinfo) > 0 else None,
+        )
+
+    def _select_segments(self, key):
+        """Return the segment starts of the samples selected by key."""
+        if len(self.segment_starts) <= 1:
+            return None
+        if isinstance(key, slice):
+            indices = np.arange(*key.indices(len(self)))
+        else:
+            key = np.asarray(key)
+            indices = np.flatnonzero(key) if key.dtype == bool else key
+            indices = np.where(indices < 0, indices + len(self), indices)
+        segment_ids = np.searchsorted(self.segment_starts, indices, side="right")
+        return np.flatnonzero(np.diff(segment_ids, prepend=-1))
+
+    def __repr__(self):
+        return (
+            f"GpsTrack({len(self)} points, {len(self.segment_starts)} segments, "
+            f"fields={self.field_names()})"
+        )
@@ -0,0 +1,211 @@
+import gzip
+import heapq
+import logging
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from .datetimes import DATETIME_FORMAT, parse_datetime_fallback
+from .gps_track import TIME_DTYPE, GpsTrack
+from .gpx_writer import DEFAULT_BATCH_SIZE, GPX_EXTENSIONS, GpxWriter
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+
+class GpxPoint(NamedTuple):
+    time: int  # Microseconds since the epoch, UTC
+    latitude: float
+    longitude: float
+    altitude: float
+    extensions: tuple = None
+    segment: int = 0  # Index of the track segment in the file
+
+
+def _local_name(tag):
+    """Return the tag of an element without its namespace."""
+    return tag.rpartition("}")[2]
+
+
+def parse_gpx_time(value):
+    """
+    Parse a GPX time string.
+
+    :param value: Time string, e.g. "2025-01-26T10:00:00Z".
+    :return: Microseconds since the epoch, or None if it cannot be parsed.
+        Times with a timezone offset are converted to UTC.
+    """
+    value = value.strip()
+    if value.endswith("Z"):
+        value = value[:-1]
+    if DATETIME_FORMAT.fullmatch(value):
+        time = np.datetime64(value.replace(" ", "T"), "us")
+    else:
+        time = parse_datetime_fallback(value)
+    if np.isnat(time):
+        return None
+    return int(time.astype(np.int64))
+
+
+# Consecutive points often share the same time string
+_parse_gpx_time_cached = lru_cache(maxsize=256)(parse_gpx_time)
+
+
+def iter_gpx_points(input_file, extensions=False):
+    """
+    Iterate over the track points of a GPX file, in file order.
+
+    The file is parsed incrementally and each point is discarded from the
+    document tree once read, so the memory usage does not depend on the size
+    of the file. Gzip compressed files ('.gz') are supported.
+
+    :param input_file: Path of the GPX file.
+    :param extensions: Also read the accelerometer and derivative extensions
+        written by pyosmogps, NaN when missing.
+    :return: Generator of GpxPoint. The points without a valid time are
+        skipped.
+    """
+    opener = gzip.open if str(input_file).endswith(".gz") else open
+    skipped = 0
+    segment = -1
+    with opener(input_file, "rb") as f:
+        parents = []
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                parents.append(elem)
+                if elem.tag == "trkseg" or elem.tag.endswith("}trkseg"):
+                    segment += 1
+                continue
+            parents.pop()
+            if not (elem.tag == "trkpt" or elem.tag.endswith("}trkpt")):
+                continue
+
+            point = _read_point(elem, extensions, max(segment, 0))
+            # Drop the point from the tree, it is always the first child left
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+            if point is None:
+                skipped += 1
+                continue
+            yield point
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} points without a valid time in {input_file}")
+
+
+def _read_point(elem, extensions, segment=0):
+    """Read a trkpt element, returning None if it has no valid time."""
+    time = None
+    altitude = np.nan
+    values = dict.fromkeys(GPX_EXTENSIONS, np.nan) if extensions else None
+    for child in elem.iter():
+        name = _local_name(child.tag)
+        if name == "time" and child.text:
+            time = _parse_gpx_time_cached(child.text)
+        elif name == "ele" and child.text:
+            altitude = float(child.text)
+        elif extensions and name in values and child.text:
+            values[name] = float(child.text)
+    if time is None:
+        return None
+    return GpxPoint(
+        time,
+        float(elem.get("lat")),
+        float(elem.get("lon")),
+        altitude,
+        tuple(values.values()) if extensions else None,
+        segment,
+    )
+
+
+def _points_to_track(points, extensions):
+    """Convert a list of GpxPoint to a GpsTrack."""
+    columns = list(zip(*points))
+    fields = {
+        "latitude": columns[1],
+        "longitude": columns[2],
+        "altitude": columns[3],
+    }
+    if extensions:
+        for field, values in zip(GPX_EXTENSIONS.values(), zip(*columns[4])):
+            fields[field] = values
+    return GpsTrack(np.array(columns[0], dtype=np.int64).astype(TIME_DTYPE), fields)
+
+
+def _tag_points(points, source):
+    """Pair each point with the index of its input."""
+    for point in points:
+        yield point, source
+
+
+def merge_gpx(
+    inputs,
+    output_file,
+    dedup=False,
+    extensions=False,
+    compress=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    max_gap=None,
+):
+    """
+    Merge GPX files into a single track, ordered by time.
+
+    The inputs are read incrementally and merged with a k-way merge holding
+    one point per input in memory, then written in batches by a GpxWriter.
+    The points of each input must be sorted by time; points with the same
+    time keep the input order.
+
+    A new track segment is started whenever the next point comes from another
+    input or from another track segment of its input, so the segments of the
+    inputs are kept, and optionally at the gaps longer than max_gap.
+
+    :param inputs: List of GPX files.
+    :param output_file: Path of the merged GPX file.
+    :param dedup: Drop the points with the same time as a point already
+        written from another input, e.g. when the inputs overlap. The points
+        of a single input sharing the same time are all kept.
+    :param extensions: Also merge the accelerometer and derivative extensions.
+    :param compress: Write a gzip compressed file, see GpxWriter.
+    :param batch_size: Number of points written at once.
+    :param max_gap: Optional largest time between two points of the same
+        segment, in seconds, see GpsTrack.split_gaps.
+    :return: Number of points written.
+    """
+    streams = [
+        _tag_points(iter_gpx_points(input_file, extensions), source)
+        for source, input_file in enumerate(inputs)
+    ]
+    merged = heapq.merge(*streams, key=lambda item: item[0].time)
+
+    max_gap_us = None if max_gap is None else int(max_gap * 10**6)
+    duplicates = 0
+    previous_time = previous_source = previous_segment = None
+    batch = []
+    with GpxWriter(output_file, extensions, compress, batch_size=batch_size) as writer:
+        for point, source in merged:
+            if point.time == previous_time and source != previous_source and dedup:
+                duplicates += 1
+                continue
+            if previous_time is not None and (
+                source != previous_source
+                or point.segment != previous_segment
+                or (max_gap_us is not None and point.time - previous_time > max_gap_us)
+            ):
+                if batch:
+                    writer.write_track(_points_to_track(batch, extensions))
+                    batch = []
+                writer.start_segment()
+            previous_time, previous_source = point.time, source
+            previous_segment = point.segment
+            batch.append(point)
+            if len(batch) == batch_size:
+                writer.write_track(_points_to_track(batch, extensions))
+                batch = []
+        if batch:
+            writer.write_track(_points_to_track(batch, extensions))
+
+    if duplicates:
+        logger.info(f"Dropped {duplicates} points with duplicate times")
+    return writer.points_written
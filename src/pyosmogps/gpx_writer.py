@@ -0,0 +1,201 @@
+import gzip
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+GPX_CREATOR = "pyosmogps -- https://github.com/francescocaponio/pyosmogps"
+
+GPX_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<gpx xmlns="http://www.topografix.com/GPX/1/1" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 '
+    'http://www.topografix.com/GPX/1/1/gpx.xsd" version="1.1" '
+    'creator="{creator}">\n'
+    "  <trk>\n"
+)
+GPX_FOOTER = "  </trk>\n</gpx>"
+
+# Extension tags written for each point, with the track field they come from
+GPX_EXTENSIONS = {
+    "acc_x": "camera_acc_x",
+    "acc_y": "camera_acc_y",
+    "acc_z": "camera_acc_z",
+    "der_x": "remote_der_x",
+    "der_y": "remote_der_y",
+    "der_z": "remote_der_z",
+}
+
+# Number of points formatted and written at once
+DEFAULT_BATCH_SIZE = 4096
+
+
+def format_float(value):
+    """Format a coordinate like gpxpy, without scientific notation."""
+    result = str(value)
+    if "e" not in result:
+        return result
+    return format(value, ".10f").rstrip("0").rstrip(".")
+
+
+def format_floats(values):
+    """Format an array of coordinates like gpxpy, see format_float."""
+    strings = list(map(str, values.tolist()))
+    # Only these magnitudes are printed in scientific notation by str()
+    magnitude = np.abs(values)
+    scientific = ((magnitude < 1e-4) & (magnitude > 0)) | (magnitude >= 1e16)
+    for i in np.flatnonzero(scientific).tolist():
+        strings[i] = format_float(values[i].item())
+    return strings
+
+
+def format_times(timeinfo):
+    """
+    Format datetime64 values like datetime.isoformat(), omitting the
+    fractional part when it is zero.
+    """
+    return [
+        value[:-7] if value.endswith(".000000") else value
+        for value in np.datetime_as_string(timeinfo, unit="us").tolist()
+    ]
+
+
+class GpxWriter:
+    """
+    Streaming GPX writer.
+
+    The track points are formatted from the columns of a GpsTrack and written
+    in batches, so the memory usage does not depend on the number of points.
+    The output has the same schema as the one produced by gpxpy.
+    """
+
+    output_file = None
+    extensions = False
+    batch_size = DEFAULT_BATCH_SIZE
+    points_written = 0
+
+    def __init__(
+        self,
+        output_file,
+        extensions=False,
+        compress=None,
+        creator=GPX_CREATOR,
+        batch_size=DEFAULT_BATCH_SIZE,
+    ):
+        """
+        :param output_file: Path of the GPX file.
+        :param extensions: Write the accelerometer and derivative extensions.
+        :param compress: Write a gzip compressed file. When None, the file is
+            compressed if its name ends with '.gz'.
+        :param creator: Value of the creator attribute of the gpx element.
+        :param batch_size: Number of points formatted and written at once.
+        """
+        if compress is None:
+            compress = str(output_file).endswith(".gz")
+        self.output_file = output_file
+        self.extensions = extensions
+        self.batch_size = batch_size
+        self.points_written = 0
+        self._in_segment = False
+        if compress:
+            self._file = gzip.open(output_file, "wt", encoding="utf-8")
+        else:
+            self._file = open(output_file, "w", encoding="utf-8")
+        self._file.write(GPX_HEADER.format(creator=creator))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start_segment(self):
+        """Start a new track segment, closing the current one."""
+        self.end_segment()
+        self._file.write("    <trkseg>\n")
+        self._in_segment = True
+
+    def end_segment(self):
+        """Close the current track segment, if any."""
+        if self._in_segment:
+            self._file.write("    </trkseg>\n")
+            self._in_segment = False
+
+    def write_track(self, gps_data):
+        """
+        Write the points of a track in the current segment.
+
+        A segment is started if none is open.
+
+        :param gps_data: GpsTrack with at least the latitude, longitude and
+            altitude fields, and the extension fields if extensions are on.
+        """
+        if not self._in_segment:
+            self.start_segment()
+        for start in range(0, len(gps_data), self.batch_size):
+            batch = gps_data[start : start + self.batch_size]
+            self._file.write("".join(self._format_points(batch)))
+            self.points_written += len(batch)
+
+    def write_segments(self, gps_data):
+        """
+        Write each segment of a track as a separate track segment.
+
+        :param gps_data: GpsTrack to write, see write_track.
+        """
+        for segment in gps_data.segments():
+            self.start_segment()
+            self.write_track(segment)
+        self.end_segment()
+
+    def _format_points(self, gps_data):
+        latitude = format_floats(gps_data["latitude"])
+        longitude = format_floats(gps_data["longitude"])
+        altitude = format_floats(gps_data["altitude"])
+        timeinfo = format_times(gps_data["timeinfo"])
+        if self.extensions:
+            extensions = [
+                [f"{value:.3f}" for value in gps_data[field].tolist()]
+                for field in GPX_EXTENSIONS.values()
+            ]
+            extensions = zip(*extensions)
+
+        for lat, lon, ele, time in zip(latitude, longitude, altitude, timeinfo):
+            point = f'      <trkpt lat="{lat}" lon="{lon}">\n'
+            # Points without altitude, e.g. merged from other GPX files
+            if ele != "nan":
+                point += f"        <ele>{ele}</ele>\n"
+            point += f"        <time>{time}</time>\n"
+            if self.extensions:
+                point += "        <extensions>\n          <extensions>\n"
+                for tag, value in zip(GPX_EXTENSIONS, next(extensions)):
+                    point += f"            <{tag}>{value}</{tag}>\n"
+                point += "          </extensions>\n        </extensions>\n"
+            yield point + "      </trkpt>\n"
+
+    def close(self):
+        """Close the open segment and the GPX document."""
+        if self._file is None:
+            return
+        self.end_segment()
+        self._file.write(GPX_FOOTER)
+        self._file.close()
+        self._file = None
+
+
+def write_gpx(output_file, gps_data, extensions=False, compress=None):
+    """
+    Write a track to a GPX file, with a track segment for each segment of
+    the track.
+
+    :param output_file: Path of the GPX file.
+    :param gps_data: GpsTrack to write.
+    :param extensions: Write the accelerometer and derivative extensions.
+    :param compress: Write a gzip compressed file, see GpxWriter.
+    :return: Number of points written.
+    """
+    with GpxWriter(output_file, extensions, compress) as writer:
+        writer.write_segments(gps_data)
+    return writer.points_written
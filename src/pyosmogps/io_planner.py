@@ -0,0 +1,282 @@
+import io
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .defaults import MAX_READ_GAP, READ_AHEAD
+
+# Upper bound of a single read merging several samples
+MAX_READ_SIZE = 4 * 1024 * 1024
+
+
+def plan_reads(offsets, sizes, max_gap=MAX_READ_GAP, max_size=MAX_READ_SIZE, sort=True):
+    """
+    Group the samples of a track into a few large range reads.
+
+    Samples closer than max_gap bytes are merged in the same read, as long as
+    the read does not exceed max_size bytes (a single larger sample is read on
+    its own).
+
+    :param offsets: List of sample offsets in the file.
+    :param sizes: List of sample sizes.
+    :param max_gap: Largest gap between two samples read through.
+    :param max_size: Largest size of a read merging several samples.
+    :param sort: Sort the samples by offset. When False, the reads follow the
+        sample order, so a sample placed before the previous one in the file
+        starts a new read.
+    :return: List of (start, end, samples) tuples, where samples is the list of
+        the indices of the samples contained in the [start, end) range.
+    """
+    if sort:
+        order = sorted(range(len(offsets)), key=offsets.__getitem__)
+    else:
+        order = range(len(offsets))
+
+    reads = []
+    start = end = None
+    samples = None
+    for i in order:
+        offset = offsets[i]
+        sample_end = offset + sizes[i]
+        if (
+            samples is not None
+            and start <= offset <= end + max_gap
+            and max(end, sample_end) - start <= max_size
+        ):
+            end = max(end, sample_end)
+            samples.append(i)
+            continue
+        if samples is not None:
+            reads.append((start, end, samples))
+        start, end, samples = offset, sample_end, [i]
+    if samples is not None:
+        reads.append((start, end, samples))
+    return reads
+
+
+def is_path(source):
+    """Return True if the source is a path rather than a file or a buffer."""
+    return isinstance(source, (str, os.PathLike))
+
+
+def source_name(source):
+    """Return the name of a source for the messages, e.g. its path."""
+    if is_path(source):
+        return os.fspath(source)
+    name = getattr(source, "name", None)
+    if isinstance(name, str):
+        return name
+    return f"<{type(source).__name__}>"
+
+
+class RangeReader:
+    """
+    Read byte ranges of a video file given as a path, a seekable binary
+    file-like object or a buffer (bytes, bytearray, memoryview, mmap).
+
+    Every read is positioned, so the reader keeps no file position of its own.
+    Paths are read with os.pread where available, which lets the threads of
+    map() read several ranges at the same time; the reads of a file-like
+    object are serialized, and the buffers are sliced without copies.
+
+    The last read issued for read() is kept, and it is at least read_ahead
+    bytes long, so the small reads of the box headers are served from memory.
+    """
+
+    source = None
+    size = None
+    read_ahead = READ_AHEAD
+    threads = 0
+
+    # I/O counters, updated by the reads from any thread, the buffers are
+    # sliced without any I/O
+    bytes_read = 0
+    reads = 0
+    read_time = 0.0
+
+    def __init__(self, source, read_ahead=READ_AHEAD, threads=0):
+        """
+        :param source: Path, seekable binary file-like object or buffer.
+        :param read_ahead: Smallest size of the reads issued by read().
+        :param threads: Number of threads used by map() to read independent
+            ranges concurrently, 0 or 1 to read them in order.
+        """
+        self.source = source
+        self.read_ahead = read_ahead
+        self.threads = threads
+        self.bytes_read = 0
+        self.reads = 0
+        self.read_time = 0.0
+        self._lock = threading.Lock()
+        self._block_start = 0
+        self._block = b""
+        self._file = None
+        self._buffer = None
+        self._fd = None
+
+        if is_path(source):
+            self._file = open(source, "rb", buffering=0)
+            self.size = os.fstat(self._file.fileno()).st_size
+            if hasattr(os, "pread"):
+                self._fd = self._file.fileno()
+            return
+        try:
+            self._buffer = memoryview(source).cast("B")
+            self.size = len(self._buffer)
+            return
+        except TypeError:
+            pass
+        if not (hasattr(source, "seek") and hasattr(source, "read")):
+            raise ValueError(
+                f"Unsupported video file {source!r}, expected a path, a binary "
+                "file object or a buffer."
+            )
+        if hasattr(source, "seekable") and not source.seekable():
+            raise ValueError("The video file object must be seekable.")
+        self.size = source.seek(0, io.SEEK_END)
+
+    def close(self):
+        """Close the file opened from a path, the other sources stay open."""
+        self._block = b""
+        if self._buffer is not None:
+            self._buffer.release()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def concurrent(self):
+        """True if map() reads the ranges in parallel threads."""
+        return self.threads > 1 and self._fd is not None
+
+    def read(self, start, length):
+        """
+        Read a range, reading at least read_ahead bytes from the file.
+
+        :param start: Offset of the range.
+        :param length: Length of the range.
+        :return: Bytes-like object, shorter than length at the end of the
+            file.
+        """
+        if self._buffer is not None:
+            return self._buffer[start : start + length]
+        block_start, block = self._block_start, self._block
+        if block_start <= start and start + length <= block_start + len(block):
+            return block[start - block_start : start - block_start + length]
+        block = self.read_range(start, max(length, self.read_ahead))
+        self._block_start, self._block = start, block
+        return block[:length]
+
+    def read_range(self, start, length):
+        """
+        Read a range with a single positioned read, without read-ahead.
+
+        :param start: Offset of the range.
+        :param length: Length of the range.
+        :return: Bytes-like object, shorter than length at the end of the
+            file.
+        """
+        if self._buffer is not None:
+            return self._buffer[start : start + length]
+        buffer = bytearray(max(0, min(length, self.size - start)))
+        length = self.readinto(start, buffer)
+        return memoryview(buffer)[:length]
+
+    def readinto(self, start, buffer):
+        """
+        Fill a buffer with the data at an offset of the file.
+
+        :param start: Offset of the data.
+        :param buffer: Writable buffer.
+        :return: Number of bytes read, smaller than the buffer at the end of
+            the file.
+        """
+        read_start = time.perf_counter()
+        with memoryview(buffer).cast("B") as view:
+            if self._buffer is not None:
+                # Copied from memory, not counted as I/O
+                data = self._buffer[start : start + len(view)]
+                view[: len(data)] = data
+                return len(data)
+            if self._fd is not None:
+                length = self._preadinto(start, view)
+            else:
+                with self._lock:
+                    self._seek_file().seek(start)
+                    length = self._readinto_file(view)
+        with self._lock:
+            self.bytes_read += length
+            self.reads += 1
+            self.read_time += time.perf_counter() - read_start
+        return length
+
+    def map(self, function, items):
+        """
+        Call function on each item, in threads when the reader is concurrent.
+
+        The results are yielded in the order of the items, and at most twice
+        the number of threads are in progress at the same time, so the memory
+        held by the reads is bounded.
+
+        :param function: Function doing the reads of an item.
+        :param items: Iterable of items, e.g. the ranges of plan_reads.
+        :return: Generator of the results.
+        """
+        if not self.concurrent:
+            for item in items:
+                yield function(item)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            pending = deque()
+            try:
+                for item in items:
+                    pending.append(pool.submit(function, item))
+                    if len(pending) >= 2 * self.threads:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _preadinto(self, start, view):
+        """Fill a view with positioned reads, stopping at the end of file."""
+        length = 0
+        while length < len(view):
+            if hasattr(os, "preadv"):
+                count = os.preadv(self._fd, [view[length:]], start + length)
+            else:
+                data = os.pread(self._fd, len(view) - length, start + length)
+                count = len(data)
+                view[length : length + count] = data
+            if count == 0:
+                break
+            length += count
+        return length
+
+    def _seek_file(self):
+        return self._file if self._file is not None else self.source
+
+    def _readinto_file(self, view):
+        """Fill a view from the current position of the file object."""
+        f = self._seek_file()
+        length = 0
+        while length < len(view):
+            if hasattr(f, "readinto"):
+                count = f.readinto(view[length:])
+            else:
+                data = f.read(len(view) - length)
+                count = len(data)
+                view[length : length + count] = data
+            if not count:
+                break
+            length += count
+        return length
@@ -1,14 +1,44 @@
 import argparse
+import json
 import logging
 import logging.config
+import os
 import sys
 
-from . import OsmoGps
 from . import __version__ as pyosmogps_version
+from .defaults import (
+    ARCHIVE_SUFFIX,
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_POLL_INTERVAL,
+    MAX_READ_GAP,
+    READ_AHEAD,
+    RESAMPLING_METHODS,
+)
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
 
+class _VersionAction(argparse.Action):
+    """
+    Print the version and the protobuf backend, which is imported only when
+    the version is requested.
+    """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, help=None):
+        super().__init__(
+            option_strings, dest, default=argparse.SUPPRESS, nargs=0, help=help
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from .gps_records import protobuf_backend
+
+        print(
+            f"{parser.prog} {pyosmogps_version} "
+            f"(protobuf {protobuf_backend()} backend)"
+        )
+        parser.exit()
+
+
 def _make_parser() -> argparse.ArgumentParser:
     # Separated so sphinx-argparse-cli can do its auto documentation magic.
     parser = argparse.ArgumentParser(
@@ -17,18 +47,20 @@ def _make_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument(
         "command",
-        choices=["extract", "merge"],
+        choices=["extract", "merge", "probe", "watch"],
         help="Specify the command to run: 'extract' to extract "
-        "GPS data or 'merge' to merge GPX files.",
+        "GPS data, 'merge' to merge GPX files, 'probe' to print the camera "
+        "and video info of the input files as JSON lines or 'watch' to extract "
+        "the GPS data of the video files written to a folder.",
     )
     parser.add_argument(
         "inputs",
         nargs="+",
-        help="Input file(s). Accepts a single file or multiple files.",
-    )
-    parser.add_argument(
-        "output",
-        help="Output file. Accepts a single file or multiple files.",
+        help="Input file(s), followed by the output file for the 'extract' and "
+        "'merge' commands. For 'watch', the folder to watch and the output "
+        "folder of the GPX files. Output files ending "
+        f"with '{ARCHIVE_SUFFIX}' are written as compact track archives, "
+        "the others as GPX.",
     )
     parser.add_argument(
         "--frequency",
@@ -40,11 +72,12 @@ def _make_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--resampling-method",
         "-r",
-        choices=["discard", "linear", "lpf", "none"],
+        choices=RESAMPLING_METHODS,
         default="linear",
         help="Set the method for resampling data: 'discard' to drop "
         "excess samples, 'linear' for linear interpolation, 'lpf' "
-        "for low pass filtering, 'none' for no data reduction (default: linear).",
+        "for low pass filtering, 'polyphase' for polyphase decimation with an "
+        "anti-aliasing filter, 'none' for no data reduction (default: linear).",
     )
     parser.add_argument(
         "--timezone-offset",
@@ -54,16 +87,175 @@ def _make_parser() -> argparse.ArgumentParser:
         help="Set the timezone offset in hours (default: 0).",
     )
     parser.add_argument(
-        "--version", "-v", action="version", version=f"%(prog)s {pyosmogps_version}"
+        "--start",
+        type=float,
+        help="Extract only the GPS data from this time, in seconds from the "
+        "beginning of each input file.",
+    )
+    parser.add_argument(
+        "--end",
+        type=float,
+        help="Extract only the GPS data up to this time, in seconds from the "
+        "beginning of each input file.",
+    )
+    parser.add_argument(
+        "--max-gap",
+        type=float,
+        help="Start a new track segment when two consecutive GPS samples are "
+        "more than this number of seconds apart. Each input file is always a "
+        "separate segment, and the segments are resampled on their own. Also "
+        "used by 'merge'.",
+    )
+    parser.add_argument(
+        "--simplify",
+        type=float,
+        metavar="METERS",
+        help="With 'extract', simplify the resampled track, dropping the points "
+        "closer than this distance to the simplified track (Douglas-Peucker).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of input files processed in parallel, 0 to use all the "
+        "available CPUs (default: 1).",
+    )
+    parser.add_argument(
+        "--read-ahead",
+        type=int,
+        metavar="BYTES",
+        help="With 'extract', smallest read issued while looking for the "
+        f"metadata of the input files (default: {READ_AHEAD}).",
+    )
+    parser.add_argument(
+        "--max-read-gap",
+        type=int,
+        metavar="BYTES",
+        help="With 'extract', read through the gaps smaller than this between "
+        f"two metadata samples instead of seeking (default: {MAX_READ_GAP}).",
+    )
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        help="With 'extract', number of threads reading the metadata of each "
+        "input file concurrently, for slow network storage (default: 0, read "
+        "in order).",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="With 'merge', keep only the first point of each timestamp when "
+        "the input files overlap.",
+    )
+    parser.add_argument(
+        "--stats",
+        choices=["json"],
+        help="Print the time spent in each processing stage, the I/O and the "
+        "number of points of each file to stderr, in the given format.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="With 'watch', seconds between two polls of the folder; a file is "
+        "processed when its size has not changed between two polls (default: "
+        f"{DEFAULT_POLL_INTERVAL:g}).",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="With 'watch', exit when all the files in the folder have been "
+        "processed instead of waiting for new ones.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Cache the decoded GPS data of the input files in the default "
+        "cache directory, to speed up later runs on the same files.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Cache the decoded GPS data in this directory (implies --cache).",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=DEFAULT_CACHE_SIZE / 2**20,
+        help="Maximum size of the cache in MiB, the least recently used entries "
+        f"are evicted (default: {DEFAULT_CACHE_SIZE // 2**20} MiB).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the cache, even if --cache or --cache-dir are given.",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Remove all the entries of the cache before running the command.",
+    )
+    parser.add_argument(
+        "--version",
+        "-v",
+        action=_VersionAction,
+        help="Show the version and the protobuf backend, then exit.",
     )
     return parser
 
 
-def extract(inputs, output, frequency, resampling_method, timezone_offset=0) -> bool:
+def _make_cache(args):
+    """Create the extraction cache requested on the command line, or None."""
+    from .cache import ExtractionCache
+
+    if args.clear_cache:
+        ExtractionCache(args.cache_dir).clear()
+    if args.no_cache or not (args.cache or args.cache_dir):
+        return None
+    return ExtractionCache(args.cache_dir, int(args.cache_size * 2**20))
+
+
+def extract(
+    inputs,
+    output,
+    frequency,
+    resampling_method,
+    timezone_offset=0,
+    cache=None,
+    jobs=1,
+    start=None,
+    end=None,
+    stats_format=None,
+    max_gap=None,
+    simplify=None,
+    read_ahead=None,
+    max_read_gap=None,
+    io_threads=None,
+) -> bool:
+    from .pyosmogps import OsmoGps
+
     try:
-        gps = OsmoGps(inputs, timezone_offset)
+        gps = OsmoGps(
+            inputs,
+            timezone_offset,
+            cache=cache,
+            jobs=jobs,
+            start=start,
+            end=end,
+            max_gap=max_gap,
+            read_ahead=read_ahead,
+            max_read_gap=max_read_gap,
+            io_threads=io_threads,
+        )
         gps.resample(frequency, resampling_method)
-        gps.save_gpx(output)
+        if simplify is not None:
+            gps.simplify(simplify)
+        if output.endswith(ARCHIVE_SUFFIX):
+            gps.save_archive(output)
+        else:
+            gps.save_gpx(output)
+        if stats_format == "json":
+            print(json.dumps(gps.stats.to_dict()), file=sys.stderr)
 
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -71,6 +263,82 @@ def extract(inputs, output, frequency, resampling_method, timezone_offset=0) ->
     return True
 
 
+def merge(inputs, output, dedup=False, max_gap=None) -> bool:
+    from .gpx_reader import merge_gpx
+
+    try:
+        points = merge_gpx(inputs, output, dedup=dedup, max_gap=max_gap)
+        logger.info(f"Merged {points} GPS points into {output}")
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        return False
+    return True
+
+
+def probe_files(inputs, jobs=1) -> bool:
+    """
+    Print the probe info of each input file as a JSON line, in input order.
+
+    :return: True if all the files are supported.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = min(jobs if jobs > 0 else os.cpu_count(), len(inputs))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_probe_file, inputs, chunksize=16))
+    else:
+        results = map(_probe_file, inputs)
+
+    success = True
+    for info in results:
+        success = success and info.get("supported", False)
+        print(json.dumps(info), flush=True)
+    return success
+
+
+def _probe_file(input_file):
+    """Run probe, returning the error in the result instead of raising it."""
+    from .pyosmogps import probe
+
+    try:
+        return probe(input_file)
+    except Exception as e:
+        return {"file": input_file, "error": str(e)}
+
+
+def watch(
+    input_dir,
+    output_dir,
+    frequency,
+    resampling_method,
+    timezone_offset=0,
+    jobs=1,
+    poll_interval=DEFAULT_POLL_INTERVAL,
+    once=False,
+) -> bool:
+    from .watcher import FolderWatcher
+
+    try:
+        watcher = FolderWatcher(
+            input_dir,
+            output_dir,
+            frequency,
+            resampling_method,
+            timezone_offset,
+            jobs=jobs,
+            poll_interval=poll_interval,
+        )
+        processed = watcher.run(once)
+        logger.info(f"Processed {processed} files")
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        return False
+    return True
+
+
 def main() -> int:
     parser = _make_parser()
     if len(sys.argv) < 2:
@@ -79,24 +347,55 @@ def main() -> int:
 
     args = parser.parse_args()
 
-    if args.command == "extract":
-        if not args.inputs or not args.output:
+    if args.command in ["extract", "merge"]:
+        if len(args.inputs) < 2:
             parser.error(
-                "'extract' command requires at least one input file and one "
-                "output file."
+                f"'{args.command}' command requires at least one input file and "
+                "one output file."
             )
+        args.inputs, args.output = args.inputs[:-1], args.inputs[-1]
+    elif args.command == "watch" and len(args.inputs) != 2:
+        parser.error("'watch' command requires the input and the output folder.")
+
+    if args.command == "extract":
         success = extract(
             args.inputs,
             args.output,
             args.frequency,
             args.resampling_method,
             args.timezone_offset,
+            _make_cache(args),
+            args.jobs,
+            args.start,
+            args.end,
+            args.stats,
+            args.max_gap,
+            args.simplify,
+            args.read_ahead,
+            args.max_read_gap,
+            args.io_threads,
         )
         return 0 if success else 1
 
+    elif args.command == "probe":
+        return 0 if probe_files(args.inputs, args.jobs) else 1
+
     elif args.command == "merge":
-        print("Running merge command...")
-        # TODO: Implement merge command
+        success = merge(args.inputs, args.output, args.dedup, args.max_gap)
+        return 0 if success else 1
+
+    elif args.command == "watch":
+        success = watch(
+            args.inputs[0],
+            args.inputs[1],
+            args.frequency,
+            args.resampling_method,
+            args.timezone_offset,
+            args.jobs,
+            args.poll_interval,
+            args.once,
+        )
+        return 0 if success else 1
     else:
         parser.print_help()
         parser.exit()
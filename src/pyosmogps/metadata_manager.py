@@ -1,9 +1,21 @@
 import logging
-from datetime import timedelta
+import time
+from array import array
 
-from dateutil import parser
+import numpy as np
 
-from .dji_pb2 import GenericMessage
+from google.protobuf.message import DecodeError
+
+from .datetimes import DATETIME_FORMAT, parse_datetime_fallback
+from .dji_pb2 import DjiVideoGlobalInfo, GenericMessage, VideoStreamInfo
+from .gps_records import (
+    GpsExtensionsRecord,
+    GpsExtensionsSample,
+    GpsRecord,
+    GpsSample,
+)
+from .gps_track import TIME_DTYPE, GpsTrack
+from .mp4_manager import MP4Manager
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
@@ -15,6 +27,75 @@ logger = logging.getLogger(__name__)  # pylint: disable=C0103
 # dvtm_ac206.proto is the Osmo Action 6 camera model
 supported_models = ["dvtm_ac203.proto", "dvtm_ac204.proto", "dvtm_ac206.proto"]
 
+# Fields of the extracted GPS tracks, the extensions are optional
+GPS_FIELDS = ["altitude", "longitude", "latitude"]
+EXTENSION_FIELDS = [
+    "camera_acc_x",
+    "camera_acc_y",
+    "camera_acc_z",
+    "camera_acc2_x",
+    "camera_acc2_y",
+    "camera_acc2_z",
+    "remote_der_x",
+    "remote_der_y",
+    "remote_der_z",
+]
+
+# Consecutive chunks are joined up to this size and decoded at once
+DECODE_BATCH_SIZE = 64 * 1024
+# Number of points of the chunks of iter_gps_tracks
+TRACK_CHUNK_SIZE = 4096
+
+
+def timezone_delta(timezone_offset):
+    """
+    Convert a timezone offset in hours to a numpy timedelta64.
+    """
+    return np.timedelta64(int(round(timezone_offset * 3600 * 10**6)), "us")
+
+
+def parse_datetimes(datetimes, timezone_offset=0):
+    """
+    Convert the GPS datetime strings to a datetime64 array.
+
+    Consecutive GPS entries usually share the same string, so every distinct
+    string is parsed only once. Strings in the camera format are converted in
+    bulk by numpy, the others are parsed with dateutil.
+
+    :param datetimes: Sequence of datetime strings.
+    :param timezone_offset: Timezone offset in hours, subtracted from the times.
+    :return: datetime64 array, with NaT for the strings that cannot be parsed.
+    """
+    codes = np.empty(len(datetimes), dtype=np.intp)
+    unique = {}
+    previous = None
+    code = -1
+    for i, value in enumerate(datetimes):
+        if value != previous:
+            previous = value
+            code = unique.setdefault(value, len(unique))
+        codes[i] = code
+
+    parsed = np.empty(len(unique), dtype=TIME_DTYPE)
+    matching = []
+    for i, value in enumerate(unique):
+        if DATETIME_FORMAT.fullmatch(value):
+            matching.append(i)
+        else:
+            parsed[i] = parse_datetime_fallback(value)
+
+    values = list(unique)
+    try:
+        parsed[matching] = np.array(
+            [values[i].replace(" ", "T") for i in matching], dtype=TIME_DTYPE
+        )
+    except ValueError:
+        # Out of range values, e.g. month 13: parse them one by one
+        for i in matching:
+            parsed[i] = parse_datetime_fallback(values[i])
+
+    return parsed[codes] - timezone_delta(timezone_offset)
+
 
 def check_camera_model(message):
     """Check the camera model from the message."""
@@ -47,57 +128,391 @@ def check_camera_model(message):
     return True
 
 
-def extract_gps_info(metadata, timezone_offset=0, extract_extensions=False):
+def read_camera_info(sample):
+    """
+    Read the camera and stream info from the first sample of the metadata
+    track, without checking the camera model.
 
-    message = GenericMessage()
+    :param sample: Bytes-like first sample of the metadata track.
+    :return: Dict with the camera name, serial number and proto name, whether
+        the camera is supported and the frame rate of the GPS data (None if
+        it is not in the sample).
+    """
     try:
-        message.ParseFromString(metadata)
-    except Exception as e:
-        print(f"Error during the decode operation: {e}")
-        exit(-1)
+        message = GenericMessage.FromString(bytes(sample))
+    except DecodeError as e:
+        raise ValueError(f"Error during the decode operation: {e}") from e
 
-    check_camera_model(message)
+    info = {
+        "camera_name": None,
+        "serial_number": None,
+        "proto_name": None,
+        "supported": False,
+        "frame_rate": None,
+    }
+    if message.video_global_info.module_info:
+        module_info = message.video_global_info.module_info[0]
+        info["camera_name"] = module_info.camera_name
+        info["serial_number"] = module_info.serial_number
+        info["proto_name"] = module_info.proto_name
+        info["supported"] = module_info.proto_name in supported_models
+    if message.video_stream_info.details.frame_rate:
+        info["frame_rate"] = message.video_stream_info.details.frame_rate
+    return info
 
+
+def _read_varint(data, pos):
+    """
+    Read a protobuf varint.
+
+    :param data: Buffer containing the varint.
+    :param pos: Position of the first byte of the varint.
+    :return: Tuple with the value and the position after the varint, or
+        (None, pos) if the buffer ends before the varint does.
+    """
+    result = 0
+    shift = 0
+    end = len(data)
+    while pos < end:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise DecodeError("Malformed varint in the metadata stream.")
+    return None, pos
+
+
+def _gps_record(gps, extract_extensions):
+    """
+    Extract the values of a GPS entry.
+
+    :param gps: DjiGpsInfo message, or one of its reduced copies GpsRecord
+        and GpsExtensionsRecord.
+    :param extract_extensions: Also extract the extension fields.
+    :return: Tuple with the datetime string and the list of values, in the
+        order of GPS_FIELDS followed by EXTENSION_FIELDS.
+    """
+    coordinates = gps.remote_gps_info.coordinates
+    values = [
+        coordinates.gps_altitude_mm / 1000,
+        coordinates.info.longitude,
+        coordinates.info.latitude,
+    ]
+
+    if extract_extensions:
+        camera_info = gps.camera_info
+        derivatives = gps.remote_gps_info.derivatives
+        values += [
+            camera_info.accelerometer1.x,
+            camera_info.accelerometer1.y,
+            camera_info.accelerometer1.z,
+            camera_info.accelerometer2.x,
+            camera_info.accelerometer2.y,
+            camera_info.accelerometer2.z,
+            derivatives.x,
+            derivatives.y,
+            derivatives.z,
+        ]
+    return coordinates.datetime.datetime, values
+
+
+class GpsInfoDecoder:
+    """
+    Incremental decoder of the metadata stream.
+
+    The metadata track is a sequence of serialized GenericMessage fields.
+    Instead of parsing it as a whole, the decoder walks the top level fields
+    of the wire format as the chunks are fed, decoding one gps_info record
+    (field 3) at a time. Only a partially received field is kept in memory
+    between two chunks.
+
+    A chunk made of complete fields, e.g. a whole sample of the metadata
+    track, is instead decoded at once by the protobuf parser, as a GpsSample.
+    The records are decoded as GpsRecord messages, skipping the camera info,
+    or as GpsExtensionsRecord messages when the extensions are extracted.
+    """
+
+    extract_extensions = False
+    video_global_info = None
     frame_rate = None
-    try:
-        frame_rate = message.video_stream_info.details.frame_rate
-    except Exception as e:
-        logger.error(f"Error during the frame rate extraction: {e}")
 
-    # TODO: check that the message contains the GPS data
+    def __init__(self, extract_extensions=False):
+        self.extract_extensions = extract_extensions
+        if extract_extensions:
+            self._record_class = GpsExtensionsRecord
+            self._sample_class = GpsExtensionsSample
+        else:
+            self._record_class = GpsRecord
+            self._sample_class = GpsSample
+        self._buffer = bytearray()
+        self._camera_checked = False
 
-    gps_data = []
+    def feed(self, chunk):
+        """
+        Decode the complete fields available after appending a chunk.
 
-    for gps in message.gps_info:
-        try:
-            gpsdate = parser.parse(gps.remote_gps_info.coordinates.datetime.datetime)
-            homedate = gpsdate - timedelta(hours=timezone_offset)
-
-            gps_point = {
-                "timeinfo": homedate,
-                "altitude": gps.remote_gps_info.coordinates.gps_altitude_mm / 1000,
-                "longitude": gps.remote_gps_info.coordinates.info.longitude,
-                "latitude": gps.remote_gps_info.coordinates.info.latitude,
-            }
-
-            if extract_extensions:
-                gps_point.update(
-                    {
-                        "camera_acc_x": gps.camera_info.accelerometer1.x,
-                        "camera_acc_y": gps.camera_info.accelerometer1.y,
-                        "camera_acc_z": gps.camera_info.accelerometer1.z,
-                        "camera_acc2_x": gps.camera_info.accelerometer2.x,
-                        "camera_acc2_y": gps.camera_info.accelerometer2.y,
-                        "camera_acc2_z": gps.camera_info.accelerometer2.z,
-                        "remote_der_x": gps.remote_gps_info.derivatives.x,
-                        "remote_der_y": gps.remote_gps_info.derivatives.y,
-                        "remote_der_z": gps.remote_gps_info.derivatives.z,
-                    }
-                )
-
-            gps_data.append(gps_point)
-        except Exception as e:
-            logger.warning(f"Error parsing GPS entry: {e}")
+        :param chunk: Bytes-like chunk of the metadata stream.
+        :return: List of (datetime string, values) records, see _gps_record.
+        """
+        if self._buffer:
+            self._buffer += chunk
+            buffer = self._buffer
+        else:
+            try:
+                return self._handle_sample(self._sample_class.FromString(chunk))
+            except DecodeError:
+                # A field continues in the next chunk, or is malformed
+                pass
+            # Decode the chunk in place, only a trailing partial field is copied
+            buffer = chunk
+        records = []
+        pos = 0
+        while pos < len(buffer):
+            tag, payload_pos = _read_varint(buffer, pos)
+            if tag is None:
+                break
+            field_number, wire_type = tag >> 3, tag & 0x07
+            if wire_type == 2:
+                length, payload_pos = _read_varint(buffer, payload_pos)
+                if length is None or payload_pos + length > len(buffer):
+                    break
+                end = payload_pos + length
+                self._handle_field(field_number, buffer[payload_pos:end], records)
+            elif wire_type == 0:
+                value, end = _read_varint(buffer, payload_pos)
+                if value is None:
+                    break
+            elif wire_type in (1, 5):
+                end = payload_pos + (8 if wire_type == 1 else 4)
+                if end > len(buffer):
+                    break
+            else:
+                raise DecodeError(f"Unexpected wire type {wire_type} in metadata.")
+            pos = end
+
+        self._buffer = bytearray(buffer[pos:])
+        return records
+
+    def close(self):
+        """
+        Check that the whole stream has been decoded.
+
+        The camera model is checked here if no GPS entry was found.
+        """
+        if len(self._buffer) > 0:
+            raise DecodeError("Truncated metadata stream.")
+        self._check_camera_model()
+
+    def _handle_sample(self, sample):
+        """Return the records of a decoded chunk, see _handle_field."""
+        # Most samples hold only GPS entries, the other fields are checked
+        # without creating their default messages
+        if sample.HasField("video_global_info") and self.video_global_info is None:
+            self.video_global_info = sample.video_global_info
+        if sample.HasField("video_stream_info"):
+            frame_rate = sample.video_stream_info.details.frame_rate
+            if frame_rate:
+                self.frame_rate = frame_rate
+        records = []
+        for gps in sample.gps_info:
+            if not self._camera_checked:
+                self._check_camera_model()
+            try:
+                records.append(_gps_record(gps, self.extract_extensions))
+            except Exception as e:
+                logger.warning(f"Error parsing GPS entry: {e}")
+        return records
+
+    def _handle_field(self, field_number, payload, records):
+        if field_number == 3:
+            self._check_camera_model()
+            gps = self._record_class.FromString(bytes(payload))
+            try:
+                records.append(_gps_record(gps, self.extract_extensions))
+            except Exception as e:
+                logger.warning(f"Error parsing GPS entry: {e}")
+        elif field_number == 1:
+            if self.video_global_info is None:
+                self.video_global_info = DjiVideoGlobalInfo.FromString(bytes(payload))
+        elif field_number == 2:
+            stream_info = VideoStreamInfo.FromString(bytes(payload))
+            if stream_info.details.frame_rate:
+                self.frame_rate = stream_info.details.frame_rate
+
+    def _check_camera_model(self):
+        if not self._camera_checked:
+            message = GenericMessage()
+            if self.video_global_info is not None:
+                message.video_global_info.CopyFrom(self.video_global_info)
+            check_camera_model(message)
+            self._camera_checked = True
+
+
+def iter_gps_records(chunks, extract_extensions=False, header=None):
+    """
+    Decode the GPS entries of a metadata stream, one at a time.
+
+    :param chunks: Iterable of bytes-like chunks of the metadata stream.
+    :param extract_extensions: Also extract the extension fields.
+    :param header: Optional first sample of the stream, decoded only for the
+        camera and stream info when the chunks do not start with it. Its GPS
+        entries are discarded.
+    :return: Generator of (datetime string, values) records. The frame rate
+        is the return value of the generator.
+    """
+    decoder = GpsInfoDecoder(extract_extensions)
+    if header is not None:
+        decoder.feed(header)
+    # The concatenation of serialized messages is a valid message, so the
+    # small chunks are joined and decoded by the parser in one call
+    batch = []
+    batch_size = 0
+    for chunk in chunks:
+        batch.append(chunk)
+        batch_size += len(chunk)
+        if batch_size >= DECODE_BATCH_SIZE:
+            yield from decoder.feed(batch[0] if len(batch) == 1 else b"".join(batch))
+            batch = []
+            batch_size = 0
+    if batch:
+        yield from decoder.feed(batch[0] if len(batch) == 1 else b"".join(batch))
+    decoder.close()
+    return decoder.frame_rate
+
+
+def iter_gps_points(mp4_path, timezone_offset=0, extract_extensions=False):
+    """
+    Iterate over the GPS points of a video file.
+
+    The metadata is read from the file and decoded one sample at a time, so
+    the memory usage does not depend on the length of the recording.
+
+    :param mp4_path: Path of the video file.
+    :param timezone_offset: Timezone offset in hours.
+    :param extract_extensions: Also extract the extension fields.
+    :return: Generator of dicts containing GPS data.
+    """
+    keys = GPS_FIELDS + (EXTENSION_FIELDS if extract_extensions else [])
+    mp4 = MP4Manager(mp4_path, extract_chunks=False)
+    previous_datetime = None
+    timeinfo = None
+    for gpsdate, values in iter_gps_records(mp4.iter_chunks(), extract_extensions):
+        if gpsdate != previous_datetime:
+            previous_datetime = gpsdate
+            timeinfo = parse_datetimes([gpsdate], timezone_offset)[0]
+            timeinfo = None if np.isnat(timeinfo) else timeinfo.item()
+        if timeinfo is None:
             continue
+        yield {"timeinfo": timeinfo, **dict(zip(keys, values))}
+
+
+def iter_gps_tracks(
+    mp4_path, timezone_offset=0, extract_extensions=False, chunk_size=TRACK_CHUNK_SIZE
+):
+    """
+    Iterate over the GPS data of a video file, in chunks of points.
+
+    Like iter_gps_points, the metadata is read and decoded incrementally, but
+    the points are returned as GpsTrack chunks, with their datetimes parsed
+    in bulk. The chunks can be fed to a LowPassResampler to resample a whole
+    recording with bounded memory.
+
+    :param mp4_path: Path of the video file.
+    :param timezone_offset: Timezone offset in hours.
+    :param extract_extensions: Also extract the extension fields.
+    :param chunk_size: Number of points of each chunk, the last one can be
+        shorter.
+    :return: Generator of GpsTrack chunks.
+    """
+    keys = GPS_FIELDS + (EXTENSION_FIELDS if extract_extensions else [])
+    mp4 = MP4Manager(mp4_path, extract_chunks=False)
+    datetimes = []
+    columns = [array("d") for _ in keys]
+    for gpsdate, values in iter_gps_records(mp4.iter_chunks(), extract_extensions):
+        if datetimes and datetimes[-1] == gpsdate:
+            gpsdate = datetimes[-1]
+        datetimes.append(gpsdate)
+        for column, value in zip(columns, values):
+            column.append(value)
+        if len(datetimes) >= chunk_size:
+            yield _gps_track(parse_datetimes(datetimes, timezone_offset), keys, columns)
+            datetimes = []
+            columns = [array("d") for _ in keys]
+    if datetimes:
+        yield _gps_track(parse_datetimes(datetimes, timezone_offset), keys, columns)
+
+
+def _gps_track(timeinfo, keys, columns):
+    """
+    Build a GpsTrack from the decoded records, discarding the ones with an
+    invalid datetime.
+
+    :param timeinfo: Parsed datetimes of the records.
+    :param keys: Names of the fields.
+    :param columns: One array('d') of values for each field.
+    :return: GpsTrack instance.
+    """
+    gps_data = GpsTrack(
+        timeinfo,
+        {key: np.frombuffer(column) for key, column in zip(keys, columns)},
+    )
+    valid = ~np.isnat(gps_data.timeinfo)
+    if not valid.all():
+        logger.warning(
+            f"Discarded {len(valid) - valid.sum()} GPS entries with invalid datetime."
+        )
+        gps_data = gps_data[valid]
+    return gps_data
+
+
+def extract_gps_info(
+    metadata, timezone_offset=0, extract_extensions=False, header=None, stats=None
+):
+    """
+    Extract the GPS data from the metadata stream.
+
+    :param metadata: Bytes-like metadata stream, or an iterable of chunks of it.
+    :param timezone_offset: Timezone offset in hours.
+    :param extract_extensions: Also extract the extension fields.
+    :param header: Optional first sample of the stream, see iter_gps_records.
+    :param stats: Optional FileStats, recording the time spent parsing the
+        datetimes and the number of points decoded.
+    :return: Tuple with the GpsTrack and the frame rate of the GPS data.
+    """
+    if isinstance(metadata, (bytes, bytearray, memoryview)):
+        metadata = [metadata]
+
+    keys = GPS_FIELDS + (EXTENSION_FIELDS if extract_extensions else [])
+    columns = [array("d") for _ in keys]
+    datetimes = []
+
+    records = iter_gps_records(metadata, extract_extensions, header)
+    try:
+        while True:
+            gpsdate, values = next(records)
+            # Share the string objects of consecutive identical datetimes
+            if datetimes and datetimes[-1] == gpsdate:
+                gpsdate = datetimes[-1]
+            datetimes.append(gpsdate)
+            for column, value in zip(columns, values):
+                column.append(value)
+    except StopIteration as stop:
+        frame_rate = stop.value
+    except DecodeError as e:
+        # Raised instead of exiting, so that the other files can be processed
+        raise ValueError(f"Error during the decode operation: {e}") from e
+
+    # TODO: check that the message contains the GPS data
+
+    datetime_start = time.perf_counter()
+    timeinfo = parse_datetimes(datetimes, timezone_offset)
+    if stats is not None:
+        stats.add("datetime", time.perf_counter() - datetime_start)
+    gps_data = _gps_track(timeinfo, keys, columns)
 
+    if stats is not None:
+        stats.points_decoded = len(gps_data)
     return gps_data, frame_rate
@@ -1,8 +1,123 @@
+import re
 import struct
+from contextlib import contextmanager
+from itertools import accumulate
+from typing import NamedTuple
+
+import numpy as np
+
+from .io_planner import (
+    MAX_READ_GAP,
+    MAX_READ_SIZE,
+    READ_AHEAD,
+    RangeReader,
+    plan_reads,
+    source_name,
+)
+
+# Path element of find_box, a box type with an optional index, e.g. "trak[2]"
+_PATH_ELEMENT = re.compile(r"(.{4})(?:\[(\d+)\])?")
+
+
+class Box(NamedTuple):
+    box_type: str
+    start: int
+    header_size: int
+    size: int
+
+    @property
+    def payload_start(self):
+        return self.start + self.header_size
+
+    @property
+    def end(self):
+        return self.start + self.size
+
+
+def iter_boxes(buffer, start=0, end=None):
+    """
+    Iterate over the boxes contained in a region of a buffer.
+
+    Only the box headers are read, the payloads are never copied.
+
+    :param buffer: Buffer with the file data (mmap, memoryview, bytes).
+    :param start: Offset of the first box.
+    :param end: Offset of the end of the region, defaults to the buffer end.
+    :return: Generator of Box tuples.
+    """
+    if end is None:
+        end = len(buffer)
+    pos = start
+    while True:
+        box = read_box_header(buffer, pos, end)
+        if box is None:
+            break
+        yield box
+        pos = box.end
+
+
+def read_box_header(buffer, pos, end):
+    """
+    Read the header of the box at an offset of a buffer.
+
+    :param buffer: Buffer holding at least the header of the box.
+    :param pos: Offset of the box in the buffer.
+    :param end: Offset of the end of the region containing the box, which can
+        be beyond the end of the buffer.
+    :return: Box tuple, or None if the region has no room for a box header.
+    """
+    if pos + 8 > end:
+        return None
+    box_size, box_type = struct.unpack_from(">I4s", buffer, pos)
+    box_type = box_type.decode("latin-1")
+    header_size = 8
+    if box_size == 1:  # Extended size case
+        if pos + 16 > end:
+            return None
+        box_size = struct.unpack_from(">Q", buffer, pos + 8)[0]
+        header_size = 16
+    elif box_size == 0:  # The box extends to the end of the region
+        box_size = end - pos
+    if box_size < header_size:
+        raise ValueError(f"Invalid size of the '{box_type}' box at offset {pos}.")
+    return Box(box_type, pos, header_size, box_size)
+
+
+def find_box(buffer, path, start=0, end=None):
+    """
+    Find a box by its path, e.g. "moov/trak[2]/mdia/minf/stbl/stsz".
+
+    Each element of the path is a box type, optionally followed by the index
+    (starting from 0) among the sibling boxes of the same type.
+
+    :param buffer: Buffer with the file data (mmap, memoryview, bytes).
+    :param path: Path of the box.
+    :param start: Offset of the region containing the first box of the path.
+    :param end: Offset of the end of the region, defaults to the buffer end.
+    :return: Box tuple, or None if the box is not found.
+    """
+    box = None
+    for element in path.split("/"):
+        match = _PATH_ELEMENT.fullmatch(element)
+        if match is None:
+            raise ValueError(f"Invalid box path element: '{element}'")
+        box_type, index = match.group(1), int(match.group(2) or 0)
+        box = None
+        for child in iter_boxes(buffer, start, end):
+            if child.box_type == box_type:
+                if index == 0:
+                    box = child
+                    break
+                index -= 1
+        if box is None:
+            return None
+        start, end = box.payload_start, box.end
+    return box
 
 
 class MP4Manager:
     mp4_file = None
+    name = None
     video_trak_index = 1
     metadata_track_index = 3
 
@@ -15,18 +130,132 @@ class MP4Manager:
     video_sample_count = None
     video_sample_delta = None
 
-    offsets = []
-    sizes = []
-
-    def __init__(self, mp4_file):
+    offsets = np.zeros(0, dtype=np.uint64)
+    sizes = np.zeros(0, dtype=np.uint32)
+
+    # Timing of the metadata samples, in units of metadata_timescale
+    metadata_timescale = None
+    sample_times = None
+    sample_durations = None
+
+    max_read_gap = MAX_READ_GAP
+    max_read_size = MAX_READ_SIZE
+    read_ahead = READ_AHEAD
+    io_threads = 0
+
+    # I/O counters: bytes read, positioned reads and seconds spent reading
+    # the file (summed over the reads when they run in parallel)
+    bytes_read = 0
+    seeks = 0
+    read_time = 0.0
+    # Number of entries of each sample table box of the metadata track
+    table_entries = None
+    # Reader shared by the reads made within keep_open()
+    _reader = None
+
+    def __init__(
+        self,
+        mp4_file,
+        extract_chunks=True,
+        read_ahead=None,
+        max_read_gap=None,
+        io_threads=None,
+    ):
+        """
+        :param mp4_file: Path of the video file, seekable binary file-like
+            object (e.g. a file opened on a network file system) or buffer
+            with the whole file (bytes, memoryview, mmap).
+        :param extract_chunks: Read the whole metadata track immediately. When
+            False, the metadata can be read one chunk at a time with
+            iter_chunks().
+        :param read_ahead: Smallest read issued while looking for the 'moov'
+            box, in bytes.
+        :param max_read_gap: Largest gap between two metadata samples read
+            through in the same read, in bytes.
+        :param io_threads: Number of threads reading the metadata samples
+            concurrently, for the paths on high latency storage. 0 or 1 to
+            read them in order.
+        """
         self.mp4_file = mp4_file
+        self.name = source_name(mp4_file)
+        if read_ahead is not None:
+            self.read_ahead = read_ahead
+        if max_read_gap is not None:
+            self.max_read_gap = max_read_gap
+        if io_threads is not None:
+            self.io_threads = io_threads
+        self.bytes_read = 0
+        self.seeks = 0
+        self.read_time = 0.0
+        self.table_entries = {}
         self._parse_video_file_info()
         self.video_frame_rate = self.video_sample_count / self.video_duration
-        self._extract_chunks()
+        if extract_chunks:
+            self._extract_chunks()
 
     def get_metadata(self):
         return self.metadata
 
+    def select_samples(self, start=None, end=None):
+        """
+        Find the metadata samples overlapping a time window.
+
+        :param start: Start of the window, in seconds from the beginning of
+            the file. None means from the beginning.
+        :param end: End of the window, in seconds from the beginning of the
+            file. None means up to the end.
+        :return: Array with the indices of the samples, in track order.
+        """
+        if start is not None and end is not None and end < start:
+            raise ValueError("The end of the time window is before its start.")
+        sample_count = len(self.sizes)
+        if start is None and end is None:
+            return np.arange(sample_count)
+        if self.sample_times is None or not self.metadata_timescale:
+            raise ValueError(f"The metadata track of {self.name} has no sample timing.")
+
+        # Compare in timescale units, the sample times are exact integers
+        times = self.sample_times[:sample_count]
+        ends = times + self.sample_durations[:sample_count]
+        selected = np.ones(len(times), dtype=bool)
+        if start is not None:
+            start = round(start * self.metadata_timescale)
+            # Zero duration samples are kept when they start at the window start
+            selected &= (ends > start) | (times >= start)
+        if end is not None:
+            selected &= times < round(end * self.metadata_timescale)
+        return np.flatnonzero(selected)
+
+    def iter_chunks(self, samples=None):
+        """
+        Read the metadata track one chunk at a time.
+
+        Consecutive chunks are still read with a few large reads, see
+        plan_reads, keeping at most max_read_size bytes in memory.
+
+        :param samples: Optional indices of the samples to read, e.g. from
+            select_samples. Defaults to all the samples.
+        :return: Generator of the chunks, as bytes.
+        """
+        if samples is None:
+            offsets = self.offsets.tolist()
+            sizes = self.sizes.tolist()
+        else:
+            offsets = self.offsets[samples].tolist()
+            sizes = self.sizes[samples].tolist()
+        reads = plan_reads(
+            offsets, sizes, self.max_read_gap, self.max_read_size, sort=False
+        )
+        with self._use_reader() as reader:
+            results = reader.map(
+                lambda read: reader.read_range(read[0], read[1] - read[0]), reads
+            )
+            for (start, _, indices), data in zip(reads, results):
+                for i in indices:
+                    yield bytes(
+                        data[offsets[i] - start : offsets[i] - start + sizes[i]]
+                    )
+
     def save_metadata(self, output_file):
         with open(output_file, "wb") as f:
             f.write(self.metadata)
@@ -44,376 +273,326 @@ class MP4Manager:
     def get_video_duration(self):
         return self.video_duration
 
-    def _read_box(self, fp):
+    def _open_reader(self):
+        return RangeReader(self.mp4_file, self.read_ahead, self.io_threads)
+
+    @contextmanager
+    def keep_open(self):
+        """
+        Keep the file open for the reads of iter_chunks made within the
+        context, e.g. to read the first sample and then the rest of the track
+        with a single open. The I/O counters are updated when it exits.
+        """
+        if self._reader is not None:
+            yield
+            return
+        with self._open_reader() as reader:
+            self._reader = reader
+            try:
+                yield
+            finally:
+                self._reader = None
+                self._count_reads(reader)
+
+    @contextmanager
+    def _use_reader(self):
+        """Yield the reader kept open by keep_open(), or a new one."""
+        if self._reader is not None:
+            yield self._reader
+            return
+        with self._open_reader() as reader:
+            try:
+                yield reader
+            finally:
+                self._count_reads(reader)
+
+    def _count_reads(self, reader):
+        """Add the I/O counters of a reader to the ones of the file."""
+        self.bytes_read += reader.bytes_read
+        self.seeks += reader.reads
+        self.read_time += reader.read_time
+
+    def _parse_video_file_info(self):
         """
-        Read a box header and return its details.
+        Read the video info and the chunk offsets and sizes of the metadata
+        track from the 'moov' box.
 
-        :param fp: File pointer.
-        :return: Tuple containing box size, box type, and start position.
+        Only the headers of the top level boxes are read until the 'moov' box
+        is found, then the whole box is read at once.
         """
-        start_of_box = fp.tell()
-        header = fp.read(8)
-        if len(header) < 8:
-            return None, None, None
+        with self._open_reader() as reader:
+            try:
+                self._parse_moov(self._read_moov(reader))
+            finally:
+                self._count_reads(reader)
+        return True
 
-        box_size, box_type = struct.unpack(">I4s", header)
-        box_type = box_type.decode("utf-8")
+    def _read_moov(self, reader):
+        """
+        Find the 'moov' box walking the top level box headers, and read it.
 
-        if box_size == 1:  # Extended size case
-            box_size = struct.unpack(">Q", fp.read(8))[0]
+        :param reader: RangeReader of the file.
+        :return: Buffer starting with the 'moov' box.
+        """
+        pos = 0
+        while True:
+            box = read_box_header(reader.read(pos, 16), 0, reader.size - pos)
+            if box is None:
+                raise ValueError(f"No 'moov' box found in {self.name}")
+            if box.box_type == "moov":
+                break
+            pos += box.size
 
-        return box_size, box_type, start_of_box
+        data = reader.read(pos, box.size)
+        if len(data) < box.size:
+            raise ValueError(f"Truncated 'moov' box in {self.name}")
+        return data
 
-    def _parse_video_file_info(self):
+    def _box_payload(self, data, path, start=0, end=None):
+        """
+        Return a zero-copy view of the payload of a box, or None.
         """
-        Read the chunk offsets and sizes for a specific track from the
-        'co64' and 'stsz' boxes.
+        box = find_box(data, path, start, end)
+        if box is None:
+            return None
+        return data[box.payload_start : box.end]
 
+    def _parse_moov(self, data):
+        """
+        Parse the 'moov' box for the video info and for the chunk offsets
+        and sizes of the metadata track.
         """
+        moov = find_box(data, "moov")
+        if moov is None:
+            raise ValueError(f"No 'moov' box found in {self.name}")
 
-        with open(self.mp4_file, "rb") as f:
-            while True:
-                box_size, box_type, start_of_box = self._read_box(f)
-                if not box_size:
-                    break
-                if box_type == "moov":
-                    moov_data = f.read(box_size - (f.tell() - start_of_box))
-                    self._parse_moov_for_co64_and_stsz(moov_data)
-                    break
-                f.seek(start_of_box + box_size)
+        mvhd_data = self._box_payload(data, "mvhd", moov.payload_start, moov.end)
+        if mvhd_data is not None:
+            self._parse_mvhd(mvhd_data)
 
-        return True
+        video_trak = find_box(
+            data, f"trak[{self.video_trak_index - 1}]", moov.payload_start, moov.end
+        )
+        if video_trak is not None:
+            tkhd_data = self._box_payload(
+                data, "tkhd", video_trak.payload_start, video_trak.end
+            )
+            if tkhd_data is not None:
+                self._parse_tkhd(tkhd_data)
+            stts_data = self._box_payload(
+                data, "mdia/minf/stbl/stts", video_trak.payload_start, video_trak.end
+            )
+            if stts_data is not None:
+                self._parse_stts(stts_data)
 
-    def _parse_moov_for_co64_and_stsz(self, moov_data):
-        """
-        Parse the 'moov' box to extract chunk offsets and sizes for
-        the specified track.
-
-        """
-        track_counter = 0
-
-        i = 0
-        while i < len(moov_data):
-            box_size, box_type = struct.unpack(">I4s", moov_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
-            if box_size == 1:  # Extended size case
-                box_size = struct.unpack(">Q", moov_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "trak":
-                track_counter += 1
-                if track_counter == self.video_trak_index:
-                    trak_data = moov_data[i + header_size : i + box_size]
-                    self._parse_trak_for_tkhd(trak_data)
-                if track_counter == self.metadata_track_index:
-                    trak_data = moov_data[i + header_size : i + box_size]
-                    self._parse_trak_for_co64_and_stsz(trak_data)
-            if box_type == "mvhd":
-                mvhd_data = moov_data[i + header_size : i + box_size]
-                self._parse_mvhd(mvhd_data)
-            i += box_size
+        stbl = find_box(
+            data,
+            f"trak[{self.metadata_track_index - 1}]/mdia/minf/stbl",
+            moov.payload_start,
+            moov.end,
+        )
+        if stbl is not None:
+            stsc_data = None
+            for box in iter_boxes(data, stbl.payload_start, stbl.end):
+                payload = data[box.payload_start : box.end]
+                if box.box_type == "co64":
+                    self._parse_co64(payload)
+                elif box.box_type == "stco":
+                    self._parse_stco(payload)
+                elif box.box_type == "stsz":
+                    self._parse_stsz(payload)
+                elif box.box_type == "stsc":
+                    stsc_data = payload
+                elif box.box_type == "stts":
+                    self._parse_sample_times(payload)
+            # The chunk offsets and the sample sizes are needed first
+            if stsc_data is not None:
+                self._parse_stsc(stsc_data)
+
+        mdhd_data = self._box_payload(
+            data,
+            f"trak[{self.metadata_track_index - 1}]/mdia/mdhd",
+            moov.payload_start,
+            moov.end,
+        )
+        if mdhd_data is not None:
+            self._parse_mdhd(mdhd_data)
         return True
 
     def _parse_mvhd(self, data):
         """
         Parse the 'mvhd' box for video duration.
         """
-        version = struct.unpack(">B", data[0:1])[0]
+        version = data[0]
         if version == 1:
-            duration = struct.unpack(">Q", data[20:28])[0]
+            time_scale, duration = struct.unpack_from(">IQ", data, 20)
         else:
-            duration = struct.unpack(">I", data[16:20])[0]
-        time_scale = struct.unpack(">I", data[12:16])[0]
+            time_scale, duration = struct.unpack_from(">II", data, 12)
         duration = duration / time_scale
         self.video_duration = duration
         return
 
-    def _parse_trak_for_tkhd(self, trak_data):
+    def _parse_tkhd(self, data):
         """
         Parse the 'tkhd' box to extract video resolution.
         """
-        i = 0
-        while i < len(trak_data):
-            box_size, box_type = struct.unpack(">I4s", trak_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
-
-            if box_size == 1:  # Extended size case
-                box_size = struct.unpack(">Q", trak_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "tkhd":
-                mdia_data = trak_data[i + header_size : i + box_size]
-                self._parse_tkhd(mdia_data)
-            if box_type == "mdia":
-                mdia_data = trak_data[i + header_size : i + box_size]
-                self._parse_mdia_for_stts(mdia_data)
-            i += box_size
-        return True
-
-    def _parse_tkhd(self, data):
-        width = struct.unpack(">I", data[76:80])[0] / 65536
-        height = struct.unpack(">I", data[80:84])[0] / 65536
-        self.video_width = width
-        self.video_height = height
-        return True
-
-    def _parse_mdia_for_stts(self, mdia_data):
-        """
-        Parse the 'mdia' box to find the 'minf' box for video duration.
-        """
-        i = 0
-        while i < len(mdia_data):
-            box_size, box_type = struct.unpack(">I4s", mdia_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
-            if box_size == 1:
-                box_size = struct.unpack(">Q", mdia_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "minf":
-                minf_data = mdia_data[i + header_size : i + box_size]
-                self._parse_minf_for_stts(minf_data)
-                break
-            i += box_size
-        return True
-
-    def _parse_minf_for_stts(self, minf_data):
-        """
-        Parse the 'minf' box to find the 'stbl' box for video duration.
-        """
-        i = 0
-        while i < len(minf_data):
-            box_size, box_type = struct.unpack(">I4s", minf_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
-            if box_size == 1:
-                box_size = struct.unpack(">Q", minf_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "stbl":
-                stbl_data = minf_data[i + header_size : i + box_size]
-                self._parse_stbl_for_stts(stbl_data)
-                break
-            i += box_size
-        return True
-
-    def _parse_stbl_for_stts(self, stbl_data):
-        """
-        Parse the 'stbl' box to find the 'stts' box for video duration.
-        """
-        i = 0
-        while i < len(stbl_data):
-            box_size, box_type = struct.unpack(">I4s", stbl_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
-            if box_size == 1:
-                box_size = struct.unpack(">Q", stbl_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "stts":
-                stts_data = stbl_data[i + header_size : i + box_size]
-                self._parse_stts(stts_data)
-                break
-            i += box_size
+        # The version 1 header has 64 bit times and duration
+        offset = 88 if data[0] == 1 else 76
+        width, height = struct.unpack_from(">II", data, offset)
+        self.video_width = width / 65536
+        self.video_height = height / 65536
         return True
 
     def _parse_stts(self, data):
         """
         Parse the 'stts' box for video duration.
         """
-        sample_count = struct.unpack(">I", data[8:12])[0]
-        sample_delta = struct.unpack(">I", data[12:16])[0]
+        sample_count, sample_delta = struct.unpack_from(">II", data, 8)
         self.video_sample_count = sample_count
         self.video_sample_delta = sample_delta
         return True
 
-    def _parse_trak_for_co64_and_stsz(self, trak_data):
+    def _parse_mdhd(self, data):
         """
-        Parse the 'trak' box to find the 'co64' and 'stsz' boxes
-        for chunk offsets and sizes.
-
-        :param trak_data: Binary data of the 'trak' box.
+        Parse the 'mdhd' box of the metadata track for its timescale.
         """
-
-        i = 0
-        while i < len(trak_data):
-            box_size, box_type = struct.unpack(">I4s", trak_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
-            if box_size == 1:  # Extended size case
-                box_size = struct.unpack(">Q", trak_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "mdia":
-                mdia_data = trak_data[i + header_size : i + box_size]
-                self._parse_mdia_for_co64_and_stsz(mdia_data)
-                break
-            i += box_size
-        return True
-
-    def _parse_mdia_for_co64_and_stsz(self, mdia_data):
-        """
-        Parse the 'mdia' box to find the 'co64' and 'stsz' boxes for
-        chunk offsets and sizes.
-
-        :param mdia_data: Binary data of the 'mdia' box.
-        """
-        i = 0
-        while i < len(mdia_data):
-            box_size, box_type = struct.unpack(">I4s", mdia_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
-            if box_size == 1:  # Extended size case
-                box_size = struct.unpack(">Q", mdia_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "minf":
-                minf_data = mdia_data[i + header_size : i + box_size]
-                self._parse_minf_for_co64_and_stsz(minf_data)
-                break
-            i += box_size
+        offset = 20 if data[0] == 1 else 12
+        (self.metadata_timescale,) = struct.unpack_from(">I", data, offset)
         return True
 
-    def _parse_minf_for_co64_and_stsz(self, minf_data):
+    def _parse_sample_times(self, data):
         """
-        Parse the 'minf' box to find the 'co64' and 'stsz' boxes
-        for chunk offsets and sizes.
+        Parse the 'stts' box of the metadata track for the start time and
+        the duration of each sample, in timescale units.
 
-        :param minf_data: Binary data of the 'minf' box.
+        :param data: Binary data of the 'stts' box.
         """
-        i = 0
-        while i < len(minf_data):
-            box_size, box_type = struct.unpack(">I4s", minf_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
+        if len(data) < 8:
+            raise ValueError(
+                f"Insufficient data for 'stts' header. Got {len(data)} "
+                "bytes, expected at least 8."
+            )
+        flags_version, entry_count = struct.unpack_from(">II", data)
+        self.table_entries["stts"] = entry_count
+        required_length = 8 + entry_count * 8
+        if len(data) < required_length:
+            raise ValueError(
+                f"Incomplete 'stts' data. Expected {required_length} "
+                f"bytes, got {len(data)}."
+            )
 
-            if box_size == 1:  # Extended size case
-                box_size = struct.unpack(">Q", minf_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "stbl":
-                stbl_data = minf_data[i + header_size : i + box_size]
-                self._parse_stbl_for_co64_and_stsz(stbl_data)
-                break
-            i += box_size
+        # Each entry is a (sample count, sample delta) pair
+        entries = np.frombuffer(data, dtype=">u4", count=2 * entry_count, offset=8)
+        entries = entries.astype(np.int64).reshape(-1, 2)
+        self.sample_durations = np.repeat(entries[:, 1], entries[:, 0])
+        self.sample_times = np.cumsum(self.sample_durations) - self.sample_durations
         return True
 
-    def _parse_stbl_for_co64_and_stsz(self, stbl_data):
-        """
-        Parse the 'stbl' box to find the 'co64' and 'stsz' boxes
-        for chunk offsets and sizes.
-
-        :param stbl_data: Binary data of the 'stbl' box.
+    def _parse_stsc(self, data):
         """
+        Parse the 'stsc' box and turn the chunk offsets into sample offsets.
 
-        i = 0
-        while i < len(stbl_data):
-            box_size, box_type = struct.unpack(">I4s", stbl_data[i : i + 8])
-            box_type = box_type.decode("utf-8")
-
-            if box_size == 1:  # Extended size case
-                box_size = struct.unpack(">Q", stbl_data[i + 8 : i + 16])[0]
-                header_size = 16
-            else:
-                header_size = 8
-            if box_type == "co64":
-                co64_data = stbl_data[i + header_size : i + box_size]
-                self._parse_co64(co64_data)
-            if box_type == "stco":
-                stco_data = stbl_data[i + header_size : i + box_size]
-                self._parse_stco(stco_data)
-            elif box_type == "stsz":
-                stsz_data = stbl_data[i + header_size : i + box_size]
-                self._parse_stsz(stsz_data)
-            i += box_size
-
-        return True
-
-    def _parse_stco(self, data):
-        """
-        Parse the 'stco' box for chunk offsets.
+        A chunk can hold several consecutive samples: the offset of each
+        sample is the offset of its chunk plus the sizes of the samples
+        before it in the same chunk.
 
-        :param data: Binary data of the 'stco' box.
-        :return: List of chunk offsets.
+        :param data: Binary data of the 'stsc' box.
         """
-        offsets = []
-
-        # Ensure there are at least 12 bytes for the header
-        if len(data) < 12:
+        if len(data) < 8:
             raise ValueError(
-                f"Insufficient data for 'stco' header. Got {len(data)} "
-                "bytes, expected at least 12."
+                f"Insufficient data for 'stsc' header. Got {len(data)} "
+                "bytes, expected at least 8."
             )
-
-        # Extract flags/version (4 byte) e entry_count (4 byte)
-        flags_version, entry_count = struct.unpack(">II", data[:8])
-
-        # Calculate required length and validate
-        required_length = 8 + entry_count * 4
+        flags_version, entry_count = struct.unpack_from(">II", data)
+        self.table_entries["stsc"] = entry_count
+        required_length = 8 + entry_count * 12
         if len(data) < required_length:
             raise ValueError(
-                f"Incomplete 'stco' data. Expected {required_length} "
+                f"Incomplete 'stsc' data. Expected {required_length} "
                 f"bytes, got {len(data)}."
             )
 
-        # Extract chunk offsets (4 bytes each)
-        for i in range(entry_count):
-            start = 8 + i * 4
-            end = start + 4
-            offset = struct.unpack(">I", data[start:end])[0]
-            offsets.append(offset)
-
-        self.offsets = offsets
+        # Each entry is a (first chunk, samples per chunk, description) triple
+        entries = np.frombuffer(data, dtype=">u4", count=3 * entry_count, offset=8)
+        entries = entries.astype(np.int64).reshape(-1, 3)
+        chunk_count = len(self.offsets)
+        first_chunks = np.minimum(entries[:, 0] - 1, chunk_count)
+        run_lengths = np.diff(first_chunks, append=chunk_count).clip(min=0)
+        samples_per_chunk = np.repeat(entries[:, 1], run_lengths)
+        if np.all(samples_per_chunk == 1):
+            return True
+
+        chunk_of_sample = np.repeat(np.arange(chunk_count), samples_per_chunk)
+        sample_count = min(len(chunk_of_sample), len(self.sizes))
+        chunk_of_sample = chunk_of_sample[:sample_count]
+        sizes = self.sizes[:sample_count].astype(np.uint64)
+        # Position of each sample from the start of the track data
+        positions = np.cumsum(sizes) - sizes
+        first_samples = np.cumsum(samples_per_chunk) - samples_per_chunk
+        first_samples = first_samples[chunk_of_sample]
+        self.offsets = (
+            self.offsets[chunk_of_sample] + positions - positions[first_samples]
+        )
+        self.sizes = self.sizes[:sample_count]
         return True
 
-    def _parse_co64(self, data):
+    def _parse_chunk_offsets(self, data, box_type, dtype):
         """
-        Parse the 'co64' box for chunk offsets.
+        Decode the chunk offsets table of a 'stco' or 'co64' box.
 
-        :param data: Binary data of the 'co64' box.
-        :return: List of chunk offsets.
+        :param data: Binary data of the box.
+        :param box_type: Type of the box, used in the error messages.
+        :param dtype: Big endian numpy type of the table entries.
+        :return: Array of chunk offsets, as uint64.
         """
-        offsets = []
-
-        # Ensure there are at least 12 bytes for the header
-        if len(data) < 12:
+        # Ensure there are at least 8 bytes for the header
+        if len(data) < 8:
             raise ValueError(
-                f"Insufficient data for 'co64' header. Got {len(data)} "
-                "bytes, expected at least 12."
+                f"Insufficient data for '{box_type}' header. Got {len(data)} "
+                "bytes, expected at least 8."
             )
 
         # Extract flags/version (4 byte) e entry_count (4 byte)
-        flags_version, entry_count = struct.unpack(">II", data[:8])
+        flags_version, entry_count = struct.unpack_from(">II", data)
+        self.table_entries[box_type] = entry_count
 
         # Calculate required length and validate
-        required_length = 8 + entry_count * 8
+        entry_size = np.dtype(dtype).itemsize
+        required_length = 8 + entry_count * entry_size
         if len(data) < required_length:
             raise ValueError(
-                f"Incomplete 'co64' data. Expected {required_length} "
+                f"Incomplete '{box_type}' data. Expected {required_length} "
                 f"bytes, got {len(data)}."
             )
 
-        # Extract chunk offsets (8 bytes each)
-        for i in range(entry_count):
-            start = 8 + i * 8
-            end = start + 8
-            offset = struct.unpack(">Q", data[start:end])[0]
-            offsets.append(offset)
+        # Decode the whole table at once and convert it to native byte order
+        offsets = np.frombuffer(data, dtype=dtype, count=entry_count, offset=8)
+        return offsets.astype(np.uint64)
+
+    def _parse_stco(self, data):
+        """
+        Parse the 'stco' box for chunk offsets (4 bytes each).
+
+        :param data: Binary data of the 'stco' box.
+        """
+        self.offsets = self._parse_chunk_offsets(data, "stco", ">u4")
+        return True
+
+    def _parse_co64(self, data):
+        """
+        Parse the 'co64' box for chunk offsets (8 bytes each).
 
-        self.offsets = offsets
+        :param data: Binary data of the 'co64' box.
+        """
+        self.offsets = self._parse_chunk_offsets(data, "co64", ">u8")
         return True
 
     def _parse_stsz(self, data):
         """
-        Parse the 'stsz' box for chunk offsets.
+        Parse the 'stsz' box for sample sizes.
 
         :param data: Binary data of the 'stsz' box.
-        :return: List of chunk sizes.
         """
-        sizes = []
-
         # Ensure there are at least 12 bytes for the header
         if len(data) < 12:
             raise ValueError(
@@ -421,47 +600,76 @@ class MP4Manager:
                 "bytes, expected at least 12."
             )
 
-        # Extract flags/version (4 byte) e entry_count (4 byte)
+        # Extract flags/version (4 byte), sample_size (4 byte)
+        # and entry_count (4 byte)
+        flags_version, sample_size, entry_count = struct.unpack_from(">III", data)
+        self.table_entries["stsz"] = entry_count
 
-        flags, version, entry_count = struct.unpack(">III", data[:12])
+        # All the samples have the same size, there is no table
+        if sample_size != 0:
+            self.sizes = np.full(entry_count, sample_size, dtype=np.uint32)
+            return True
 
         # Calculate required length and validate
-        required_length = 4 + entry_count * 4
+        required_length = 12 + entry_count * 4
         if len(data) < required_length:
             raise ValueError(
                 f"Incomplete 'stsz' data. Expected {required_length} "
                 f"bytes, got {len(data)}."
             )
 
-        # Extract chunk sizes (4 bytes each)
-        for i in range(entry_count):
-            start = 12 + i * 4
-            end = start + 4
-            size = struct.unpack(">I", data[start:end])[0]
-            sizes.append(size)
-        self.sizes = sizes
+        # Decode the whole table at once and convert it to native byte order
+        sizes = np.frombuffer(data, dtype=">u4", count=entry_count, offset=12)
+        self.sizes = sizes.astype(np.uint32)
         return True
 
     def _extract_chunks(self):
         """
-        Extract chunks from the 'mdat' box and join them into a single file.
-        """
-        with open(self.mp4_file, "rb") as f:
-            for i, offset in enumerate(self.offsets):
-                f.seek(offset)
-                chunk_data = f.read(self.sizes[i])
-                self._append_metadata(chunk_data)
-        return True
-
-    def _append_metadata(self, chunk_data):
-        """
-        Append metadata to the extracted chunk data.
-
-        :param chunk_data: Binary data of the extracted chunk.
-        """
-        if self.metadata is not None:
-            self.metadata += chunk_data
-        else:
-            self.metadata = chunk_data
-
+        Extract chunks from the 'mdat' box and join them into a single buffer.
+
+        The chunks are read with a few large reads, see plan_reads, into a
+        preallocated buffer sized from the sample table, which is exposed as
+        a memoryview.
+        """
+        offsets = self.offsets.tolist()
+        sizes = self.sizes.tolist()
+        destinations = [0, *accumulate(sizes)]
+        metadata = memoryview(bytearray(destinations[-1]))
+
+        def fill(read):
+            start, end, samples = read
+            length = end - start
+            first = samples[0]
+            if destinations[first + len(samples)] - destinations[first] == (
+                length
+            ) and samples == list(range(first, first + len(samples))):
+                # Consecutive samples without gaps: read them in place
+                destination = destinations[first]
+                if (
+                    reader.readinto(start, metadata[destination : destination + length])
+                    != length
+                ):
+                    raise ValueError(f"Truncated metadata track in {self.name}")
+                return
+
+            data = reader.read_range(start, length)
+            if len(data) != length:
+                raise ValueError(f"Truncated metadata track in {self.name}")
+            for i in samples:
+                source = offsets[i] - start
+                destination = destinations[i]
+                metadata[destination : destination + sizes[i]] = data[
+                    source : source + sizes[i]
+                ]
+
+        # The reads fill separate parts of the buffer, in any order
+        reads = plan_reads(offsets, sizes, self.max_read_gap, self.max_read_size)
+        with self._open_reader() as reader:
+            try:
+                for _ in reader.map(fill, reads):
+                    pass
+            finally:
+                self._count_reads(reader)
+
+        self.metadata = metadata
         return True
@@ -1,55 +1,595 @@
+import asyncio
 import logging
-import xml.etree.ElementTree as ET
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+from typing import NamedTuple
 
-import gpxpy.gpx
+import numpy as np
 
 from .data_filters import (
     discard_resample_gps_data,
     linear_resample_gps_data,
     lpf_resample_gps_data,
+    polyphase_resample_gps_data,
+    simplify_gps_data,
 )
-from .metadata_manager import extract_gps_info
+from .defaults import RESAMPLING_METHODS
+from .gps_track import GpsTrack
+from .gpx_writer import write_gpx
+from .io_planner import is_path, source_name
+from .metadata_manager import extract_gps_info, read_camera_info, timezone_delta
 from .mp4_manager import MP4Manager
+from .stats import FileStats, RunStats, peak_memory
+from .track_archive import read_track_archive, write_track_archive
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
 
+class FileResult(NamedTuple):
+    input_file: str
+    gps_data: GpsTrack
+    frame_rate: float
+    error: Exception
+    stats: FileStats = None
+
+
+def read_header(mp4):
+    """
+    Read the first sample of the metadata track, holding the camera and
+    stream info.
+
+    :param mp4: MP4Manager of the file.
+    :return: The sample, as bytes.
+    """
+    if len(mp4.sizes) == 0:
+        raise ValueError(f"No metadata samples found in {mp4.name}")
+    return next(mp4.iter_chunks([0]))
+
+
+def check_header(mp4):
+    """
+    Check the camera model from the first metadata sample only, so that the
+    unsupported files are rejected before reading the rest of the track.
+
+    :param mp4: MP4Manager of the file.
+    :return: The first sample, as bytes, so that it is not read again.
+    """
+    header = read_header(mp4)
+    info = read_camera_info(header)
+    if not info["supported"]:
+        raise ValueError(
+            f"The camera model of {mp4.name} ({info['camera_name']}, "
+            f"{info['proto_name']}) is not a supported Osmo Action camera (yet?)."
+        )
+    return header
+
+
+def probe(input_file):
+    """
+    Read the camera and video info of a file, without extracting the GPS
+    data.
+
+    Only the 'moov' box and the first sample of the metadata track are read.
+
+    :param input_file: Path of the video file.
+    :return: Dict with the file name, the camera name, serial number and proto
+        name, whether the camera is supported, the video resolution, frame rate
+        and duration (seconds), the frame rate of the GPS data and the number
+        of GPS samples.
+    """
+    mp4 = MP4Manager(input_file, extract_chunks=False)
+    info = read_camera_info(read_header(mp4))
+    gps_frame_rate = info.pop("frame_rate")
+    return {
+        "file": source_name(input_file),
+        **info,
+        "width": mp4.video_width,
+        "height": mp4.video_height,
+        "frame_rate": mp4.video_frame_rate,
+        "duration": mp4.video_duration,
+        "gps_frame_rate": gps_frame_rate,
+        "gps_sample_count": len(mp4.sizes),
+    }
+
+
+def read_window(mp4, start=None, end=None, header=None):
+    """
+    Read the metadata samples of a file covering a time window.
+
+    The first sample holds the camera and stream info, so it is always read:
+    when it is outside the window it is returned apart as the header.
+
+    :param mp4: MP4Manager of the file.
+    :param start: Start of the window, in seconds from the beginning of the
+        file.
+    :param end: End of the window, in seconds from the beginning of the file.
+    :param header: Optional first sample, already read e.g. by check_header,
+        so that it is not read again.
+    :return: Tuple with the iterator of the chunks and the header chunk, or
+        None if the chunks include the first sample.
+    """
+    if start is None and end is None:
+        if header is None:
+            return mp4.iter_chunks(), None
+        samples = np.arange(len(mp4.sizes))
+    else:
+        samples = mp4.select_samples(start, end)
+        logger.info(
+            f"Reading {len(samples)}/{len(mp4.sizes)} metadata samples "
+            f"of the time window"
+        )
+    if len(samples) > 0 and samples[0] == 0:
+        if header is None:
+            return mp4.iter_chunks(samples), None
+        return chain([header], mp4.iter_chunks(samples[1:])), None
+    if header is None and len(mp4.sizes) > 0:
+        header = read_header(mp4)
+    return mp4.iter_chunks(samples), header
+
+
+def _decode_file(mp4, timezone_offset, extract_extensions, start, end, stats):
+    """
+    Read and decode the GPS data of a file, splitting the time spent between
+    the 'read', 'decode' and 'datetime' stages of stats.
+    """
+    decode_start = time.perf_counter()
+    read_time = mp4.read_time
+    datetime_time = stats.stages.get("datetime", 0.0)
+
+    # The header and the other samples are read with the same open file
+    with mp4.keep_open():
+        header = check_header(mp4)
+        chunks, header = read_window(mp4, start, end, header)
+        result = extract_gps_info(
+            chunks, timezone_offset, extract_extensions, header=header, stats=stats
+        )
+
+    # The chunks are read while they are decoded
+    elapsed = time.perf_counter() - decode_start
+    read_time = mp4.read_time - read_time
+    datetime_time = stats.stages.get("datetime", 0.0) - datetime_time
+    stats.add("read", read_time)
+    stats.add("decode", elapsed - read_time - datetime_time)
+    return result
+
+
+def extract_file(
+    input_file,
+    timezone_offset=0,
+    extract_extensions=False,
+    cache=None,
+    start=None,
+    end=None,
+    stats=None,
+    read_ahead=None,
+    max_read_gap=None,
+    io_threads=None,
+):
+    """
+    Extract the GPS data of a single file, using the cache if enabled.
+
+    :param input_file: Path of the video file, or a seekable file-like object
+        or buffer with its content, see MP4Manager.
+    :param timezone_offset: Timezone offset in hours.
+    :param extract_extensions: Also extract the extension fields.
+    :param cache: Optional ExtractionCache, only used when input_file is a
+        path.
+    :param start: Optional start of the time window to extract, in seconds
+        from the beginning of the file.
+    :param end: Optional end of the time window, in seconds from the
+        beginning of the file.
+    :param stats: Optional FileStats, filled with the instrumentation of the
+        extraction.
+    :param read_ahead: Smallest read issued while looking for the 'moov' box,
+        in bytes, see MP4Manager.
+    :param max_read_gap: Largest gap between two metadata samples read
+        through in the same read, in bytes, see MP4Manager.
+    :param io_threads: Number of threads reading the metadata samples
+        concurrently, see MP4Manager.
+    :return: Tuple with the GpsTrack and the frame rate.
+    """
+    if stats is None:
+        stats = FileStats(input_file)
+    with stats.timer("moov"):
+        mp4 = MP4Manager(
+            input_file,
+            extract_chunks=False,
+            read_ahead=read_ahead,
+            max_read_gap=max_read_gap,
+            io_threads=io_threads,
+        )
+    stats.table_entries = dict(mp4.table_entries)
+
+    try:
+        if cache is None or not is_path(input_file):
+            result = _decode_file(
+                mp4, timezone_offset, extract_extensions, start, end, stats
+            )
+        else:
+            # The cache entries are stored without the timezone offset
+            key = cache.key(input_file, mp4, extract_extensions, start, end)
+            with stats.timer("cache"):
+                cached = cache.get(key)
+            if cached is not None:
+                gps_info, input_frame_rate = cached
+                stats.points_decoded = len(gps_info)
+            else:
+                gps_info, input_frame_rate = _decode_file(
+                    mp4, 0, extract_extensions, start, end, stats
+                )
+                with stats.timer("cache"):
+                    cache.put(key, gps_info, input_frame_rate)
+            gps_info = GpsTrack(
+                gps_info.timeinfo - timezone_delta(timezone_offset), gps_info.fields
+            )
+            result = gps_info, input_frame_rate
+    finally:
+        stats.bytes_read = mp4.bytes_read
+        stats.seeks = mp4.seeks
+        stats.peak_memory = peak_memory()
+    return result
+
+
+def _extract_file_result(input_file, **kwargs):
+    """
+    Run extract_file, returning the errors in the result instead of raising
+    them, so that a failing file does not stop the others.
+    """
+    stats = FileStats(input_file)
+    try:
+        gps_data, frame_rate = extract_file(input_file, stats=stats, **kwargs)
+    except Exception as e:
+        return FileResult(input_file, None, None, e, stats)
+    return FileResult(input_file, gps_data, frame_rate, None, stats)
+
+
+async def _aiter_extract_indexed(inputs, concurrency, executor, **kwargs):
+    """
+    Extract the files in an executor, yielding (index, FileResult) tuples in
+    completion order. At most concurrency files are submitted at a time, and
+    the pending ones are cancelled if the iteration stops early.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    worker = partial(_extract_file_result, **kwargs)
+
+    async def run(index, input_file):
+        async with semaphore:
+            return index, await loop.run_in_executor(executor, worker, input_file)
+
+    tasks = [
+        asyncio.ensure_future(run(index, input_file))
+        for index, input_file in enumerate(inputs)
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def aiter_extract(
+    inputs,
+    timezone_offset=0,
+    extract_extensions=False,
+    cache=None,
+    concurrency=4,
+    executor=None,
+    start=None,
+    end=None,
+    read_ahead=None,
+    max_read_gap=None,
+    io_threads=None,
+):
+    """
+    Extract the GPS data of several files without blocking the event loop.
+
+    The file I/O and the decoding run in an executor, with at most
+    concurrency files in progress at the same time. Breaking out of the
+    iteration, or cancelling the task consuming it, cancels the files that
+    have not been started yet.
+
+    :param inputs: List of video files.
+    :param timezone_offset: Timezone offset in hours.
+    :param extract_extensions: Also extract the extension fields.
+    :param cache: Optional ExtractionCache.
+    :param concurrency: Maximum number of files processed at the same time.
+    :param executor: Executor running the extraction, defaults to the event
+        loop default executor. A ProcessPoolExecutor decodes the files in
+        parallel.
+    :param start: Optional start of the time window to extract from each
+        file, in seconds from the beginning of the file.
+    :param end: Optional end of the time window, see start.
+    :param read_ahead: Smallest read issued while looking for the 'moov' box,
+        see MP4Manager.
+    :param max_read_gap: Largest gap between two metadata samples read
+        through in the same read, see MP4Manager.
+    :param io_threads: Number of threads reading the metadata samples of each
+        file concurrently, see MP4Manager.
+    :return: Async iterator of FileResult, in completion order.
+    """
+    async for _, result in _aiter_extract_indexed(
+        inputs,
+        concurrency,
+        executor,
+        timezone_offset=timezone_offset,
+        extract_extensions=extract_extensions,
+        cache=cache,
+        start=start,
+        end=end,
+        read_ahead=read_ahead,
+        max_read_gap=max_read_gap,
+        io_threads=io_threads,
+    ):
+        yield result
+
+
 class OsmoGps:
     gps_data = None
     inputs = None
     input_frame_rate = None
+    input_frame_rates = None
+    # Errors of the files that could not be processed, by path (by index in
+    # inputs for the file objects and the buffers)
+    errors = None
     output_frequency = None
     resampling_method = None
     extract_extensions = False
+    cache = None
+    jobs = 1
+    start = None
+    end = None
+    max_gap = None
+    # I/O parameters of MP4Manager, None for its defaults
+    read_ahead = None
+    max_read_gap = None
+    io_threads = None
+    segment_frame_rates = None
+    stats = None
 
-    def __init__(self, inputs, timezone_offset=0, extract_extensions=False):
+    def __init__(
+        self,
+        inputs,
+        timezone_offset=0,
+        extract_extensions=False,
+        cache=None,
+        jobs=1,
+        start=None,
+        end=None,
+        stats_callback=None,
+        max_gap=None,
+        read_ahead=None,
+        max_read_gap=None,
+        io_threads=None,
+    ):
+        """
+        :param inputs: List of video files, as paths, seekable file-like
+            objects or buffers. The file objects cannot be sent to the worker
+            processes, use them with jobs=1.
+        :param timezone_offset: Timezone offset in hours.
+        :param extract_extensions: Also extract the accelerometer and
+            derivative fields.
+        :param cache: Optional ExtractionCache, reused across runs to skip
+            the decoding of files already processed.
+        :param jobs: Number of files processed in parallel, in separate
+            processes. 0 uses all the available CPUs.
+        :param start: Optional start of the time window to extract from each
+            file, in seconds from the beginning of the file. Only the
+            metadata samples in the window are read and decoded.
+        :param end: Optional end of the time window, see start.
+        :param stats_callback: Optional function called at the end of each
+            processing stage with the stage name, its duration in seconds and
+            the name of the input file (None for the stages on the joined
+            track). The collected instrumentation is available in the stats attribute.
+        :param max_gap: Optional largest time between two samples of the same
+            segment, in seconds. The data of each file is a separate segment,
+            and with max_gap the files are also split at their gaps. The
+            segments are resampled on their own and saved as separate GPX
+            track segments.
+        :param read_ahead: Smallest read issued while looking for the 'moov'
+            box of each file, in bytes, see MP4Manager.
+        :param max_read_gap: Largest gap between two metadata samples read
+            through in the same read, in bytes, see MP4Manager.
+        :param io_threads: Number of threads reading the metadata samples of
+            each file concurrently, for the paths on high latency storage,
+            see MP4Manager.
+        """
+        self._configure(
+            inputs,
+            timezone_offset,
+            extract_extensions,
+            cache,
+            jobs,
+            start,
+            end,
+            stats_callback,
+            max_gap,
+            read_ahead,
+            max_read_gap,
+            io_threads,
+        )
+
+        self.extract()
+
+    def _configure(
+        self,
+        inputs,
+        timezone_offset,
+        extract_extensions,
+        cache,
+        jobs,
+        start=None,
+        end=None,
+        stats_callback=None,
+        max_gap=None,
+        read_ahead=None,
+        max_read_gap=None,
+        io_threads=None,
+    ):
         if inputs is None:
             raise ValueError("inputs cannot be None")
+        if start is not None and end is not None and end < start:
+            raise ValueError("end cannot be before start")
         self.inputs = inputs
         self.timezone_offset = timezone_offset
         self.extract_extensions = extract_extensions
+        self.cache = cache
+        self.jobs = jobs
+        self.start = start
+        self.end = end
+        self.stats = RunStats(stats_callback)
+        self.max_gap = max_gap
+        self.read_ahead = read_ahead
+        self.max_read_gap = max_read_gap
+        self.io_threads = io_threads
 
-        self.extract()
+    @classmethod
+    async def aextract(
+        cls,
+        inputs,
+        timezone_offset=0,
+        extract_extensions=False,
+        cache=None,
+        concurrency=4,
+        executor=None,
+        start=None,
+        end=None,
+        stats_callback=None,
+        max_gap=None,
+        read_ahead=None,
+        max_read_gap=None,
+        io_threads=None,
+    ):
+        """
+        Create an OsmoGps instance without blocking the event loop.
+
+        The files are extracted in an executor, see aiter_extract and
+        __init__ for the meaning of the parameters.
+
+        :return: OsmoGps instance, with the data of the files in input order.
+        """
+        gps = cls.__new__(cls)
+        gps._configure(
+            inputs,
+            timezone_offset,
+            extract_extensions,
+            cache,
+            1,
+            start,
+            end,
+            stats_callback,
+            max_gap,
+            read_ahead,
+            max_read_gap,
+            io_threads,
+        )
+        logger.info(f"Running extract command with inputs: {gps.inputs}")
+
+        results = [None] * len(gps.inputs)
+        async for index, result in _aiter_extract_indexed(
+            gps.inputs,
+            concurrency,
+            executor,
+            timezone_offset=timezone_offset,
+            extract_extensions=extract_extensions,
+            cache=cache,
+            start=start,
+            end=end,
+            read_ahead=read_ahead,
+            max_read_gap=max_read_gap,
+            io_threads=io_threads,
+        ):
+            results[index] = result
+        gps._collect_results(results)
+        return gps
 
     def extract(self):
 
         logger.info(f"Running extract command with inputs: {self.inputs}")
 
-        self.gps_data = []
-        for i, input_file in enumerate(self.inputs, start=1):
-            logger.info(f"Processing file {i}/{len(self.inputs)}: {input_file}")
+        worker = partial(
+            _extract_file_result,
+            timezone_offset=self.timezone_offset,
+            extract_extensions=self.extract_extensions,
+            cache=self.cache,
+            start=self.start,
+            end=self.end,
+            read_ahead=self.read_ahead,
+            max_read_gap=self.max_read_gap,
+            io_threads=self.io_threads,
+        )
+        jobs = min(self.jobs if self.jobs > 0 else os.cpu_count(), len(self.inputs))
+        if jobs > 1:
+            # The results are returned in input order, whatever the completion order
+            logger.info(f"Extracting with {jobs} parallel jobs")
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(worker, self.inputs))
+        else:
+            results = map(worker, self.inputs)
 
-            mp4 = MP4Manager(input_file)
-            metadata = mp4.get_metadata()
+        self._collect_results(results)
 
-            gps_info, input_frame_rate = extract_gps_info(
-                metadata, self.timezone_offset, self.extract_extensions
-            )
-            logger.info(f"Frame rate: {input_frame_rate}")
-            self.input_frame_rate = input_frame_rate
-            logger.info(f"Extracted {len(gps_info)} GPS data points.")
+    def _collect_results(self, results):
+        """
+        Join the per-file results, in input order.
+
+        :param results: Iterable of FileResult.
+        """
+        tracks = []
+        track_frame_rates = []
+        self.input_frame_rates = []
+        self.errors = {}
+        for i, result in enumerate(results, start=1):
+            input_name = source_name(result.input_file)
+            logger.info(f"Processing file {i}/{len(self.inputs)}: {input_name}")
+            self.input_frame_rates.append(result.frame_rate)
+            if result.stats is not None:
+                self.stats.add_file(result.stats)
+            if result.error is not None:
+                logger.error(f"Error processing {input_name}: {result.error}")
+                key = result.input_file if is_path(result.input_file) else i - 1
+                self.errors[key] = result.error
+                continue
+
+            logger.info(f"Frame rate: {result.frame_rate}")
+            logger.info(f"Extracted {len(result.gps_data)} GPS data points.")
+            if len(result.gps_data) > 0:
+                tracks.append(result.gps_data)
+                track_frame_rates.append(result.frame_rate)
+
+        if self.errors and len(self.errors) == len(self.inputs):
+            raise next(iter(self.errors.values()))
 
-            self.gps_data.extend(gps_info)
+        frame_rates = [rate for rate in self.input_frame_rates if rate is not None]
+        if frame_rates:
+            self.input_frame_rate = frame_rates[0]
+            if any(rate != self.input_frame_rate for rate in frame_rates):
+                logger.info(
+                    f"The input files have different frame rates {frame_rates}, "
+                    "each one is resampled with its own"
+                )
+
+        # Each file is a segment, with its own frame rate
+        self.gps_data = GpsTrack.concatenate(tracks)
+        self.segment_frame_rates = [
+            self.input_frame_rate if rate is None else rate
+            for rate in track_frame_rates
+        ]
+        if self.max_gap is not None:
+            gps_data = self.gps_data.split_gaps(self.max_gap)
+            files = np.searchsorted(
+                self.gps_data.segment_starts, gps_data.segment_starts, side="right"
+            )
+            self.segment_frame_rates = [
+                self.segment_frame_rates[i - 1] for i in files.tolist()
+            ]
+            self.gps_data = gps_data
+        logger.info(f"The GPS data has {len(self.segment_frame_rates)} segments")
 
     def resample(
         self,
@@ -58,13 +598,11 @@ class OsmoGps:
     ):
         self.resampling_method = resampling_method
         if self.resampling_method is not None:
-            if self.resampling_method not in ["discard", "linear", "lpf", "none"]:
-                raise ValueError(
-                    "resampling_method must be one of "
-                    "'discard', 'linear', 'lpf', 'none'"
-                )
+            if self.resampling_method not in RESAMPLING_METHODS:
+                methods = ", ".join(f"'{method}'" for method in RESAMPLING_METHODS)
+                raise ValueError(f"resampling_method must be one of {methods}")
             self.output_frequency = output_frequency
-            if self.resampling_method in ["discard", "linear", "lpf"]:
+            if self.resampling_method != "none":
                 if self.output_frequency is None:
                     raise ValueError(
                         "output_frequency cannot be None when "
@@ -74,87 +612,144 @@ class OsmoGps:
                 f"Resampling GPS data with method: {self.resampling_method}, "
                 f"output frequency: {self.output_frequency}"
             )
-            if self.resampling_method == "linear":
-                resampled_data = linear_resample_gps_data(
-                    self.gps_data, self.input_frame_rate, self.output_frequency
-                )
-            elif self.resampling_method == "lpf":
-                resampled_data = lpf_resample_gps_data(
-                    self.gps_data, self.input_frame_rate, self.output_frequency
-                )
-            elif self.resampling_method == "discard":
-                resampled_data = discard_resample_gps_data(
-                    self.gps_data, self.input_frame_rate, self.output_frequency
-                )
-            self.gps_data = resampled_data
-
-    def save_gpx(self, output_file):
-        if self.gps_data != []:
-            gpx = gpxpy.gpx.GPX()
-            gpx.creator = "pyosmogps -- https://github.com/francescocaponio/pyosmogps"
-            track = gpxpy.gpx.GPXTrack()
-            gpx.tracks.append(track)
-            segment = gpxpy.gpx.GPXTrackSegment()
-            track.segments.append(segment)
-
-            latitude = [point["latitude"] for point in self.gps_data]
-            longitude = [point["longitude"] for point in self.gps_data]
-            altitude = [point["altitude"] for point in self.gps_data]
-            timeinfo = [point["timeinfo"] for point in self.gps_data]
-            if self.extract_extensions:
-                camera_acc_x = [point["camera_acc_x"] for point in self.gps_data]
-                camera_acc_y = [point["camera_acc_y"] for point in self.gps_data]
-                camera_acc_z = [point["camera_acc_z"] for point in self.gps_data]
-                remote_der_x = [point["remote_der_x"] for point in self.gps_data]
-                remote_der_y = [point["remote_der_y"] for point in self.gps_data]
-                remote_der_z = [point["remote_der_z"] for point in self.gps_data]
-
-            for i in range(len(timeinfo)):
-                point = gpxpy.gpx.GPXTrackPoint(
-                    latitude=latitude[i],
-                    longitude=longitude[i],
-                    elevation=altitude[i],
-                    time=timeinfo[i],
+            input_frame_rates = self._input_frame_rates()
+            with self.stats.timer("resample"):
+                if self.resampling_method == "linear":
+                    resampled_data = linear_resample_gps_data(
+                        self.gps_data, input_frame_rates, self.output_frequency
+                    )
+                elif self.resampling_method == "lpf":
+                    resampled_data = lpf_resample_gps_data(
+                        self.gps_data, input_frame_rates, self.output_frequency
+                    )
+                elif self.resampling_method == "polyphase":
+                    resampled_data = polyphase_resample_gps_data(
+                        self.gps_data, input_frame_rates, self.output_frequency
+                    )
+                elif self.resampling_method == "discard":
+                    resampled_data = discard_resample_gps_data(
+                        self.gps_data, input_frame_rates, self.output_frequency
+                    )
+                else:
+                    resampled_data = self.gps_data
+                self.gps_data = resampled_data
+            if self.resampling_method != "none":
+                self.segment_frame_rates = [self.output_frequency] * len(
+                    self.gps_data.segment_starts
                 )
 
-                if self.extract_extensions:
-                    extensions = ET.Element("extensions")
-
-                    acc_x_ext = ET.SubElement(extensions, "acc_x")
-                    acc_x_ext.text = f"{camera_acc_x[i]:.3f}"
-
-                    acc_y_ext = ET.SubElement(extensions, "acc_y")
-                    acc_y_ext.text = f"{camera_acc_y[i]:.3f}"
+    def simplify(self, tolerance):
+        """
+        Drop the points that are not needed to keep the shape of the track,
+        e.g. on the straight or stationary stretches, see simplify_gps_data.
+        Usually called after resample, each segment is simplified on its own.
 
-                    acc_z_ext = ET.SubElement(extensions, "acc_z")
-                    acc_z_ext.text = f"{camera_acc_z[i]:.3f}"
+        :param tolerance: Largest distance of a dropped point from the
+            simplified track, in meters.
+        """
+        points = len(self.gps_data)
+        with self.stats.timer("simplify"):
+            self.gps_data = simplify_gps_data(self.gps_data, tolerance)
+        logger.info(
+            f"Simplified the GPS data from {points} to {len(self.gps_data)} points "
+            f"with a tolerance of {tolerance} m"
+        )
 
-                    der_x_ext = ET.SubElement(extensions, "der_x")
-                    der_x_ext.text = f"{remote_der_x[i]:.3f}"
+    def _input_frame_rates(self):
+        """
+        Return the frame rate of each segment if known, otherwise the frame
+        rate of the first file.
+        """
+        rates = self.segment_frame_rates
+        if (
+            rates is not None
+            and len(rates) == len(self.gps_data.segment_starts)
+            and all(rate is not None for rate in rates)
+        ):
+            return rates
+        return self.input_frame_rate
 
-                    der_y_ext = ET.SubElement(extensions, "der_y")
-                    der_y_ext.text = f"{remote_der_y[i]:.3f}"
+    def save_gpx(self, output_file, compress=None):
+        """
+        Write the GPS data to a GPX file.
 
-                    der_z_ext = ET.SubElement(extensions, "der_z")
-                    der_z_ext.text = f"{remote_der_z[i]:.3f}"
+        :param output_file: Path of the GPX file.
+        :param compress: Write a gzip compressed file. When None, the file is
+            compressed if its name ends with '.gz'.
+        :return: True if the file was written, False if there is no data.
+        """
+        if len(self.gps_data) > 0:
+            with self.stats.timer("save"):
+                self.stats.points_emitted = write_gpx(
+                    output_file, self.gps_data, self.extract_extensions, compress
+                )
 
-                    point.extensions.append(extensions)
-                segment.points.append(point)
+            logger.info(f"GPS data written to {output_file}")
+            return True
+        else:
+            logger.info("No GPS data extracted.")
+            return False
 
-            with open(output_file, "w") as gpx_file:
-                gpx_file.write(gpx.to_xml())
+    def save_archive(self, output_file):
+        """
+        Write the GPS data to a compact track archive, see track_archive.
 
+        :param output_file: Path of the archive.
+        :return: True if the file was written, False if there is no data.
+        """
+        if len(self.gps_data) > 0:
+            with self.stats.timer("save"):
+                write_track_archive(
+                    output_file,
+                    self.gps_data,
+                    self._sample_rate(),
+                    self.extract_extensions,
+                )
+            self.stats.points_emitted = len(self.gps_data)
             logger.info(f"GPS data written to {output_file}")
             return True
         else:
             logger.info("No GPS data extracted.")
             return False
 
+    @classmethod
+    def from_archive(cls, input_file, start=None, end=None):
+        """
+        Load the GPS data from a track archive, without reading any video.
+
+        :param input_file: Path of the archive.
+        :param start: Optional first time to load.
+        :param end: Optional last time to load.
+        :return: OsmoGps instance.
+        """
+        gps_data, header = read_track_archive(input_file, start, end)
+        gps = cls.__new__(cls)
+        gps._configure([input_file], 0, header["extract_extensions"], None, 1)
+        gps.gps_data = gps_data
+        gps.input_frame_rate = header["frame_rate"]
+        gps.input_frame_rates = [header["frame_rate"]]
+        gps.segment_frame_rates = [header["frame_rate"]] * len(gps_data.segment_starts)
+        gps.errors = {}
+        return gps
+
+    def _sample_rate(self):
+        """Return the rate of the current samples, after any resampling."""
+        if self.resampling_method not in [None, "none"]:
+            return self.output_frequency
+        return self.input_frame_rate
+
     def get_altitude(self):
-        return [point["altitude"] for point in self.gps_data]
+        return self.gps_data["altitude"]
 
     def get_latitude(self):
-        return [point["latitude"] for point in self.gps_data]
+        return self.gps_data["latitude"]
 
     def get_longitude(self):
-        return [point["longitude"] for point in self.gps_data]
+        return self.gps_data["longitude"]
+
+    def get_timeinfo(self):
+        return self.gps_data["timeinfo"]
+
+    def get_gps_points(self):
+        """Return the GPS data as a list of dicts, one for each sample."""
+        return self.gps_data.to_dicts()
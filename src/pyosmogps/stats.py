@@ -0,0 +1,131 @@
+import sys
+import time
+from contextlib import contextmanager
+
+from .gps_records import protobuf_backend
+from .io_planner import source_name
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_memory():
+    """
+    Return the peak resident memory of the current process in bytes, or None
+    if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in KiB elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class Stats:
+    """
+    Wall time of the processing stages, accumulated by stage name.
+
+    The callback, if any, is called with the stage name, its duration in
+    seconds and the input file (None for the stages not related to a single
+    file) each time a stage ends.
+    """
+
+    input_file = None
+    callback = None
+
+    def __init__(self, input_file=None, callback=None):
+        self.input_file = input_file
+        self.callback = callback
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        """Add the duration of a stage."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self.callback is not None:
+            self.callback(stage, seconds, self.input_file)
+
+    @contextmanager
+    def timer(self, stage):
+        """Context manager timing a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def to_dict(self):
+        return {"stages": dict(self.stages)}
+
+
+class FileStats(Stats):
+    """
+    Instrumentation of the extraction of a video file.
+
+    The stages are 'moov' (parsing of the sample tables), 'read' (reading of
+    the metadata track), 'decode' (protobuf decoding), 'datetime' (parsing
+    of the GPS times) and 'cache' (loading from the extraction cache).
+
+    The input file is stored by name, see io_planner.source_name, so the
+    stats of the file objects and buffers can be serialized too.
+    """
+
+    bytes_read = 0
+    seeks = 0
+    table_entries = None
+    points_decoded = 0
+    peak_memory = None
+
+    def __init__(self, input_file=None, callback=None):
+        if input_file is not None:
+            input_file = source_name(input_file)
+        super().__init__(input_file, callback)
+        self.table_entries = {}
+
+    def to_dict(self):
+        return {
+            "input_file": self.input_file,
+            "stages": dict(self.stages),
+            "bytes_read": self.bytes_read,
+            "seeks": self.seeks,
+            "table_entries": dict(self.table_entries),
+            "points_decoded": self.points_decoded,
+            "peak_memory": self.peak_memory,
+        }
+
+
+class RunStats(Stats):
+    """
+    Instrumentation of an OsmoGps run: the FileStats of each input file, the
+    stages processing the joined track ('resample', 'simplify', 'save') and the
+    number of points written.
+    """
+
+    points_emitted = 0
+
+    def __init__(self, callback=None):
+        super().__init__(None, callback)
+        self.files = []
+
+    def add_file(self, file_stats):
+        """
+        Add the stats of a file, reporting its stages to the callback.
+
+        The files may be processed in other processes, so their stages are
+        reported here, when the results are collected.
+        """
+        self.files.append(file_stats)
+        if self.callback is not None:
+            for stage, seconds in file_stats.stages.items():
+                self.callback(stage, seconds, file_stats.input_file)
+
+    def to_dict(self):
+        return {
+            "files": [file_stats.to_dict() for file_stats in self.files],
+            "stages": dict(self.stages),
+            "points_decoded": sum(stats.points_decoded for stats in self.files),
+            "points_emitted": self.points_emitted,
+            "peak_memory": peak_memory(),
+            "protobuf_backend": protobuf_backend(),
+        }
@@ -0,0 +1,278 @@
+"""
+Compact binary archive of GPS tracks.
+
+File layout, little endian:
+
+- magic (4 bytes), format version (uint16), header length (uint32) and a
+  JSON header with the field names, the frame rate, the block size and the
+  index of the first point of each segment;
+- the blocks, each one a zlib compressed payload holding up to block_size
+  points;
+- the block index, one INDEX_DTYPE record per block with the time range of
+  the block, its offset and length in the file and its number of points;
+- the footer: offset of the index (uint64), number of blocks (uint32) and
+  the magic again.
+
+In a block payload every column is stored as a uint32 length followed by the
+column data. Time (microseconds), latitude and longitude (1e-7 degrees) and
+altitude (millimeters) are delta encoded, zigzag mapped and written as
+varints. The other fields are stored as float32.
+"""
+
+import json
+import struct
+import zlib
+
+import numpy as np
+
+from .gps_track import TIME_DTYPE, GpsTrack
+
+ARCHIVE_MAGIC = b"PGTA"
+ARCHIVE_VERSION = 1
+DEFAULT_BLOCK_SIZE = 4096
+
+# Fields stored as delta encoded integers, with the number of units per
+# degree or meter
+QUANTIZED_FIELDS = {
+    "latitude": 10**7,
+    "longitude": 10**7,
+    "altitude": 10**3,
+}
+
+INDEX_DTYPE = np.dtype(
+    [
+        ("first_time", "<i8"),
+        ("last_time", "<i8"),
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("count", "<u4"),
+    ]
+)
+_PREAMBLE = struct.Struct("<4sHI")
+_FOOTER = struct.Struct("<QI4s")
+
+
+def encode_varints(values):
+    """
+    Encode unsigned integers as LEB128 varints.
+
+    :param values: Array of uint64.
+    :return: Bytes with the concatenated varints.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        lengths += values >= np.uint64(1 << (7 * k))
+    starts = np.cumsum(lengths) - lengths
+    encoded = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(10):
+        selected = np.flatnonzero(lengths > k)
+        if len(selected) == 0:
+            break
+        byte = (values[selected] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (lengths[selected] > k + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[selected] + k] = byte | more
+    return encoded.tobytes()
+
+
+def decode_varints(data, count):
+    """
+    Decode LEB128 varints.
+
+    :param data: Bytes-like with the concatenated varints.
+    :param count: Expected number of values.
+    :return: Array of uint64.
+    """
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(encoded < 0x80)
+    if len(ends) != count or (count > 0 and ends[-1] != len(encoded) - 1):
+        raise ValueError("Corrupted varint column in the track archive.")
+    if count == 0:
+        return np.zeros(0, dtype=np.uint64)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    shifts = (np.arange(len(encoded)) - np.repeat(starts, lengths)) * 7
+    parts = (encoded & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def _encode_deltas(values):
+    """Delta encode and zigzag map an int64 array, then write it as varints."""
+    deltas = np.diff(values, prepend=np.int64(0))
+    zigzag = (deltas << np.int64(1)) ^ (deltas >> np.int64(63))
+    return encode_varints(zigzag.view(np.uint64))
+
+
+def _decode_deltas(data, count):
+    """Inverse of _encode_deltas."""
+    zigzag = decode_varints(data, count)
+    magnitude = (zigzag >> np.uint64(1)).view(np.int64)
+    sign = -(zigzag & np.uint64(1)).view(np.int64)
+    deltas = magnitude ^ sign
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+def _quantize(values, scale, name):
+    if not np.all(np.isfinite(values)):
+        raise ValueError(f"Field '{name}' must be finite to be archived.")
+    return np.rint(values * scale).astype(np.int64)
+
+
+def _encode_block(gps_data, fields):
+    columns = [_encode_deltas(gps_data.timeinfo.astype(np.int64))]
+    for name in fields:
+        if name in QUANTIZED_FIELDS:
+            scale = QUANTIZED_FIELDS[name]
+            columns.append(_encode_deltas(_quantize(gps_data[name], scale, name)))
+        else:
+            columns.append(gps_data[name].astype("<f4").tobytes())
+    payload = b"".join(struct.pack("<I", len(column)) + column for column in columns)
+    return zlib.compress(payload)
+
+
+def _decode_block(data, count, fields):
+    payload = memoryview(zlib.decompress(data))
+    columns = []
+    pos = 0
+    for _ in range(len(fields) + 1):
+        (length,) = struct.unpack_from("<I", payload, pos)
+        columns.append(payload[pos + 4 : pos + 4 + length])
+        pos += 4 + length
+
+    timeinfo = _decode_deltas(columns[0], count).astype(TIME_DTYPE)
+    values = {}
+    for name, column in zip(fields, columns[1:]):
+        if name in QUANTIZED_FIELDS:
+            values[name] = _decode_deltas(column, count) / QUANTIZED_FIELDS[name]
+        else:
+            values[name] = np.frombuffer(column, dtype="<f4", count=count).astype(
+                np.float64
+            )
+    return GpsTrack(timeinfo, values)
+
+
+def write_track_archive(
+    output_file,
+    gps_data,
+    frame_rate=None,
+    extract_extensions=False,
+    block_size=DEFAULT_BLOCK_SIZE,
+):
+    """
+    Write a track to a compact archive file.
+
+    :param output_file: Path of the archive.
+    :param gps_data: GpsTrack to write, sorted by time.
+    :param frame_rate: Frame rate of the samples (Hz), stored in the header.
+    :param extract_extensions: Whether the track contains the extensions.
+    :param block_size: Number of points of each block.
+    :return: Number of blocks written.
+    """
+    fields = gps_data.field_names()
+    header = json.dumps(
+        {
+            "fields": fields,
+            "frame_rate": frame_rate,
+            "extract_extensions": bool(extract_extensions),
+            "block_size": block_size,
+            "count": len(gps_data),
+            "segment_starts": gps_data.segment_starts.tolist(),
+        }
+    ).encode()
+
+    index = np.zeros((len(gps_data) + block_size - 1) // block_size, INDEX_DTYPE)
+    with open(output_file, "wb") as f:
+        f.write(_PREAMBLE.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, len(header)))
+        f.write(header)
+        for i, start in enumerate(range(0, len(gps_data), block_size)):
+            block = gps_data[start : start + block_size]
+            data = _encode_block(block, fields)
+            times = block.timeinfo.astype(np.int64)
+            index[i] = (times.min(), times.max(), f.tell(), len(data), len(block))
+            f.write(data)
+        index_offset = f.tell()
+        f.write(index.tobytes())
+        f.write(_FOOTER.pack(index_offset, len(index), ARCHIVE_MAGIC))
+    return len(index)
+
+
+def read_track_archive_header(input_file):
+    """
+    Read the header and the block index of an archive.
+
+    :param input_file: Path of the archive.
+    :return: Tuple with the header dict and the block index array.
+    """
+    with open(input_file, "rb") as f:
+        magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError(f"{input_file} is not a track archive.")
+        if version > ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported track archive version {version}.")
+        header = json.loads(f.read(header_length))
+
+        f.seek(-_FOOTER.size, 2)
+        index_offset, block_count, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError(f"Truncated track archive {input_file}.")
+        f.seek(index_offset)
+        index = np.frombuffer(
+            f.read(block_count * INDEX_DTYPE.itemsize), INDEX_DTYPE, block_count
+        )
+    return header, index
+
+
+def read_track_archive(input_file, start=None, end=None):
+    """
+    Read a track from an archive, optionally only a time range of it.
+
+    Only the blocks overlapping the time range are read and decoded.
+
+    :param input_file: Path of the archive.
+    :param start: First time of the range (datetime, datetime64 or ISO string).
+    :param end: Last time of the range, included.
+    :return: Tuple with the GpsTrack and the header dict.
+    """
+    header, index = read_track_archive_header(input_file)
+    fields = header["fields"]
+    first = -np.inf if start is None else np.datetime64(start, "us").astype(np.int64)
+    last = np.inf if end is None else np.datetime64(end, "us").astype(np.int64)
+
+    selected = np.flatnonzero(
+        (index["last_time"] >= first) & (index["first_time"] <= last)
+    )
+    tracks = []
+    with open(input_file, "rb") as f:
+        for block in index[selected]:
+            f.seek(int(block["offset"]))
+            data = f.read(int(block["length"]))
+            tracks.append(_decode_block(data, int(block["count"]), fields))
+
+    gps_data = GpsTrack.concatenate(tracks)
+    if len(gps_data) == 0:
+        return GpsTrack([], {name: [] for name in fields}), header
+
+    # Index of each point read in the whole archive
+    block_starts = np.cumsum(index["count"], dtype=np.int64) - index["count"]
+    indices = np.concatenate(
+        [
+            np.arange(block_start, block_start + count)
+            for block_start, count in zip(
+                block_starts[selected].tolist(), index["count"][selected].tolist()
+            )
+        ]
+    )
+    if start is not None or end is not None:
+        times = gps_data.timeinfo.astype(np.int64)
+        selected_points = (times >= first) & (times <= last)
+        gps_data = gps_data[selected_points]
+        indices = indices[selected_points]
+    if len(gps_data) == 0:
+        return gps_data, header
+
+    # Archives written before the segments were stored have a single one
+    segment_ids = np.searchsorted(
+        header.get("segment_starts", [0]), indices, side="right"
+    )
+    segment_starts = np.flatnonzero(np.diff(segment_ids, prepend=-1))
+    return GpsTrack(gps_data.timeinfo, gps_data.fields, segment_starts), header
@@ -0,0 +1,326 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .defaults import DEFAULT_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)  # pylint: disable=C0103
+
+MANIFEST_NAME = ".pyosmogps-manifest.json"
+VIDEO_SUFFIX = ".mp4"
+MAX_POLL_INTERVAL = 60.0
+
+
+def _current_umask():
+    """Return the umask of the process, which can only be read by setting it."""
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+def _replace_file(temp_path, path):
+    """
+    Rename a temporary file to its final path, with the permissions of a file
+    created by open(): mkstemp creates it readable by the owner only.
+    """
+    os.chmod(temp_path, 0o666 & ~_current_umask())
+    os.replace(temp_path, path)
+
+
+def extract_to_gpx(
+    input_file,
+    output_file,
+    frequency,
+    resampling_method,
+    timezone_offset=0,
+    extract_extensions=False,
+):
+    """
+    Extract the GPS data of a video file to a GPX file.
+
+    The GPX file is written under a temporary name and renamed when
+    complete, so a partial file never has the output name. Nothing is
+    written if the video has no valid GPS fix.
+
+    :param input_file: Path of the video file.
+    :param output_file: Path of the GPX file.
+    :param frequency: Output frequency in Hz.
+    :param resampling_method: Resampling method, see OsmoGps.resample.
+    :param timezone_offset: Timezone offset in hours.
+    :param extract_extensions: Also extract the extension fields.
+    :return: Number of points written, 0 if the GPX file was not written.
+    """
+    # Imported by the workers, the process watching the folder does not need it
+    from .pyosmogps import OsmoGps
+
+    gps = OsmoGps([input_file], timezone_offset, extract_extensions)
+    gps.resample(frequency, resampling_method)
+
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(output_file) or ".", prefix=".", suffix=".gpx"
+    )
+    os.close(fd)
+    try:
+        written = gps.save_gpx(temp_path)
+        if written:
+            _replace_file(temp_path, output_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if not written:
+        os.remove(temp_path)
+        return 0
+    return len(gps.gps_data)
+
+
+class Manifest:
+    """
+    Record of the files processed by a FolderWatcher, stored as JSON.
+
+    Each entry is keyed by the name of the video file and holds its size and
+    modification time when it was processed, the output file and the number
+    of points written, or the error. A file is processed again only if its
+    size or modification time change.
+    """
+
+    path = None
+    entries = None
+
+    def __init__(self, path):
+        """
+        :param path: Path of the manifest file, loaded if it exists.
+        """
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logger.warning(f"Ignoring the invalid manifest {path}: {e}")
+
+    def is_processed(self, name, size, mtime):
+        """Return True if the file was processed with this size and mtime."""
+        entry = self.entries.get(name)
+        return entry is not None and entry["size"] == size and entry["mtime"] == mtime
+
+    def record(self, name, size, mtime, output=None, points=None, error=None):
+        """
+        Record the result of a file and save the manifest.
+
+        :param name: Name of the video file.
+        :param size: Size of the file when it was processed.
+        :param mtime: Modification time of the file, in nanoseconds.
+        :param output: Path of the output file.
+        :param points: Number of points written.
+        :param error: Error message if the file could not be processed.
+        """
+        self.entries[name] = {
+            "size": size,
+            "mtime": mtime,
+            "output": output,
+            "points": points,
+            "error": error,
+        }
+        self.save()
+
+    def save(self):
+        """Write the manifest, replacing the previous one atomically."""
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            _replace_file(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+class FolderWatcher:
+    """
+    Extract the GPS data of the video files written to a folder.
+
+    The folder is polled for '.mp4' files, and a file is processed once its
+    size and modification time are the same in two consecutive polls, i.e.
+    when the camera or the copy has finished writing it. Each file is
+    extracted to a GPX file with the same name in the output folder, by a
+    pool of at most jobs worker processes. The processed files are recorded
+    in a manifest in the output folder, so they are skipped after a restart.
+
+    When all the workers are busy, the waiting files are queued and the
+    polling interval doubles, up to max_poll_interval, until a worker is
+    free again.
+    """
+
+    input_dir = None
+    output_dir = None
+    frequency = 2.0
+    resampling_method = "linear"
+    timezone_offset = 0
+    extract_extensions = False
+    jobs = 1
+    poll_interval = DEFAULT_POLL_INTERVAL
+    max_poll_interval = MAX_POLL_INTERVAL
+    manifest = None
+
+    def __init__(
+        self,
+        input_dir,
+        output_dir,
+        frequency=2.0,
+        resampling_method="linear",
+        timezone_offset=0,
+        extract_extensions=False,
+        jobs=1,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        max_poll_interval=MAX_POLL_INTERVAL,
+    ):
+        """
+        :param input_dir: Folder where the video files are written.
+        :param output_dir: Folder of the GPX files and of the manifest,
+            created if needed.
+        :param frequency: Output frequency in Hz.
+        :param resampling_method: Resampling method, see OsmoGps.resample.
+        :param timezone_offset: Timezone offset in hours.
+        :param extract_extensions: Also extract the extension fields.
+        :param jobs: Number of worker processes, 0 to use all the available
+            CPUs.
+        :param poll_interval: Seconds between two polls of the folder.
+        :param max_poll_interval: Longest interval between two polls when
+            the workers are busy.
+        """
+        if not os.path.isdir(input_dir):
+            raise ValueError(f"{input_dir} is not a directory")
+        if poll_interval <= 0:
+            raise ValueError("poll_interval must be positive")
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.frequency = frequency
+        self.resampling_method = resampling_method
+        self.timezone_offset = timezone_offset
+        self.extract_extensions = extract_extensions
+        self.jobs = jobs if jobs > 0 else os.cpu_count()
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(max_poll_interval, poll_interval)
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+
+    def scan(self):
+        """
+        List the video files of the input folder.
+
+        :return: Dict mapping the file names to (size, mtime) tuples, with the
+            modification time in nanoseconds.
+        """
+        files = {}
+        with os.scandir(self.input_dir) as it:
+            for entry in it:
+                if entry.name.lower().endswith(VIDEO_SUFFIX) and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def output_file(self, name):
+        """Return the path of the GPX file of a video file."""
+        return os.path.join(self.output_dir, os.path.splitext(name)[0] + ".gpx")
+
+    def run(self, once=False):
+        """
+        Watch the folder and process the new files, until interrupted.
+
+        :param once: Stop when all the files in the folder have been
+            processed, instead of waiting for new ones.
+        :return: Number of files processed, successfully or not.
+        """
+        logger.info(
+            f"Watching {self.input_dir} with {self.jobs} workers, writing the "
+            f"GPX files to {self.output_dir}"
+        )
+        previous = {}
+        queue = deque()
+        queued = set()
+        running = {}
+        processed = 0
+        interval = self.poll_interval
+        next_poll = time.monotonic()
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            while True:
+                polled = time.monotonic() >= next_poll
+                if polled:
+                    current = self.scan()
+                    for name, signature in current.items():
+                        if name in queued or self.manifest.is_processed(
+                            name, *signature
+                        ):
+                            continue
+                        # Still being written if it changed since the last poll
+                        if previous.get(name) == signature:
+                            queue.append((name, signature))
+                            queued.add(name)
+                    previous = current
+
+                while queue and len(running) < self.jobs:
+                    name, signature = queue.popleft()
+                    future = pool.submit(
+                        extract_to_gpx,
+                        os.path.join(self.input_dir, name),
+                        self.output_file(name),
+                        self.frequency,
+                        self.resampling_method,
+                        self.timezone_offset,
+                        self.extract_extensions,
+                    )
+                    running[future] = name, signature
+
+                if polled:
+                    # Poll less often while the files wait for the workers
+                    if queue:
+                        interval = min(2 * interval, self.max_poll_interval)
+                    else:
+                        interval = self.poll_interval
+                    next_poll = time.monotonic() + interval
+
+                if once and not queue and not running:
+                    if all(
+                        self.manifest.is_processed(name, *signature)
+                        for name, signature in previous.items()
+                    ):
+                        break
+
+                timeout = max(0.0, next_poll - time.monotonic())
+                if running:
+                    done, _ = wait(running, timeout, return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+                    time.sleep(timeout)
+                for future in done:
+                    name, signature = running.pop(future)
+                    queued.discard(name)
+                    self._record(name, signature, future)
+                    processed += 1
+
+        return processed
+
+    def _record(self, name, signature, future):
+        """Record the result of a file in the manifest."""
+        output_file = self.output_file(name)
+        try:
+            points = future.result()
+        except Exception as e:
+            logger.error(f"Error processing {name}: {e}")
+            self.manifest.record(name, *signature, error=str(e))
+            return
+        if points == 0:
+            logger.warning(f"No GPS data in {name}, no GPX file written")
+            self.manifest.record(name, *signature, points=0, error="No GPS data")
+            return
+        logger.info(f"Extracted {points} GPS points from {name} to {output_file}")
+        self.manifest.record(name, *signature, output=output_file, points=points)
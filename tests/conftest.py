@@ -0,0 +1,10 @@
+import pytest
+from synthetic_mp4 import write_synthetic_mp4
+
+
+@pytest.fixture(scope="session")
+def video_file(tmp_path_factory):
+    """Synthetic DJI-style video of 10 seconds at 30 fps."""
+    path = tmp_path_factory.mktemp("videos") / "video.mp4"
+    write_synthetic_mp4(path, duration=10.0, frame_rate=30.0, extensions=False)
+    return path
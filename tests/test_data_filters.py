@@ -0,0 +1,220 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from pyosmogps import data_filters
+from pyosmogps.data_filters import (
+    discard_resample_gps_data,
+    linear_resample_gps_data,
+    polyphase_resample_gps_data,
+    simplify_gps_data,
+)
+from pyosmogps.gps_track import GpsTrack
+
+START = np.datetime64("2024-05-01T10:00:00", "us")
+
+
+def make_track(count, frequency, segment_starts=None, seed=0):
+    """Build a random walk track sampled at a frequency."""
+    rng = np.random.default_rng(seed)
+    offsets = np.rint(np.arange(count) / frequency * 1e6).astype(np.int64)
+    return GpsTrack(
+        START + offsets.astype("timedelta64[us]"),
+        {
+            "latitude": 45.0 + np.cumsum(rng.normal(0, 1e-5, count)),
+            "longitude": 9.0 + np.cumsum(rng.normal(0, 1e-5, count)),
+            "altitude": 100.0 + np.cumsum(rng.normal(0, 0.1, count)),
+        },
+        segment_starts,
+    )
+
+
+def make_irregular_track(count, frequency, segment_starts=None):
+    """Build a track whose sample times jitter around a frequency."""
+    rng = np.random.default_rng(3)
+    steps = rng.integers(int(0.5e6 / frequency), int(1.5e6 / frequency), count)
+    track = make_track(count, frequency, segment_starts)
+    timeinfo = START + np.cumsum(steps).astype("timedelta64[us]")
+    return GpsTrack(timeinfo, track.fields, segment_starts)
+
+
+def reference_linear(samples, output_frequency):
+    """
+    Linear resampling of a list of dicts, one timestamp at a time, as it was
+    written before the vectorization.
+    """
+    start = samples[0]["timeinfo"]
+    total_duration = (samples[-1]["timeinfo"] - start).total_seconds()
+    times = [(entry["timeinfo"] - start).total_seconds() for entry in samples]
+    resampled = []
+    for i in range(int(total_duration * output_frequency)):
+        new_time = start + timedelta(seconds=i / output_frequency)
+        entry = {"timeinfo": new_time}
+        for key in samples[0]:
+            if key != "timeinfo":
+                values = np.array([sample[key] for sample in samples])
+                entry[key] = np.interp(
+                    (new_time - start).total_seconds(), times, values
+                )
+        resampled.append(entry)
+    return resampled
+
+
+def reference_discard(samples, input_frequency, output_frequency):
+    """Discard resampling of a list of dicts, as it was written before."""
+    return samples[:: int(input_frequency / output_frequency)]
+
+
+def reference_resample(track, resample):
+    """Apply a reference resampler to each segment of a track."""
+    resampled = []
+    for segment in track.segments():
+        resampled += resample(segment.to_dicts())
+    return resampled
+
+
+def time_steps(gps_data):
+    """Return the distinct times between consecutive samples, in us."""
+    return np.unique(np.diff(gps_data.timeinfo.astype(np.int64))).tolist()
+
+
+@pytest.mark.parametrize(
+    "input_frequency, output_frequency, count",
+    [(30, 0.1, 3000), (60, 0.5, 1200), (30, 0.25, 1200), (59.94, 1, 600)],
+)
+def test_polyphase_output_rate(input_frequency, output_frequency, count):
+    track = make_track(count, input_frequency)
+
+    result = polyphase_resample_gps_data(track, input_frequency, output_frequency)
+
+    assert time_steps(result) == [round(1e6 / output_frequency)]
+    duration = (count - 1) / input_frequency
+    assert len(result) == int(duration * output_frequency + 1e-9) + 1
+    assert result.timeinfo[0] == track.timeinfo[0]
+
+
+def test_polyphase_approximated_rate():
+    # 30000 / 1001 fps written as a float has no exact ratio with small terms
+    input_frequency = 30000 / 1001
+    track = make_track(600, input_frequency)
+
+    result = polyphase_resample_gps_data(track, input_frequency, 1)
+
+    step = np.mean(np.diff(result.timeinfo.astype(np.int64)))
+    assert step == pytest.approx(1e6, rel=1e-5)
+
+
+def test_polyphase_rate_without_approximation():
+    track = make_track(100, 30)
+
+    with pytest.raises(ValueError, match="polyphase"):
+        polyphase_resample_gps_data(track, 30, 1e-9)
+
+
+def reference_simplify(x, y, tolerance):
+    """Plain Douglas-Peucker, returning the indices of the kept points."""
+
+    def distance2(i, start, end):
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        rx, ry = x[i] - x[start], y[i] - y[start]
+        length2 = dx * dx + dy * dy
+        t = 0.0 if length2 == 0 else min(max((rx * dx + ry * dy) / length2, 0), 1)
+        return (rx - t * dx) ** 2 + (ry - t * dy) ** 2
+
+    keep = {0, len(x) - 1}
+    ranges = [(0, len(x) - 1)]
+    while ranges:
+        start, end = ranges.pop()
+        if end - start < 2:
+            continue
+        farthest = max(range(start + 1, end), key=lambda i: distance2(i, start, end))
+        if distance2(farthest, start, end) > tolerance**2:
+            keep.add(farthest)
+            ranges += [(start, farthest), (farthest, end)]
+    return sorted(keep)
+
+
+def kept_indices(track, result):
+    return np.searchsorted(track.timeinfo, result.timeinfo).tolist()
+
+
+@pytest.mark.parametrize("batch_size", [16, data_filters.SIMPLIFY_BATCH_SIZE])
+@pytest.mark.parametrize("tolerance", [0.5, 2.0, 10.0])
+def test_simplify_matches_the_reference(monkeypatch, batch_size, tolerance):
+    # With small batches the long ranges are measured on their own, in chunks
+    monkeypatch.setattr(data_filters, "SIMPLIFY_BATCH_SIZE", batch_size)
+    track = make_track(2000, 10, seed=1)
+    x, y = data_filters._project(track["latitude"], track["longitude"])
+
+    result = simplify_gps_data(track, tolerance)
+
+    assert kept_indices(track, result) == reference_simplify(
+        x.tolist(), y.tolist(), tolerance
+    )
+
+
+def test_simplify_large_track():
+    count = 300000
+    track = make_track(count, 10, segment_starts=[0, 100000, 250000], seed=2)
+    tolerance = 1.0
+
+    result = simplify_gps_data(track, tolerance)
+
+    kept = np.asarray(kept_indices(track, result))
+    assert 0 < len(result) < count
+    assert set(track.segment_starts.tolist()) <= set(kept.tolist())
+    assert (
+        result.segment_starts.tolist()
+        == np.searchsorted(kept, track.segment_starts).tolist()
+    )
+
+    # Every dropped point is within the tolerance of the simplified segment
+    # around it, in the projection of its track segment
+    projected = [
+        data_filters._project(segment["latitude"], segment["longitude"])
+        for segment in track.segments()
+    ]
+    x = np.concatenate([segment_x for segment_x, _ in projected])
+    y = np.concatenate([segment_y for _, segment_y in projected])
+    dropped = np.setdiff1d(np.arange(count), kept)
+    after = kept[np.searchsorted(kept, dropped)]
+    before = kept[np.searchsorted(kept, dropped) - 1]
+    dx, dy = x[after] - x[before], y[after] - y[before]
+    distances = data_filters._segment_distances2(
+        x[dropped],
+        y[dropped],
+        x[before],
+        y[before],
+        dx,
+        dy,
+        data_filters._inverse_length2(dx, dy),
+    )
+    assert distances.max() <= tolerance**2
+
+
+@pytest.mark.parametrize("segment_starts", [None, [0, 130, 200]])
+@pytest.mark.parametrize("output_frequency", [2.0, 0.7, 45.0])
+def test_linear_matches_the_reference(segment_starts, output_frequency):
+    track = make_irregular_track(300, 30, segment_starts)
+
+    result = linear_resample_gps_data(track, 30, output_frequency)
+
+    expected = reference_resample(
+        track, lambda samples: reference_linear(samples, output_frequency)
+    )
+    assert result.to_dicts() == expected
+
+
+@pytest.mark.parametrize("segment_starts", [None, [0, 130, 200]])
+@pytest.mark.parametrize("output_frequency", [2.0, 7.0, 30.0])
+def test_discard_matches_the_reference(segment_starts, output_frequency):
+    track = make_irregular_track(300, 30, segment_starts)
+
+    result = discard_resample_gps_data(track, 30, output_frequency)
+
+    expected = reference_resample(
+        track, lambda samples: reference_discard(samples, 30, output_frequency)
+    )
+    assert result.to_dicts() == expected
+    assert len(result.segment_starts) == len(track.segment_starts)
@@ -0,0 +1,73 @@
+import numpy as np
+
+from pyosmogps.gps_track import GpsTrack
+from pyosmogps.gpx_reader import iter_gpx_points, merge_gpx, parse_gpx_time
+from pyosmogps.gpx_writer import write_gpx
+
+START = np.datetime64("2024-05-01T10:00:00", "us")
+
+
+def make_track(seconds, segment_starts=None):
+    """Build a track with a point at each time, in seconds from START."""
+    seconds = np.asarray(seconds, dtype=np.float64)
+    return GpsTrack(
+        START + (seconds * 10**6).astype("timedelta64[us]"),
+        {
+            "latitude": 45.0 + seconds * 1e-5,
+            "longitude": 9.0 + seconds * 1e-5,
+            "altitude": 100.0 + seconds,
+        },
+        segment_starts,
+    )
+
+
+def segments(path):
+    """Return the times of the points of each track segment, in seconds."""
+    result = {}
+    for point in iter_gpx_points(path):
+        result.setdefault(point.segment, []).append(
+            (point.time - int(START.astype(np.int64))) / 10**6
+        )
+    return list(result.values())
+
+
+def test_parse_gpx_time():
+    utc = int(np.datetime64("2025-01-26T10:00:00", "us").astype(np.int64))
+
+    assert parse_gpx_time("2025-01-26T10:00:00Z") == utc
+    assert parse_gpx_time("2025-01-26T12:00:00+02:00") == utc
+    assert parse_gpx_time("not a time") is None
+
+
+def test_merge_keeps_the_segments_of_the_inputs(tmp_path):
+    first, second, output = tmp_path / "1.gpx", tmp_path / "2.gpx", tmp_path / "m.gpx"
+    write_gpx(first, make_track([0, 1, 2, 10, 11], segment_starts=[0, 3]))
+    write_gpx(second, make_track([20, 21]))
+
+    assert merge_gpx([first, second], output) == 7
+    assert segments(output) == [[0, 1, 2], [10, 11], [20, 21]]
+
+
+def test_merge_splits_the_interleaved_inputs(tmp_path):
+    first, second, output = tmp_path / "1.gpx", tmp_path / "2.gpx", tmp_path / "m.gpx"
+    write_gpx(first, make_track([0, 1, 4, 5]))
+    write_gpx(second, make_track([2, 3]))
+
+    merge_gpx([first, second], output)
+    assert segments(output) == [[0, 1], [2, 3], [4, 5]]
+
+
+def test_merge_max_gap(tmp_path):
+    first, output = tmp_path / "1.gpx", tmp_path / "m.gpx"
+    write_gpx(first, make_track([0, 1, 2, 10, 11, 30]))
+
+    merge_gpx([first], output, max_gap=5)
+    assert segments(output) == [[0, 1, 2], [10, 11], [30]]
+
+
+def test_merge_of_a_single_input_is_unchanged(tmp_path):
+    first, output = tmp_path / "1.gpx", tmp_path / "m.gpx"
+    write_gpx(first, make_track([0, 1, 2, 10, 11], segment_starts=[0, 3]))
+
+    merge_gpx([first], output)
+    assert output.read_bytes() == first.read_bytes()
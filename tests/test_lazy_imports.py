@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import pyosmogps
+
+# The heavy dependencies are imported by the commands on first use
+HEAVY_MODULES = ["numpy", "scipy", "google.protobuf", "dateutil"]
+
+
+def loaded_modules(code):
+    """Return the heavy modules loaded by code run in a new interpreter."""
+    check = (
+        f"{code}\nimport json, sys\n"
+        f"print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if any("
+        "n == m or n.startswith(m + '.') for n in sys.modules))))"
+    )
+    source_dir = os.path.dirname(os.path.dirname(pyosmogps.__file__))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [source_dir] + [path for path in [env.get("PYTHONPATH")] if path]
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["pyosmogps", "pyosmogps.main"])
+def test_import_loads_no_heavy_module(module):
+    assert loaded_modules(f"import {module}") == []
+
+
+def test_version_loads_only_protobuf():
+    code = (
+        "import sys\nsys.argv = ['pyosmogps', '--version']\n"
+        "from pyosmogps.main import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass"
+    )
+    # Loaded to report the protobuf backend
+    assert loaded_modules(code) == ["google.protobuf"]
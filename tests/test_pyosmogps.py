@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from pyosmogps import OsmoGps, mp4_manager
+from pyosmogps.mp4_manager import MP4Manager
+from pyosmogps.pyosmogps import extract_file
+
+
+def recorded_reads(monkeypatch):
+    """Record the readers opened on the files and the ranges they read."""
+    readers = []
+
+    class SpyReader(mp4_manager.RangeReader):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.ranges = []
+            readers.append(self)
+
+        def read_range(self, start, length):
+            self.ranges.append((start, start + length))
+            return super().read_range(start, length)
+
+    monkeypatch.setattr(mp4_manager, "RangeReader", SpyReader)
+    return readers
+
+
+@pytest.mark.parametrize("start, end", [(None, None), (0, 4), (3, 6)])
+def test_extraction_reads_the_header_once(video_file, monkeypatch, start, end):
+    header_start = int(MP4Manager(video_file, extract_chunks=False).offsets[0])
+    readers = recorded_reads(monkeypatch)
+
+    gps_data, _ = extract_file(video_file, start=start, end=end)
+
+    # One reader for the 'moov' box, one for the metadata samples
+    assert len(gps_data) > 0
+    assert len(readers) == 2
+    assert [
+        read_start <= header_start < read_end
+        for read_start, read_end in readers[1].ranges
+    ].count(True) == 1
+
+
+def test_window_is_part_of_the_track(video_file):
+    track = OsmoGps([video_file]).gps_data
+    window = OsmoGps([video_file], start=3, end=6).gps_data
+
+    assert 0 < len(window) < len(track)
+    assert np.isin(window.timeinfo, track.timeinfo).all()
@@ -0,0 +1,29 @@
+import io
+import json
+
+import pytest
+
+from pyosmogps import OsmoGps
+
+
+@pytest.mark.parametrize(
+    "make_input, name",
+    [
+        (lambda path: io.BytesIO(path.read_bytes()), "<BytesIO>"),
+        (lambda path: path.read_bytes(), "<bytes>"),
+        (lambda path: path, None),
+    ],
+)
+def test_file_stats_name_the_input(video_file, make_input, name):
+    stages = []
+    gps = OsmoGps(
+        [make_input(video_file)],
+        stats_callback=lambda stage, seconds, input_file: stages.append(input_file),
+    )
+
+    stats = json.loads(json.dumps(gps.stats.to_dict()))
+
+    expected = str(video_file) if name is None else name
+    assert [file_stats["input_file"] for file_stats in stats["files"]] == [expected]
+    assert stats["files"][0]["points_decoded"] == len(gps.gps_data)
+    assert expected in stages
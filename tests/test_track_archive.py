@@ -0,0 +1,209 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from pyosmogps import track_archive
+from pyosmogps.gps_track import GpsTrack
+from pyosmogps.track_archive import (
+    INDEX_DTYPE,
+    decode_varints,
+    encode_varints,
+    read_track_archive,
+    read_track_archive_header,
+    write_track_archive,
+)
+
+START = np.datetime64("2024-05-01T10:00:00", "us")
+
+
+def make_track(count=100, step_us=100000, segment_starts=None, extensions=False):
+    """Build a track with irregular times and smooth positions."""
+    rng = np.random.default_rng(0)
+    offsets = np.cumsum(rng.integers(step_us // 2, step_us * 2, count))
+    fields = {
+        "latitude": 45.0 + np.cumsum(rng.normal(0, 1e-5, count)),
+        "longitude": 9.0 + np.cumsum(rng.normal(0, 1e-5, count)),
+        "altitude": 120.0 + np.cumsum(rng.normal(0, 0.1, count)),
+    }
+    if extensions:
+        fields["speed_2d"] = rng.uniform(0, 30, count)
+        fields["camera_acc_x"] = rng.normal(0, 1, count)
+    return GpsTrack(START + offsets.astype("timedelta64[us]"), fields, segment_starts)
+
+
+def decoded_block_counts(monkeypatch):
+    """Record the number of points of each block decoded by the reader."""
+    counts = []
+    decode_block = track_archive._decode_block
+
+    def spy(data, count, fields):
+        counts.append(count)
+        return decode_block(data, count, fields)
+
+    monkeypatch.setattr(track_archive, "_decode_block", spy)
+    return counts
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "track.pgta"
+    track = make_track(extensions=True)
+    write_track_archive(path, track, frame_rate=10.0, extract_extensions=True)
+
+    result, header = read_track_archive(path)
+
+    assert header["frame_rate"] == 10.0
+    assert header["extract_extensions"] is True
+    assert header["count"] == len(track)
+    assert result.field_names() == track.field_names()
+    np.testing.assert_array_equal(result.timeinfo, track.timeinfo)
+    for name, scale in track_archive.QUANTIZED_FIELDS.items():
+        np.testing.assert_allclose(result[name], track[name], rtol=0, atol=0.5 / scale)
+    for name in ("speed_2d", "camera_acc_x"):
+        np.testing.assert_array_equal(
+            result[name], track[name].astype(np.float32).astype(np.float64)
+        )
+
+
+def test_multiple_blocks(tmp_path):
+    path = tmp_path / "track.pgta"
+    track = make_track(count=95)
+
+    assert write_track_archive(path, track, block_size=10) == 10
+
+    header, index = read_track_archive_header(path)
+    assert header["block_size"] == 10
+    assert index["count"].tolist() == [10] * 9 + [5]
+    times = track.timeinfo.astype(np.int64)
+    assert index["first_time"].tolist() == times[::10].tolist()
+    assert index["last_time"].tolist() == times[9::10].tolist() + [times[-1]]
+
+    result, _ = read_track_archive(path)
+    np.testing.assert_array_equal(result.timeinfo, track.timeinfo)
+    np.testing.assert_allclose(result["latitude"], track["latitude"], atol=0.5e-7)
+
+
+def test_time_range_decodes_only_overlapping_blocks(tmp_path, monkeypatch):
+    path = tmp_path / "track.pgta"
+    track = make_track(count=100)
+    write_track_archive(path, track, block_size=10)
+    counts = decoded_block_counts(monkeypatch)
+
+    # Points 25 to 34 span the third and the fourth block
+    start, end = track.timeinfo[25], track.timeinfo[34]
+    result, _ = read_track_archive(path, start=start, end=end)
+
+    assert len(counts) == 2
+    np.testing.assert_array_equal(result.timeinfo, track.timeinfo[25:35])
+    np.testing.assert_allclose(
+        result["altitude"], track["altitude"][25:35], rtol=0, atol=0.5e-3
+    )
+
+
+def test_time_range_outside_the_track(tmp_path, monkeypatch):
+    path = tmp_path / "track.pgta"
+    track = make_track(count=30)
+    write_track_archive(path, track, block_size=10)
+    counts = decoded_block_counts(monkeypatch)
+
+    result, _ = read_track_archive(path, start=track.timeinfo[-1] + 1)
+
+    assert counts == []
+    assert len(result) == 0
+    assert result.field_names() == track.field_names()
+
+
+def test_empty_track(tmp_path):
+    path = tmp_path / "track.pgta"
+    track = GpsTrack([], {"latitude": [], "longitude": [], "altitude": []})
+
+    assert write_track_archive(path, track) == 0
+
+    header, index = read_track_archive_header(path)
+    assert header["count"] == 0
+    assert len(index) == 0
+    result, _ = read_track_archive(path)
+    assert len(result) == 0
+    assert result.field_names() == ["latitude", "longitude", "altitude"]
+
+
+def test_segment_starts(tmp_path):
+    path = tmp_path / "track.pgta"
+    track = make_track(count=50, segment_starts=[0, 12, 37])
+    write_track_archive(path, track, block_size=10)
+
+    result, header = read_track_archive(path)
+    assert header["segment_starts"] == [0, 12, 37]
+    assert result.segment_starts.tolist() == [0, 12, 37]
+
+    # A range starting inside the first segment keeps the later boundaries
+    result, _ = read_track_archive(
+        path, start=track.timeinfo[5], end=track.timeinfo[40]
+    )
+    assert result.segment_starts.tolist() == [0, 7, 32]
+
+
+def test_bad_magic(tmp_path):
+    path = tmp_path / "track.pgta"
+    write_track_archive(path, make_track(count=10))
+    data = path.read_bytes()
+    path.write_bytes(b"XXXX" + data[4:])
+
+    with pytest.raises(ValueError, match="is not a track archive"):
+        read_track_archive(path)
+
+
+def test_truncated_footer(tmp_path):
+    path = tmp_path / "track.pgta"
+    write_track_archive(path, make_track(count=10))
+    path.write_bytes(path.read_bytes()[:-3])
+
+    with pytest.raises(ValueError, match="Truncated track archive"):
+        read_track_archive(path)
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2**32, 2**64 - 1], dtype=np.uint64)
+    encoded = encode_varints(values)
+
+    np.testing.assert_array_equal(decode_varints(encoded, len(values)), values)
+
+
+@pytest.mark.parametrize(
+    "data, count",
+    [
+        (bytes([0x81, 0x01, 0x80]), 1),  # last varint not terminated
+        (bytes([0x01, 0x02]), 3),  # fewer values than expected
+        (bytes([0x01, 0x02]), 1),  # more values than expected
+    ],
+)
+def test_corrupt_varints(data, count):
+    with pytest.raises(ValueError, match="Corrupted varint"):
+        decode_varints(data, count)
+
+
+def test_corrupt_block(tmp_path):
+    path = tmp_path / "track.pgta"
+    write_track_archive(path, make_track(count=10))
+    header, index = read_track_archive_header(path)
+    data = bytearray(path.read_bytes())
+    offset, length = int(index[0]["offset"]), int(index[0]["length"])
+
+    # Set the continuation bit of the last byte of the time column
+    payload = bytearray(zlib.decompress(data[offset : offset + length]))
+    (time_length,) = struct.unpack_from("<I", payload)
+    payload[3 + time_length] |= 0x80
+    block = zlib.compress(bytes(payload))
+    index = index.copy()
+    index[0]["length"] = len(block)
+    index_offset = offset + len(block)
+    data[offset:] = (
+        block
+        + index.astype(INDEX_DTYPE).tobytes()
+        + track_archive._FOOTER.pack(index_offset, len(index), b"PGTA")
+    )
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError, match="Corrupted varint"):
+        read_track_archive(path)